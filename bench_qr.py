@@ -0,0 +1,373 @@
+"""Benchmark nhận diện QR: toàn khung so với dò thô + giải mã mịn (pyramid).
+
+Sinh khung tổng hợp ở độ phân giải camera (mã QR từ cv2.QRCodeEncoder đặt
+trên nền nhiễu) hoặc dùng ảnh có sẵn, rồi đo độ trễ và số mã giải mã được;
+dòng pyramid in cả tốc độ lẫn số mã chênh so với toàn khung (mất mã thì ghi
+rõ), và bị bỏ qua khi tỉ lệ chọn được là 1.00 vì khi đó không có thu nhỏ:
+
+    python bench_qr.py --resolution 3840x2160 --repeat 5
+    python bench_qr.py --images ./samples
+
+--suite: bộ đo tái lập được trên corpus tổng hợp. Mỗi cấu hình chỉ đổi một
+trục (độ dài nội dung, kích thước module, góc xoay, blur, nhiễu, phối cảnh,
+số mã/ảnh) so với cấu hình gốc; in ảnh/s, MP/s và tỉ lệ giải mã đúng cho
+enhance_for_qr và cho cả đường xử lý lưu mã (nhận diện + cắt + chống trùng +
+mã hoá ảnh), kèm file JSON để so sánh giữa các lần chạy. Thêm --pyramid
+để chạy cả đường dò thô + giải mã mịn như camera và so số mã giải mã được
+với toàn khung:
+
+    python bench_qr.py --suite --json bench.json
+    python bench_qr.py --suite --axes rotation,blur --per-config 16
+    python bench_qr.py --suite --pyramid --axes codes
+"""
+
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from qr import (
+    DigestSet,
+    PyramidScaler,
+    crop_write_params,
+    detect_qr_codes,
+    detect_qr_pyramid,
+    detect_with_crops,
+    enhance_for_qr,
+    iter_image_files,
+)
+
+
+def make_synthetic_frame(width, height, payloads, module_px, rng):
+    """Khung nền xám nhiễu với các mã QR đặt ngẫu nhiên (không chồng nhau)."""
+    frame = rng.integers(90, 170, size=(height, width, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (0, 0), 3)
+    encoder = cv2.QRCodeEncoder.create()
+    x = 40
+    for payload in payloads:
+        code = encoder.encode(payload)
+        code = cv2.resize(code, None, fx=module_px, fy=module_px, interpolation=cv2.INTER_NEAREST)
+        h, w = code.shape[:2]
+        if x + w >= width or h >= height:
+            break
+        y = int(rng.integers(0, height - h))
+        frame[y:y + h, x:x + w] = cv2.cvtColor(code, cv2.COLOR_GRAY2BGR)
+        x += w + 40
+    return frame
+
+
+def load_frames(args):
+    if args.images:
+        return [cv2.imread(p) for p in iter_image_files(args.images)]
+    width, height = (int(v) for v in args.resolution.lower().split("x"))
+    rng = np.random.default_rng(args.seed)
+    frames = []
+    for i in range(args.frames):
+        payloads = [f"BENCH-{i:04d}-{j}" for j in range(args.codes)]
+        frames.append(make_synthetic_frame(width, height, payloads, args.module_px, rng))
+    return frames
+
+
+def run_mode(frames, detect, repeat):
+    times, decoded = [], 0
+    for _ in range(repeat):
+        for frame in frames:
+            t0 = time.perf_counter()
+            result = detect(frame)
+            times.append((time.perf_counter() - t0) * 1000.0)
+            decoded += sum(1 for d in result.detections if d.content)
+    times = np.array(times)
+    return times.mean(), np.percentile(times, 95), decoded / float(repeat)
+
+
+# ================== BỘ ĐO TRÊN CORPUS TỔNG HỢP ==================
+
+# Cấu hình gốc; mỗi trục trong SUITE_AXES được quét riêng, các trục khác giữ gốc
+SUITE_BASE = {
+    "payload": 32,      # số ký tự nội dung
+    "module_px": 5,     # kích thước 1 module (px)
+    "rotation": 0,      # góc xoay (độ)
+    "blur": 0.0,        # sigma Gaussian blur
+    "noise": 0.0,       # độ lệch chuẩn nhiễu Gauss
+    "perspective": 0.0, # độ lệch góc ngẫu nhiên, tỉ lệ theo cạnh mã
+    "codes": 2,         # số mã mỗi ảnh
+}
+SUITE_AXES = {
+    "payload": (8, 64, 160),
+    "module_px": (2, 3, 8),
+    "rotation": (15, 45, 90),
+    "blur": (1.0, 2.0, 3.0),
+    "noise": (8.0, 16.0, 32.0),
+    "perspective": (0.05, 0.1, 0.2),
+    "codes": (1, 4, 8),
+}
+_PAYLOAD_CHARS = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_/:."))
+
+
+def suite_configs(axes):
+    """[(tên, cấu hình)]: cấu hình gốc rồi từng giá trị của các trục được chọn."""
+    configs = [("gốc", dict(SUITE_BASE))]
+    for axis in axes:
+        for value in SUITE_AXES[axis]:
+            configs.append((f"{axis}={value}", {**SUITE_BASE, axis: value}))
+    return configs
+
+
+def make_payload(length, tag, rng):
+    """Nội dung ngẫu nhiên đúng length ký tự, bắt đầu bằng tag để không trùng nhau."""
+    body = "".join(rng.choice(_PAYLOAD_CHARS, size=max(0, length - len(tag))))
+    return (tag + body)[:max(length, 1)]
+
+
+def render_corpus_image(config, width, height, payloads, rng):
+    """Ảnh nền nhiễu với các mã QR xoay/phối cảnh trong lưới ô, rồi blur + nhiễu toàn ảnh."""
+    frame = rng.integers(90, 170, size=(height, width, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (0, 0), 3)
+    encoder = cv2.QRCodeEncoder.create()
+    cols = int(np.ceil(np.sqrt(len(payloads))))
+    rows = int(np.ceil(len(payloads) / cols))
+    cell_w, cell_h = width // cols, height // rows
+    m = config["module_px"]
+
+    for i, payload in enumerate(payloads):
+        code = encoder.encode(payload)
+        # Viền trắng đủ 4 module (encoder chỉ để 2) rồi phóng theo kích thước module
+        code = cv2.copyMakeBorder(code, 2, 2, 2, 2, cv2.BORDER_CONSTANT, value=255)
+        code = cv2.resize(code, None, fx=m, fy=m, interpolation=cv2.INTER_NEAREST)
+        side = code.shape[0]
+        if side * 1.45 > min(cell_w, cell_h):
+            raise ValueError(
+                f"mã {side}px không vừa ô {cell_w}x{cell_h}: tăng --resolution hoặc giảm số mã/module"
+            )
+        cx = (i % cols) * cell_w + cell_w / 2 + rng.uniform(-0.1, 0.1) * cell_w
+        cy = (i // cols) * cell_h + cell_h / 2 + rng.uniform(-0.1, 0.1) * cell_h
+
+        # 4 góc đích: xoay quanh tâm ô + lệch ngẫu nhiên từng góc (phối cảnh)
+        half = side / 2.0
+        corners = np.array([[-half, -half], [half, -half], [half, half], [-half, half]])
+        theta = np.deg2rad(config["rotation"])
+        rot = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+        corners = corners @ rot.T
+        corners += rng.uniform(-1, 1, size=(4, 2)) * config["perspective"] * side
+        dst = (corners + [cx, cy]).astype(np.float32)
+        src = np.float32([[0, 0], [side, 0], [side, side], [0, side]])
+        matrix = cv2.getPerspectiveTransform(src, dst)
+
+        warped = cv2.warpPerspective(code, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                                     borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        mask = cv2.warpPerspective(np.full_like(code, 255), matrix, (width, height),
+                                   flags=cv2.INTER_NEAREST, borderValue=0)
+        frame[mask > 0] = cv2.cvtColor(warped, cv2.COLOR_GRAY2BGR)[mask > 0]
+
+    if config["blur"] > 0:
+        frame = cv2.GaussianBlur(frame, (0, 0), config["blur"])
+    if config["noise"] > 0:
+        noise = rng.normal(0.0, config["noise"], size=frame.shape)
+        frame = np.clip(frame + noise, 0, 255).astype(np.uint8)
+    return frame
+
+
+def build_corpus(config, count, width, height, seed):
+    """[(ảnh, [nội dung thật])], tái lập được từ seed."""
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for i in range(count):
+        payloads = [make_payload(config["payload"], f"{i}.{j}:", rng) for j in range(config["codes"])]
+        corpus.append((render_corpus_image(config, width, height, payloads, rng), payloads))
+    return corpus
+
+
+def save_corpus(directory, name, corpus):
+    """Ghi ảnh PNG + manifest.jsonl (ảnh -> nội dung thật) để dùng lại ngoại tuyến."""
+    os.makedirs(directory, exist_ok=True)
+    safe = name.replace("=", "_").replace(".", "p")
+    with open(os.path.join(directory, "manifest.jsonl"), "a", encoding="utf-8") as f:
+        for i, (image, payloads) in enumerate(corpus):
+            filename = f"{safe}_{i:03d}.png"
+            cv2.imwrite(os.path.join(directory, filename), image)
+            f.write(json.dumps({"file": filename, "config": name, "payloads": payloads},
+                               ensure_ascii=False) + "\n")
+
+
+def pyramid_with_crops(frame, scaler, use_enhance=True, backend="opencv"):
+    """Như detect_with_crops nhưng qua detect_qr_pyramid với tỉ lệ/số mã chờ từ scaler (như camera)."""
+    scale = scaler.next_scale(frame.shape)
+    result = detect_qr_pyramid(frame, scale, use_enhance, backend=backend, expected=scaler.expected())
+    scaler.observe(result.detections)
+    crops = [frame[y1:y2, x1:x2].copy() for (x1, y1, x2, y2) in (d.bbox for d in result.detections)]
+    return result, crops
+
+
+def bench_config(corpus, enhance, backend, repeat, codec, pyramid=False):
+    """Đo enhance_for_qr và đường xử lý lưu mã trên một corpus; trả về dict số liệu.
+
+    pyramid=True: nhận diện qua pyramid_with_crops, scaler mới cho mỗi lượt lặp.
+    """
+    images = [image for image, _ in corpus]
+    megapixels = sum(image.shape[0] * image.shape[1] for image in images) / 1e6
+    ext, params = crop_write_params(codec)
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for image in images:
+            enhance_for_qr(image)
+    enhance_s = (time.perf_counter() - t0) / repeat
+
+    expected = sum(len(payloads) for _, payloads in corpus)
+    decoded = wrong = located = 0
+    t0 = time.perf_counter()
+    for run in range(repeat):
+        # Giống luồng lưu mã: nhận diện + cắt ROI, chống trùng theo digest, mã hoá ảnh cắt
+        seen = DigestSet()
+        scaler = PyramidScaler()
+        for image, payloads in corpus:
+            if pyramid:
+                result, crops = pyramid_with_crops(image, scaler, enhance, backend)
+            else:
+                result, crops = detect_with_crops(image, enhance, backend)
+            truth = set(payloads)
+            for det, crop in zip(result.detections, crops):
+                if det.content and not seen.add(det.content):
+                    continue
+                cv2.imencode(ext, crop, params)
+                if run == 0:
+                    located += 1
+                    if det.content in truth:
+                        decoded += 1
+                    elif det.content:
+                        wrong += 1
+    pipeline_s = (time.perf_counter() - t0) / repeat
+
+    return {
+        "images": len(images),
+        "megapixels": round(megapixels, 3),
+        "enhance_img_s": round(len(images) / enhance_s, 2) if enhance_s else 0.0,
+        "enhance_mp_s": round(megapixels / enhance_s, 2) if enhance_s else 0.0,
+        "pipeline_img_s": round(len(images) / pipeline_s, 2) if pipeline_s else 0.0,
+        "pipeline_mp_s": round(megapixels / pipeline_s, 2) if pipeline_s else 0.0,
+        "expected": expected,
+        "located": located,
+        "decoded": decoded,
+        "wrong": wrong,
+        "decode_rate": round(decoded / expected, 4) if expected else 0.0,
+    }
+
+
+def run_suite(args):
+    width, height = (int(v) for v in args.resolution.lower().split("x"))
+    axes = list(SUITE_AXES) if args.axes == "all" else [a for a in args.axes.split(",") if a]
+    unknown = [a for a in axes if a not in SUITE_AXES]
+    if unknown:
+        raise SystemExit(f"trục không hợp lệ: {', '.join(unknown)} (có: {', '.join(SUITE_AXES)})")
+    enhance = not args.no_enhance
+    modes = ("toàn khung", "pyramid") if args.pyramid else ("toàn khung",)
+
+    print(f"corpus {width}x{height}, {args.per_config} ảnh/cấu hình, lặp {args.repeat} lần, "
+          f"backend {args.backend}, tăng cường {'bật' if enhance else 'tắt'}, seed {args.seed}, "
+          f"{os.cpu_count()} core")
+    print(f"{'cấu hình':<30}{'enh ảnh/s':>10}{'enh MP/s':>10}{'ảnh/s':>9}{'MP/s':>8}"
+          f"{'giải mã':>12}{'sai':>5}")
+    results = []
+    for index, (name, config) in enumerate(suite_configs(axes)):
+        try:
+            corpus = build_corpus(config, args.per_config, width, height, args.seed + index)
+        except ValueError as e:
+            print(f"{name:<30}bỏ qua: {e}")
+            continue
+        if args.save_corpus:
+            save_corpus(args.save_corpus, name, corpus)
+        for mode in modes:
+            stats = bench_config(corpus, enhance, args.backend, args.repeat, args.codec,
+                                 pyramid=mode == "pyramid")
+            results.append({"name": name, "mode": mode, "config": config, **stats})
+            label = name if len(modes) == 1 else f"{name} [{mode}]"
+            print(f"{label:<30}{stats['enhance_img_s']:>10.1f}{stats['enhance_mp_s']:>10.1f}"
+                  f"{stats['pipeline_img_s']:>9.1f}{stats['pipeline_mp_s']:>8.1f}"
+                  f"{stats['decoded']:>6}/{stats['expected']:<4} {stats['decode_rate']:>4.0%}"
+                  f"{stats['wrong']:>4}")
+
+    if len(modes) > 1:
+        for mode in modes:
+            rows = [r for r in results if r["mode"] == mode]
+            print(f"tổng {mode}: {sum(r['decoded'] for r in rows)}/{sum(r['expected'] for r in rows)} mã")
+
+    if args.json:
+        report = {
+            "resolution": [width, height],
+            "per_config": args.per_config,
+            "repeat": args.repeat,
+            "backend": args.backend,
+            "enhance": enhance,
+            "pyramid": args.pyramid,
+            "seed": args.seed,
+            "opencv": cv2.__version__,
+            "cpu_count": os.cpu_count(),
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Đã ghi {args.json}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", help="thư mục ảnh thật (mặc định: sinh khung tổng hợp)")
+    parser.add_argument("--resolution", default="1920x1080", help="kích thước khung tổng hợp WxH")
+    parser.add_argument("--frames", type=int, default=10, help="số khung tổng hợp")
+    parser.add_argument("--codes", type=int, default=3, help="số mã QR mỗi khung tổng hợp")
+    parser.add_argument("--module-px", type=int, default=6, help="kích thước 1 module QR (px)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", default="opencv")
+    parser.add_argument("--no-enhance", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--suite", action="store_true", help="chạy bộ đo trên corpus tổng hợp")
+    parser.add_argument("--axes", default="all", help="các trục quét, cách nhau bởi dấu phẩy (mặc định: all)")
+    parser.add_argument("--per-config", type=int, default=8, help="số ảnh mỗi cấu hình (--suite)")
+    parser.add_argument("--pyramid", action="store_true",
+                        help="chạy thêm đường dò thô + giải mã mịn và so với toàn khung (--suite)")
+    parser.add_argument("--codec", default="png", help="định dạng mã hoá ảnh cắt (--suite)")
+    parser.add_argument("--save-corpus", help="ghi corpus + manifest.jsonl vào thư mục này (--suite)")
+    parser.add_argument("--json", help="ghi kết quả --suite ra file JSON")
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        run_suite(args)
+        return
+
+    frames = [f for f in load_frames(args) if f is not None]
+    if not frames:
+        parser.error("không có ảnh nào để đo")
+    enhance = not args.no_enhance
+
+    # Làm nóng detector và lấy kích thước QR để chọn tỉ lệ + số mã chờ như trên camera
+    scaler = PyramidScaler(full_every=0)
+    for frame in frames:
+        scaler.observe(detect_qr_codes(frame, enhance, backend=args.backend).detections)
+    scale = scaler.next_scale(frames[0].shape)
+    expected = scaler.expected()
+
+    modes = [("toàn khung", lambda f: detect_qr_codes(f, enhance, backend=args.backend))]
+    if scale < 1.0:
+        modes.append((f"pyramid x{scale:.2f}", lambda f: detect_qr_pyramid(
+            f, scale, enhance, backend=args.backend, expected=expected)))
+    h, w = frames[0].shape[:2]
+    print(f"{len(frames)} khung {w}x{h}, lặp {args.repeat} lần, backend {args.backend}, "
+          f"tăng cường {'bật' if enhance else 'tắt'}, {os.cpu_count()} core")
+    print(f"{'chế độ':<16}{'TB (ms)':>10}{'p95 (ms)':>10}{'mã/lượt':>10}{'tốc độ':>9}{'Δ mã':>8}")
+    baseline = None
+    for name, detect in modes:
+        mean_ms, p95_ms, decoded = run_mode(frames, detect, args.repeat)
+        baseline = baseline or (mean_ms, decoded)
+        lost = decoded < baseline[1]
+        print(f"{name:<16}{mean_ms:>10.1f}{p95_ms:>10.1f}{decoded:>10.1f}"
+              f"{'x' + format(baseline[0] / mean_ms, '.2f'):>9}{decoded - baseline[1]:>+8.1f}"
+              f"{'  (mất mã)' if lost else ''}")
+    if scale >= 1.0:
+        # Mã đã đủ nhỏ so với target_side: camera cũng quét toàn khung, không có gì để so
+        print(f"{'không pyramid':<16}tỉ lệ chọn được là 1.00 (mã nhỏ), pyramid chạy y như toàn khung")
+
+if __name__ == "__main__":
+    main()
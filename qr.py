@@ -1,15 +1,2444 @@
+import argparse
+import bisect
+import csv
 import datetime
+import hashlib
+import itertools
 import os
+import platform
 import sys
 import json
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
+import logging
+import math
+import multiprocessing
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from logging.handlers import RotatingFileHandler
 
-from PIL import Image, ImageTk
+try:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, simpledialog, ttk
+
+    from PIL import Image, ImageTk
+except ImportError:
+    # Máy chủ không có Tk/màn hình: vẫn dùng được chế độ dòng lệnh (qr.py scan ...)
+    tk = None
 import cv2
 import numpy as np
 
 
+# ================== NHẬN DIỆN (KHÔNG PHỤ THUỘC UI) ==================
+
+class QREnhancer:
+    """Tiền xử lý QR không cấp phát lại bộ nhớ mỗi khung.
+
+    CLAHE chỉ tạo một lần; các ảnh trung gian (gray, CLAHE, blur, sharp) được
+    cấp phát sẵn theo kích thước khung và ghi đè qua tham số dst= của OpenCV.
+    Giữ bộ đệm cho tối đa max_shapes kích thước gần nhất (khung đầy đủ, khung
+    thu nhỏ, vùng ROI...). Ảnh trả về bị ghi đè ở lần gọi sau trên cùng luồng,
+    cần .copy() nếu muốn giữ lại.
+    """
+
+    def __init__(self, clip_limit=2.0, tile_grid=(8, 8), sigma=1.0, amount=0.6, max_shapes=4):
+        self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid)
+        self.sigma = sigma
+        self.amount = amount
+        self.max_shapes = max_shapes
+        self._buffers = OrderedDict()  # (h, w) -> {tên: mảng uint8}
+
+    def _buffer(self, shape, name):
+        buffers = self._buffers.get(shape)
+        if buffers is None:
+            buffers = self._buffers[shape] = {}
+            while len(self._buffers) > self.max_shapes:
+                self._buffers.popitem(last=False)
+        else:
+            self._buffers.move_to_end(shape)
+        buf = buffers.get(name)
+        if buf is None:
+            buf = buffers[name] = np.empty(shape, dtype=np.uint8)
+        return buf
+
+    def gray(self, frame):
+        if frame.ndim == 2:
+            return frame
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._buffer(frame.shape[:2], "gray"))
+
+    def enhance(self, frame):
+        """Gray + CLAHE (tăng tương phản) + unsharp mask (làm nét biên QR)."""
+        shape = frame.shape[:2]
+        gray = self.clahe.apply(self.gray(frame), dst=self._buffer(shape, "clahe"))
+        blur = cv2.GaussianBlur(
+            gray, (0, 0), dst=self._buffer(shape, "blur"), sigmaX=self.sigma, sigmaY=self.sigma
+        )
+        return cv2.addWeighted(
+            gray, 1.0 + self.amount, blur, -self.amount, 0, dst=self._buffer(shape, "sharp")
+        )
+
+    def threshold(self, frame):
+        return cv2.adaptiveThreshold(
+            self.gray(frame), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 5,
+            dst=self._buffer(frame.shape[:2], "threshold"),
+        )
+
+    def invert(self, frame):
+        # Mã QR in ngược màu (nền tối, module sáng)
+        return cv2.bitwise_not(self.gray(frame), dst=self._buffer(frame.shape[:2], "invert"))
+
+
+_enhancer_local = threading.local()
+
+
+def get_enhancer():
+    """QREnhancer riêng của luồng hiện tại (bộ đệm không dùng chung giữa các worker)."""
+    enhancer = getattr(_enhancer_local, "enhancer", None)
+    if enhancer is None:
+        enhancer = _enhancer_local.enhancer = QREnhancer()
+    return enhancer
+
+
+def enhance_for_qr(frame):
+    """
+    Tăng cường QR:
+    - Gray + CLAHE (tăng tương phản)
+    - Unsharp mask (làm nét biên QR)
+
+    Dùng QREnhancer của luồng hiện tại: ảnh trả về bị ghi đè ở lần gọi sau.
+    """
+    return get_enhancer().enhance(frame)
+
+
+class QRBackend:
+    """Giao diện chung cho các bộ nhận diện QR có thể chọn lúc chạy.
+
+    detect_multi() trả về (danh sách nội dung, mảng góc Nx4x2) hoặc ([], None).
+    Độ trễ theo từng backend được DetectionEngine gom lại (latency_report()).
+    """
+
+    name = ""
+    label = ""
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def detect_multi(self, image):
+        raise NotImplementedError
+
+    def locate(self, image):
+        """Chỉ tìm vị trí (mảng góc Nx4x2 hoặc None); mặc định dùng luôn detect_multi."""
+        _, points = self.detect_multi(image)
+        return points
+
+
+class OpenCVQRBackend(QRBackend):
+    name = "opencv"
+    label = "OpenCV QRCodeDetector"
+
+    def __init__(self):
+        self.detector = self._create_detector()
+
+    def _create_detector(self):
+        return cv2.QRCodeDetector()
+
+    def detect_multi(self, image):
+        try:
+            retval, decoded_info, points, _ = self.detector.detectAndDecodeMulti(image)
+            if not retval or points is None:
+                return [], None
+            return list(decoded_info), points
+        except Exception:
+            data, points = self.detector.detectAndDecode(image)
+            if data == "" or points is None:
+                return [], None
+            return [data], points
+
+    def locate(self, image):
+        # detectMulti bỏ qua bước giải mã, đủ cho tầng dò tìm trên ảnh thu nhỏ
+        retval, points = self.detector.detectMulti(image)
+        return points if retval else None
+
+
+class ArucoQRBackend(OpenCVQRBackend):
+    name = "aruco"
+    label = "OpenCV QRCodeDetectorAruco"
+
+    @classmethod
+    def available(cls):
+        return hasattr(cv2, "QRCodeDetectorAruco")
+
+    def _create_detector(self):
+        return cv2.QRCodeDetectorAruco()
+
+
+class WeChatQRBackend(QRBackend):
+    """Bộ nhận diện CNN của WeChat (cần opencv-contrib-python).
+
+    Nếu thư mục model (biến môi trường QR_WECHAT_MODEL_DIR hoặc ./wechat_models)
+    có đủ detect/sr .prototxt + .caffemodel thì dùng CNN, ngược lại dùng bộ
+    nhận diện truyền thống đi kèm.
+    """
+
+    name = "wechat"
+    label = "WeChat CNN (opencv-contrib)"
+    model_files = ("detect.prototxt", "detect.caffemodel", "sr.prototxt", "sr.caffemodel")
+
+    def __init__(self):
+        model_dir = os.environ.get(
+            "QR_WECHAT_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "wechat_models")
+        )
+        paths = [os.path.join(model_dir, f) for f in self.model_files]
+        if all(os.path.exists(p) for p in paths):
+            self.detector = cv2.wechat_qrcode_WeChatQRCode(*paths)
+        else:
+            self.detector = cv2.wechat_qrcode_WeChatQRCode()
+
+    @classmethod
+    def available(cls):
+        return hasattr(cv2, "wechat_qrcode_WeChatQRCode")
+
+    def detect_multi(self, image):
+        decoded_info, points = self.detector.detectAndDecode(image)
+        if not decoded_info:
+            return [], None
+        return list(decoded_info), np.array(points, dtype=np.float32).reshape(-1, 4, 2)
+
+
+QR_BACKENDS = {cls.name: cls for cls in (OpenCVQRBackend, ArucoQRBackend, WeChatQRBackend)}
+
+
+def available_backends():
+    """Tên các backend dùng được với bản OpenCV đang cài."""
+    return [name for name, cls in QR_BACKENDS.items() if cls.available()]
+
+
+class DetectorPool:
+    """Giữ sẵn instance backend đã khởi tạo cho từng luồng (không tạo lại mỗi khung)."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self, name="opencv"):
+        detectors = getattr(self._local, "detectors", None)
+        if detectors is None:
+            detectors = self._local.detectors = {}
+        detector = detectors.get(name)
+        if detector is None:
+            cls = QR_BACKENDS.get(name)
+            if cls is None or not cls.available():
+                raise ValueError(f"Backend nhận diện không khả dụng: {name}")
+            detector = detectors[name] = cls()
+        return detector
+
+
+# Mỗi process có một pool riêng; trong process, mỗi luồng có detector riêng
+detector_pool = DetectorPool()
+
+
+@dataclass
+class QRDetection:
+    """Một mã QR tìm thấy trong khung hình."""
+    content: str          # chuỗi rỗng nếu phát hiện được nhưng không đọc được
+    points: np.ndarray    # 4 góc (int, shape 4x2) theo toạ độ khung gốc
+    bbox: tuple           # (x1, y1, x2, y2) đã thêm lề, nằm trong khung
+
+
+@dataclass
+class DetectionResult:
+    """Kết quả nhận diện một khung hình, trả về từ worker (không chạm widget)."""
+    detections: list = field(default_factory=list)
+    enhance_ms: float = 0.0
+    detect_ms: float = 0.0
+    total_ms: float = 0.0
+    latency_ms: float = 0.0   # từ lúc submit đến lúc UI nhận kết quả
+    backend: str = ""
+    stage: str = ""           # tầng tăng cường cho ra kết quả
+    stage_trials: list = field(default_factory=list)  # [(tầng, ms, giải mã được?)]
+    roi_only: bool = False    # chỉ giải mã lại các vùng QR đã biết (không quét toàn khung)
+    pos_ms: float = None      # thời điểm khung trong video (ms); None với camera/ảnh
+    error: str = ""
+
+
+def _threshold_for_qr(frame):
+    return get_enhancer().threshold(frame)
+
+
+def _invert_for_qr(frame):
+    return get_enhancer().invert(frame)
+
+
+# Các tầng tiền xử lý, xếp mặc định từ rẻ đến đắt
+ENHANCE_STAGES = {
+    "raw": None,
+    "clahe": enhance_for_qr,
+    "threshold": _threshold_for_qr,
+    "invert": _invert_for_qr,
+}
+DEFAULT_CASCADE = ("raw", "clahe", "threshold", "invert")
+BLIND_STAGES = 2
+
+
+def resolve_stages(use_enhance=True, stages=None):
+    """Danh sách tầng sẽ thử: stages nếu có, ngược lại toàn bộ cascade hoặc chỉ ảnh gốc."""
+    if stages:
+        return tuple(stages)
+    return DEFAULT_CASCADE if use_enhance else ("raw",)
+
+
+def detect_qr_codes(frame, use_enhance=True, pad=10, backend="opencv", stages=None, blind_limit=None):
+    """Cascade tăng cường + detectAndDecodeMulti, trả về DetectionResult.
+
+    Thử lần lượt các tầng (mặc định: ảnh gốc -> CLAHE + làm nét -> ngưỡng
+    thích nghi -> đảo màu) và dừng ở tầng đầu tiên giải mã được nội dung;
+    nếu không tầng nào đọc được thì giữ tầng phát hiện được nhiều mã nhất.
+    blind_limit (camera trực tiếp truyền BLIND_STAGES): khi chưa tầng nào thấy
+    dấu hiệu QR thì chỉ thử blind_limit tầng đầu để khung trống không phải
+    chạy hết cascade; mặc định (None) quét ảnh/video chạy đủ mọi tầng để mã
+    đảo màu hoặc tương phản thấp vẫn được giải mã.
+    Hàm thuần ở cấp module để chạy được trong cả thread pool lẫn process pool.
+    """
+    result = DetectionResult(backend=backend)
+    detector = detector_pool.get(backend)
+    t0 = time.perf_counter()
+
+    best = None  # (decoded_info, points, stage)
+    for index, stage in enumerate(resolve_stages(use_enhance, stages)):
+        if best is None and blind_limit is not None and index >= blind_limit:
+            break
+        s0 = time.perf_counter()
+        transform = ENHANCE_STAGES[stage]
+        frame_for_detect = frame if transform is None else transform(frame)
+        s1 = time.perf_counter()
+        decoded_info, points = detector.detect_multi(frame_for_detect)
+        s2 = time.perf_counter()
+
+        result.enhance_ms += (s1 - s0) * 1000.0
+        result.detect_ms += (s2 - s1) * 1000.0
+        hit = any(c and c.strip() for c in decoded_info)
+        result.stage_trials.append((stage, (s2 - s0) * 1000.0, hit))
+
+        if points is not None and (best is None or len(points) > len(best[1])):
+            best = (decoded_info, points, stage)
+        if hit:
+            best = (decoded_info, points, stage)
+            break
+
+    if best is not None:
+        decoded_info, points, result.stage = best
+        pts = np.array(points, dtype=np.float32)
+        if pts.ndim == 2:
+            pts = pts[np.newaxis, :, :]
+
+        h, w = frame.shape[:2]
+        for idx, qr_pts in enumerate(pts):
+            qr_pts = qr_pts.reshape(-1, 2).astype(int)
+            xs, ys = qr_pts[:, 0], qr_pts[:, 1]
+            x1 = max(int(xs.min()) - pad, 0)
+            y1 = max(int(ys.min()) - pad, 0)
+            x2 = min(int(xs.max()) + pad, w)
+            y2 = min(int(ys.max()) + pad, h)
+            if x2 <= x1 or y2 <= y1:
+                continue
+
+            content = ""
+            if idx < len(decoded_info):
+                content = (decoded_info[idx] or "").strip()
+            result.detections.append(QRDetection(content, qr_pts, (x1, y1, x2, y2)))
+
+    result.total_ms = (time.perf_counter() - t0) * 1000.0
+    return result
+
+
+class EnhancementCascade:
+    """Thống kê tỉ lệ trúng từng tầng tăng cường và tự sắp lại thứ tự thử.
+
+    Thứ tự tối ưu cho cascade dừng-khi-trúng là tăng dần theo
+    (thời gian trung bình / xác suất trúng); xác suất được làm trơn Laplace.
+    Cứ explore_every lần lại đưa một tầng phía sau lên đầu để tầng ít được
+    thử (ví dụ đảo màu) vẫn có số liệu và có cơ hội được xếp lên trước.
+    """
+
+    def __init__(self, stages=DEFAULT_CASCADE, reorder_every=50, explore_every=20):
+        self.stages = tuple(stages)
+        self.reorder_every = reorder_every
+        self.explore_every = explore_every
+        self.reset()
+
+    def reset(self):
+        self.stats = {name: [0, 0, 0.0] for name in self.stages}  # lần thử, lần trúng, tổng ms
+        self._order = self.stages
+        self._observed = 0
+        self._calls = 0
+
+    def order(self):
+        self._calls += 1
+        if self.explore_every and self._calls % self.explore_every == 0:
+            tail = self._order[BLIND_STAGES:]
+            if tail:
+                pick = tail[(self._calls // self.explore_every) % len(tail)]
+                return (pick,) + tuple(name for name in self._order if name != pick)
+        return self._order
+
+    def observe(self, result):
+        for stage, ms, hit in result.stage_trials:
+            stats = self.stats.setdefault(stage, [0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += int(hit)
+            stats[2] += ms
+        self._observed += 1
+        if self.reorder_every and self._observed % self.reorder_every == 0:
+            self._order = tuple(sorted(self.stages, key=self._expected_cost))
+
+    def _expected_cost(self, stage):
+        tries, hits, total_ms = self.stats[stage]
+        mean_ms = total_ms / tries if tries else 0.0
+        return mean_ms / ((hits + 1.0) / (tries + 2.0))
+
+    def report(self):
+        return ", ".join(
+            f"{name} {hits / tries:.0%} ({total_ms / tries:.1f} ms, n={tries})"
+            for name in self._order
+            for tries, hits, total_ms in [self.stats[name]]
+            if tries
+        )
+
+
+def detect_qr_regions(frame, regions, use_enhance=True, pad=10, backend="opencv", stages=None):
+    """Chỉ nhận diện trong các vùng (x1, y1, x2, y2) đã biết, đổi toạ độ về khung gốc."""
+    result = DetectionResult(backend=backend, roi_only=True)
+    t0 = time.perf_counter()
+    for (x1, y1, x2, y2) in regions:
+        sub = detect_qr_codes(frame[y1:y2, x1:x2], use_enhance, pad, backend, stages)
+        result.enhance_ms += sub.enhance_ms
+        result.detect_ms += sub.detect_ms
+        result.stage_trials.extend(sub.stage_trials)
+        result.stage = result.stage or sub.stage
+        for det in sub.detections:
+            bx1, by1, bx2, by2 = det.bbox
+            result.detections.append(QRDetection(
+                det.content,
+                det.points + np.array([x1, y1]),
+                (bx1 + x1, by1 + y1, bx2 + x1, by2 + y1),
+            ))
+    result.total_ms = (time.perf_counter() - t0) * 1000.0
+    return result
+
+
+def detect_qr_pyramid(frame, scale, use_enhance=True, pad=10, backend="opencv", margin=0.25,
+                      stages=None, expected=0, blind_limit=None):
+    """Dò tìm thô trên khung thu nhỏ theo scale, rồi chỉ giải mã vùng tương ứng ở độ phân giải gốc.
+
+    Mã dò thấy ở tầng thô nhưng không giải mã được ở tầng mịn vẫn được trả về
+    (nội dung rỗng) với toạ độ phóng lại từ tầng thô.
+    Khi tầng thô không thấy mã nào hoặc thấy ít hơn expected (số mã tracker /
+    kết quả gần đây đang chờ), giải mã lại toàn khung ở độ phân giải gốc để
+    không mất mã mà tầng thô bỏ sót. blind_limit giới hạn số tầng thử khi
+    chưa thấy mã như ở detect_qr_codes, cho cả tầng thô lẫn lần quét lại.
+    """
+    if scale >= 1.0:
+        return detect_qr_codes(frame, use_enhance, pad, backend, stages, blind_limit)
+
+    t0 = time.perf_counter()
+    small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    detector = detector_pool.get(backend)
+    points = None
+    prep_s = 0.0
+    coarse_trials = []
+    # Tầng thô cũng leo thang theo cascade cho tới khi tìm thấy vị trí; với
+    # blind_limit thì khung trống chỉ thử từng ấy tầng đầu như detect_qr_codes
+    for index, stage in enumerate(resolve_stages(use_enhance, stages)):
+        if blind_limit is not None and index >= blind_limit:
+            break
+        s0 = time.perf_counter()
+        transform = ENHANCE_STAGES[stage]
+        coarse_input = small if transform is None else transform(small)
+        prep_s += time.perf_counter() - s0
+        points = detector.locate(coarse_input)
+        coarse_trials.append((stage, (time.perf_counter() - s0) * 1000.0, points is not None))
+        if points is not None:
+            break
+    t2 = time.perf_counter()
+    t1 = t0 + prep_s
+
+    quads = np.zeros((0, 4, 2), np.float32) if points is None else \
+        np.array(points, dtype=np.float32).reshape(-1, 4, 2) / scale
+    if len(quads) == 0 or len(quads) < expected:
+        result = detect_qr_codes(frame, use_enhance, pad, backend, stages, blind_limit)
+        result.stage_trials[:0] = coarse_trials
+        result.enhance_ms += (t1 - t0) * 1000.0
+        result.detect_ms += (t2 - t1) * 1000.0
+        result.total_ms = (time.perf_counter() - t0) * 1000.0
+        return result
+
+    h, w = frame.shape[:2]
+    regions = []
+    for quad in quads:
+        x1, y1 = quad.min(axis=0)
+        x2, y2 = quad.max(axis=0)
+        mx, my = (x2 - x1) * margin, (y2 - y1) * margin
+        regions.append((max(int(x1 - mx), 0), max(int(y1 - my), 0),
+                        min(int(x2 + mx), w), min(int(y2 + my), h)))
+
+    result = detect_qr_regions(frame, regions, use_enhance, pad, backend, stages)
+    result.roi_only = False
+    result.stage_trials[:0] = coarse_trials
+
+    # Vùng chồng nhau có thể giải mã cùng một mã hai lần: giữ bản đầu tiên
+    unique = []
+    for det in result.detections:
+        center = det.points.mean(axis=0)
+        if not any(cv2.pointPolygonTest(u.points.astype(np.float32), tuple(map(float, center)), False) >= 0
+                   for u in unique):
+            unique.append(det)
+    # Mã chỉ thấy ở tầng thô: giữ lại với nội dung rỗng
+    for quad in quads:
+        center = tuple(map(float, quad.mean(axis=0)))
+        if not any(cv2.pointPolygonTest(u.points.astype(np.float32), center, False) >= 0 for u in unique):
+            pts = quad.astype(int)
+            x1, y1 = pts.min(axis=0)
+            x2, y2 = pts.max(axis=0)
+            bbox = (max(int(x1) - pad, 0), max(int(y1) - pad, 0),
+                    min(int(x2) + pad, w), min(int(y2) + pad, h))
+            if bbox[2] > bbox[0] and bbox[3] > bbox[1]:
+                unique.append(QRDetection("", pts, bbox))
+    result.detections = unique
+    result.enhance_ms += (t1 - t0) * 1000.0
+    result.detect_ms += (t2 - t1) * 1000.0
+    result.total_ms = (time.perf_counter() - t0) * 1000.0
+    return result
+
+
+class PyramidScaler:
+    """Chọn tỉ lệ thu nhỏ cho tầng dò tìm thô từ kích thước QR gặp gần đây.
+
+    Nhắm cạnh QR ở tầng thô khoảng target_side px; khi chưa thấy mã nào thì
+    quét toàn độ phân giải (chưa biết kích thước mã thì không đoán tỉ lệ).
+    Cứ full_every lần dò thô lại chạy một lần toàn độ phân giải để không bỏ
+    sót mã quá nhỏ. expected() là số mã nhiều nhất trong recent kết quả
+    toàn khung gần đây, để detect_qr_pyramid biết khi nào tầng thô đã bỏ sót mã.
+    """
+
+    def __init__(self, target_side=128, min_scale=0.2, full_every=10, history=20, recent=5):
+        self.target_side = target_side
+        self.min_scale = min_scale
+        self.full_every = full_every
+        self.sides = deque(maxlen=history)
+        self.counts = deque(maxlen=recent)
+        self._count = 0
+
+    def reset(self):
+        self.sides.clear()
+        self.counts.clear()
+        self._count = 0
+
+    def next_scale(self, shape):
+        self._count += 1
+        if not self.sides or (self.full_every and self._count % self.full_every == 0):
+            return 1.0
+        scale = self.target_side / float(np.median(self.sides))
+        return float(min(1.0, max(self.min_scale, scale)))
+
+    def expected(self):
+        return max(self.counts, default=0)
+
+    def observe(self, detections, roi_only=False):
+        if not roi_only:
+            self.counts.append(len(detections))
+        for det in detections:
+            pts = det.points.astype(np.float32)
+            # Cạnh ngắn nhất của tứ giác (theo toạ độ khung gốc)
+            sides = np.linalg.norm(pts - np.roll(pts, 1, axis=0), axis=1)
+            if sides.min() > 0:
+                self.sides.append(float(sides.min()))
+
+
+def spawn_process_pool(workers, initializer=None):
+    """ProcessPoolExecutor khởi tạo tiến trình con bằng "spawn".
+
+    Fork từ tiến trình đã có luồng (Tk, luồng camera, luồng ghi ảnh, luồng
+    nội bộ của cv2) có thể làm tiến trình con treo vì khoá bị sao chép khi
+    đang bị giữ; Python 3.12+ cũng cảnh báo trường hợp này.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=initializer, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+class DetectionEngine:
+    """Chạy detect_qr_codes trong pool worker (thread hoặc process).
+
+    UI gọi submit() với khung mới nhất và poll() mỗi nhịp để lấy các kết quả
+    đã xong theo đúng thứ tự khung; khi mọi worker đều bận thì khung bị bỏ qua.
+    """
+
+    def __init__(self, workers=None, mode="thread"):
+        if workers is None:
+            workers = max(1, (os.cpu_count() or 2) - 1)
+        self.workers = max(1, int(workers))
+        self.mode = mode
+        if mode == "process":
+            self._executor = spawn_process_pool(self.workers)
+        elif mode == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="qr-detect"
+            )
+        else:
+            raise ValueError(f"Chế độ pool không hợp lệ: {mode}")
+        self._pending = deque()  # (frame, future, thời điểm submit, pos_ms)
+        self.submitted = 0
+        self.skipped = 0
+        # Độ trễ nhận diện theo backend: name -> [số lần, tổng ms, ms gần nhất]
+        self.backend_latency = {}
+
+    def busy(self):
+        return len(self._pending) >= self.workers
+
+    def pending(self):
+        return len(self._pending)
+
+    def submit(self, frame, use_enhance=True, backend="opencv", regions=None, scale=1.0, stages=None,
+               expected=0, pos_ms=None, blind_limit=None):
+        """Gửi khung cho worker; trả về False nếu pool đang bận (khung bị bỏ qua).
+
+        Nếu có regions thì worker chỉ giải mã các vùng đó (detect_qr_regions);
+        nếu scale < 1 thì dò thô trên khung thu nhỏ rồi giải mã mịn (detect_qr_pyramid),
+        quét lại toàn khung khi tầng thô thấy ít hơn expected mã.
+        pos_ms (khung video) được gắn lại vào DetectionResult.pos_ms khi poll().
+        blind_limit chỉ áp cho quét toàn khung/pyramid, không áp cho regions
+        (vùng đã biết có mã nên luôn được leo thang hết cascade).
+        """
+        if self.busy():
+            self.skipped += 1
+            return False
+        if regions:
+            future = self._executor.submit(
+                detect_qr_regions, frame, regions, use_enhance, 10, backend, stages
+            )
+        elif scale < 1.0:
+            future = self._executor.submit(
+                detect_qr_pyramid, frame, scale, use_enhance, 10, backend, 0.25, stages, expected,
+                blind_limit,
+            )
+        else:
+            future = self._executor.submit(
+                detect_qr_codes, frame, use_enhance, 10, backend, stages, blind_limit
+            )
+        self._pending.append((frame, future, time.perf_counter(), pos_ms))
+        self.submitted += 1
+        return True
+
+    def poll(self, wait=False):
+        """Trả về danh sách (frame, DetectionResult) đã xong, theo thứ tự submit."""
+        completed = []
+        while self._pending:
+            frame, future, submitted_at, pos_ms = self._pending[0]
+            if not wait and not future.done():
+                break
+            self._pending.popleft()
+            try:
+                result = future.result()
+            except Exception as e:
+                result = DetectionResult(error=str(e))
+            result.latency_ms = (time.perf_counter() - submitted_at) * 1000.0
+            result.pos_ms = pos_ms
+            if result.backend and not result.error:
+                stats = self.backend_latency.setdefault(result.backend, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += result.detect_ms
+                stats[2] = result.detect_ms
+            completed.append((frame, result))
+        return completed
+
+    def latency_report(self):
+        """Chuỗi tóm tắt độ trễ trung bình của từng backend đã dùng."""
+        return ", ".join(
+            f"{name}: {total / count:.1f} ms (n={count})"
+            for name, (count, total, _) in self.backend_latency.items()
+            if count
+        )
+
+    def shutdown(self):
+        for _, future, _, _ in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=False)
+
+
+# ================== CHỈ MỤC NỘI DUNG QR ==================
+
+_U64_MASK = (1 << 64) - 1
+
+
+def content_digest(content):
+    """Băm nội dung QR thành digest cố định 16 byte (blake2b), trả về (lo, hi) 64 bit."""
+    d = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+    lo = int.from_bytes(d[:8], "little")
+    hi = int.from_bytes(d[8:], "little")
+    return lo, hi or 1  # (0, 0) đánh dấu ô trống trong bảng băm
+
+
+class BloomFilter:
+    """Bloom filter trên mảng bit numpy, dùng lại digest (lo, hi) làm double hashing."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, lo, hi):
+        return [((lo + i * hi) & _U64_MASK) % self.size for i in range(self.hashes)]
+
+    def add(self, lo, hi):
+        for p in self._positions(lo, hi):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def might_contain(self, lo, hi):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(lo, hi))
+
+    def add_many(self, keys):
+        """Thêm cả mảng digest (n, 2) uint64 một lần (phép cộng uint64 tràn vòng như _U64_MASK)."""
+        size = np.uint64(self.size)
+        for i in range(self.hashes):
+            p = (keys[:, 0] + np.uint64(i) * keys[:, 1]) % size
+            np.bitwise_or.at(self.bits, (p >> np.uint64(3)).astype(np.intp),
+                             np.left_shift(1, (p & np.uint64(7)).astype(np.uint8)).astype(np.uint8))
+
+
+class DigestSet:
+    """Tập nội dung QR chỉ giữ digest 16 byte, bảng băm địa chỉ mở trên mảng numpy.
+
+    Mỗi mã tốn 16 byte x (1 / max_load) bất kể độ dài nội dung; tra cứu và
+    thêm là O(1) (dò tuyến tính). Bảng gấp đôi khi đầy quá max_load, việc
+    băm lại được vector hoá. bloom=True đặt thêm Bloom filter phía trước để
+    loại nhanh mã chưa từng thấy. Lưu/đọc nguyên bảng bằng save()/load().
+    """
+
+    def __init__(self, capacity=1024, max_load=0.5, bloom=False):
+        self.max_load = max_load
+        self.use_bloom = bloom
+        self.count = 0
+        size = 1 << max(4, int(math.ceil(math.log2(max(1, capacity) / max_load))))
+        self._reset_table(size)
+
+    def _reset_table(self, size):
+        self.table = np.zeros((size, 2), dtype=np.uint64)
+        self.mask = size - 1
+        self.bloom = BloomFilter(int(size * self.max_load)) if self.use_bloom else None
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, content):
+        return self.contains_digest(*content_digest(content))
+
+    def add(self, content):
+        """Thêm một nội dung; trả về False nếu đã có."""
+        return self.add_digest(*content_digest(content))
+
+    def discard(self, content):
+        """Bỏ một nội dung; trả về False nếu không có.
+
+        Xoá kiểu dịch lùi: các khoá phía sau trong cùng chuỗi dò được kéo về
+        lấp ô trống để tra cứu tuyến tính không bị đứt giữa chừng. Bloom
+        filter không xoá được bit nên chỉ còn là một lần dương tính giả.
+        """
+        i, found = self._probe(*content_digest(content))
+        if not found:
+            return False
+        table, mask = self.table, self.mask
+        j = i
+        while True:
+            j = (j + 1) & mask
+            a = int(table[j, 0])
+            if a == 0 and int(table[j, 1]) == 0:
+                break
+            # Khoá ở j chỉ được dời về i nếu ô gốc của nó không nằm trong (i, j]
+            if (j - (a & mask)) & mask >= (j - i) & mask:
+                table[i] = table[j]
+                i = j
+        table[i] = 0
+        self.count -= 1
+        return True
+
+    def clear(self):
+        self.count = 0
+        self._reset_table(len(self.table))
+
+    def _probe(self, lo, hi):
+        table = self.table
+        i = lo & self.mask
+        while True:
+            a = int(table[i, 0])
+            b = int(table[i, 1])
+            if a == lo and b == hi:
+                return i, True
+            if a == 0 and b == 0:
+                return i, False
+            i = (i + 1) & self.mask
+
+    def contains_digest(self, lo, hi):
+        if self.bloom is not None and not self.bloom.might_contain(lo, hi):
+            return False
+        return self._probe(lo, hi)[1]
+
+    def add_digest(self, lo, hi):
+        if self.bloom is not None and not self.bloom.might_contain(lo, hi):
+            found = False
+            i = None
+        else:
+            i, found = self._probe(lo, hi)
+        if found:
+            return False
+        if (self.count + 1) > self.max_load * len(self.table):
+            self._grow()
+            i = None
+        if i is None:
+            i = self._probe(lo, hi)[0]
+        self.table[i, 0] = lo
+        self.table[i, 1] = hi
+        if self.bloom is not None:
+            self.bloom.add(lo, hi)
+        self.count += 1
+        return True
+
+    def digests(self):
+        """Mảng (n, 2) uint64 các digest đang có."""
+        return self.table[(self.table[:, 0] != 0) | (self.table[:, 1] != 0)]
+
+    def _grow(self):
+        keys = self.digests()
+        self.count = 0
+        self._reset_table(len(self.table) * 2)
+        self._insert_unique(keys)
+
+    def _insert_unique(self, keys):
+        """Chèn hàng loạt digest khác nhau và chưa có trong bảng (vector hoá)."""
+        if len(keys):
+            mask = np.uint64(self.mask)
+            pos = keys[:, 0] & mask
+            pending = np.arange(len(keys))
+            while len(pending):
+                slots = pos[pending].astype(np.intp)
+                empty = (self.table[slots, 0] == 0) & (self.table[slots, 1] == 0)
+                # Nhiều khoá cùng nhắm một ô trống: chỉ khoá đầu tiên được đặt
+                _, first = np.unique(slots[empty], return_index=True)
+                placed = pending[empty][first]
+                self.table[pos[placed].astype(np.intp)] = keys[placed]
+                # Khoá gặp ô đã có người thì dò ô kế tiếp; khoá thua lượt thử lại ô cũ
+                blocked = pending[~empty]
+                pos[blocked] = (pos[blocked] + np.uint64(1)) & mask
+                keep = np.ones(len(pending), dtype=bool)
+                keep[np.flatnonzero(empty)[first]] = False
+                pending = pending[keep]
+            self.count += len(keys)
+        if self.bloom is not None and len(keys):
+            self.bloom.add_many(keys)
+
+    @classmethod
+    def from_digests(cls, keys, max_load=0.5, bloom=False):
+        keys = np.unique(np.asarray(keys, dtype=np.uint64).reshape(-1, 2), axis=0)
+        store = cls(capacity=len(keys) * 2, max_load=max_load, bloom=bloom)
+        store._insert_unique(keys)
+        return store
+
+    def save(self, path, **meta):
+        """Ghi bảng digest + metadata ra .npz một cách nguyên tử."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, table=self.table, count=self.count, max_load=self.max_load, **meta)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, bloom=False):
+        """Đọc bảng đã lưu; trả về (DigestSet, dict metadata)."""
+        with np.load(path) as data:
+            meta = {k: data[k].item() for k in data.files if k not in ("table", "count", "max_load")}
+            store = cls.__new__(cls)
+            store.max_load = float(data["max_load"])
+            store.use_bloom = bloom
+            store.count = int(data["count"])
+            store.table = data["table"].astype(np.uint64, copy=False)
+            store.mask = len(store.table) - 1
+            store.bloom = None
+            if bloom:
+                store.bloom = BloomFilter(int(len(store.table) * store.max_load))
+                store.bloom.add_many(store.digests())
+        return store, meta
+
+# Thư mục ẩn trong folder xuất chứa các file chỉ mục được ghi lại nguyên tử
+# (file tạm + os.replace). Ghi trong thư mục con không đổi mtime của folder
+# gốc, nên QRFileIndex.scan() vẫn bỏ qua được folder gốc không thay đổi.
+QR_CACHE_DIR = ".qr_cache"
+
+
+class QRContentIndex:
+    """Chỉ mục nội dung QR đã lưu, dạng journal JSON Lines chỉ ghi thêm.
+
+    Mỗi mã mới là một dòng {"content": ..., "time": ...} được append vào
+    .qr_index.jsonl nên chi phí lưu là O(1) thay vì ghi lại toàn bộ file.
+    Trong bộ nhớ chỉ giữ digest 16 byte của mỗi mã (DigestSet); bảng digest
+    được chụp ra QR_CACHE_DIR/digests.npz kèm vị trí byte trong journal, lần
+    mở sau chỉ cần đọc phần journal ghi thêm sau bản chụp. Journal được nén
+    lại (ghi file tạm rồi os.replace) khi số dòng thừa quá nhiều. Lần đầu mở
+    folder cũ, .qr_metadata.json được nhập vào journal.
+    """
+
+    journal_name = ".qr_index.jsonl"
+    snapshot_name = "digests.npz"
+    legacy_name = ".qr_metadata.json"
+    legacy_snapshot_name = ".qr_index.digests.npz"  # bản chụp cũ nằm ở folder gốc
+
+    def __init__(self, directory, compact_min_lines=1000, compact_ratio=2.0, bloom=False):
+        self.directory = directory
+        self.path = os.path.join(directory, self.journal_name)
+        self.snapshot_path = os.path.join(directory, QR_CACHE_DIR, self.snapshot_name)
+        self.compact_min_lines = compact_min_lines
+        self.compact_ratio = compact_ratio
+        self.bloom = bloom
+        self.digests = DigestSet(bloom=bloom)
+        self._journal_lines = 0
+        self._journal_offset = 0  # byte sau dòng hoàn chỉnh cuối cùng đã nạp vào digests
+        self._snapshot_dirty = False
+        self._torn_tail = False  # dòng cuối bị cắt dở, cần xuống dòng trước khi ghi thêm
+        self._fh = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.digests)
+
+    def __contains__(self, content):
+        return content in self.digests
+
+    def load(self):
+        """Đọc bản chụp digest + phần journal ghi thêm (bỏ qua dòng hỏng); trả về số mã."""
+        with self._lock:
+            self._close_locked()
+            self.digests = DigestSet(bloom=self.bloom)
+            self._journal_lines = 0
+            self._journal_offset = 0
+            self._torn_tail = False
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            legacy_snapshot = os.path.join(self.directory, self.legacy_snapshot_name)
+            if os.path.exists(legacy_snapshot):
+                # Bản chụp chỉ là bộ đệm: bỏ bản cũ, journal được đọc lại một lần
+                os.remove(legacy_snapshot)
+
+            if os.path.exists(self.path):
+                self._load_snapshot_locked()
+                self._read_journal_locked()
+                if self._needs_compaction_locked():
+                    self._compact_locked()
+                elif self._snapshot_dirty:
+                    self._save_snapshot_locked()
+            else:
+                legacy_path = os.path.join(self.directory, self.legacy_name)
+                legacy = []
+                if os.path.exists(legacy_path):
+                    with open(legacy_path, "r", encoding="utf-8") as f:
+                        legacy = json.load(f).get("qr_contents", [])
+                # Tạo journal ngay cả khi rỗng để lần sau không nhập lại file cũ
+                self._import_locked(legacy)
+            return len(self.digests)
+
+    def _load_snapshot_locked(self):
+        """Dùng bản chụp nếu nó khớp journal hiện tại (cùng inode, chưa bị cắt ngắn)."""
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            digests, meta = DigestSet.load(self.snapshot_path, bloom=self.bloom)
+        except (OSError, ValueError, KeyError):
+            return
+        st = os.stat(self.path)
+        if meta.get("journal_ino") != st.st_ino or meta.get("journal_offset", 0) > st.st_size:
+            return
+        self.digests = digests
+        self._journal_offset = int(meta["journal_offset"])
+        self._journal_lines = int(meta.get("journal_lines", len(digests)))
+
+    def _read_journal_locked(self):
+        with open(self.path, "rb") as f:
+            f.seek(self._journal_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    self._torn_tail = True
+                    break
+                self._journal_offset += len(line)
+                self._journal_lines += 1
+                self._snapshot_dirty = True
+                try:
+                    content = json.loads(line)["content"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if content:
+                    self.digests.add(content)
+
+    def add(self, content):
+        """Ghi thêm một mã; trả về False nếu mã đã có trong chỉ mục."""
+        with self._lock:
+            if not content or not self.digests.add(content):
+                return False
+            self._append_locked(content)
+            return True
+
+    def _append_locked(self, content):
+        if self._fh is None:
+            self._fh = open(self.path, "ab")
+        record = {"content": content, "time": datetime.datetime.now().isoformat()}
+        if self._torn_tail:
+            # Phần dở dang thành một dòng hỏng, bị bỏ qua khi đọc lại
+            self._journal_offset = self._fh.tell() + 1
+            self._fh.write(b"\n")
+            self._torn_tail = False
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        self._fh.write(line)
+        self._fh.flush()
+        self._journal_offset += len(line)
+        self._journal_lines += 1
+        self._snapshot_dirty = True
+
+    def _needs_compaction_locked(self):
+        return self._journal_lines > max(
+            self.compact_min_lines, self.compact_ratio * len(self.digests)
+        )
+
+    def compact(self):
+        with self._lock:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        """Ghi lại journal gọn (mỗi mã một dòng, giữ thời gian gốc) một cách nguyên tử."""
+        self._close_locked()
+        tmp_path = self.path + ".tmp"
+        seen = DigestSet(capacity=len(self.digests), bloom=self.bloom)
+        with open(self.path, "r", encoding="utf-8", errors="replace") as src, \
+                open(tmp_path, "w", encoding="utf-8") as f:
+            for line in src:
+                try:
+                    record = json.loads(line)
+                    content = record["content"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if content and seen.add(content):
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._after_rewrite_locked(seen)
+
+    def _import_locked(self, contents):
+        """Tạo journal mới từ danh sách nội dung (nhập từ .qr_metadata.json)."""
+        tmp_path = self.path + ".tmp"
+        seen = DigestSet(capacity=len(contents), bloom=self.bloom)
+        now = datetime.datetime.now().isoformat()
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for content in contents:
+                if content and seen.add(content):
+                    f.write(json.dumps({"content": content, "time": now}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._after_rewrite_locked(seen)
+
+    def _after_rewrite_locked(self, digests):
+        self.digests = digests
+        self._journal_lines = len(digests)
+        self._journal_offset = os.path.getsize(self.path)
+        self._torn_tail = False
+        self._save_snapshot_locked()
+
+    def _save_snapshot_locked(self):
+        self.digests.save(
+            self.snapshot_path,
+            journal_ino=os.stat(self.path).st_ino,
+            journal_offset=self._journal_offset,
+            journal_lines=self._journal_lines,
+        )
+        self._snapshot_dirty = False
+
+    def close(self):
+        """Đóng journal và chụp lại bảng digest để lần mở sau không phải đọc lại."""
+        with self._lock:
+            self._close_locked()
+            if self._snapshot_dirty and os.path.exists(self.path):
+                try:
+                    self._save_snapshot_locked()
+                except OSError:
+                    pass
+
+    def _close_locked(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+QR_CROP_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def is_qr_crop_file(filename):
+    """File ảnh QR do app lưu ra (qr_*.png/jpg)."""
+    return filename.startswith('qr_') and filename.lower().endswith(QR_CROP_EXTENSIONS)
+
+
+def decode_qr_file(file_path, backend="opencv"):
+    """Đọc một file ảnh và trả về danh sách nội dung QR giải mã được."""
+    img = cv2.imread(file_path)
+    if img is None:
+        return []
+    decoded_info, _ = detector_pool.get(backend).detect_multi(img)
+    return [c.strip() for c in decoded_info if c and c.strip()]
+
+
+def _init_scan_worker():
+    # Mỗi process chỉ dùng 1 luồng OpenCV để tổng thể scale theo số core
+    cv2.setNumThreads(1)
+
+
+def decode_qr_file_chunk(directory, items, backend="opencv"):
+    """Giải mã một nhóm file [(filename, size, mtime_ns)] trong process worker."""
+    results = []
+    for filename, size, mtime_ns in items:
+        try:
+            contents = decode_qr_file(os.path.join(directory, filename), backend)
+        except Exception:
+            contents = []
+        results.append((filename, size, mtime_ns, contents))
+    return results
+
+
+class ParallelFolderScan:
+    """Quét lại folder lớn bằng process pool, chạy nền và huỷ được.
+
+    File được chia thành từng nhóm chunk_size; kết quả từng nhóm được đẩy vào
+    hàng đợi results ngay khi xong để UI cập nhật dần tiến độ và chỉ mục.
+    """
+
+    def __init__(self, directory, items, backend="opencv", workers=None, chunk_size=64):
+        self.directory = directory
+        self.items = list(items)
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 2
+        self.chunk_size = max(1, chunk_size)
+        self.total = len(self.items)
+        self.processed = 0  # số file UI đã nhận kết quả
+        self.results = queue.Queue()
+        self.errors = 0
+        self.started_at = None
+        self._cancel_event = threading.Event()
+        self.finished = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="qr-folder-scan", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def _run(self):
+        chunks = iter(
+            self.items[i:i + self.chunk_size] for i in range(0, self.total, self.chunk_size)
+        )
+        executor = spawn_process_pool(self.workers, _init_scan_worker)
+        pending = set()
+        try:
+            while not self._cancel_event.is_set():
+                # Giữ tối đa 2 nhóm/worker đang chờ để huỷ được nhanh
+                while len(pending) < self.workers * 2:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    pending.add(executor.submit(
+                        decode_qr_file_chunk, self.directory, chunk, self.backend
+                    ))
+                if not pending:
+                    break
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        self.results.put(future.result())
+                    except Exception:
+                        self.errors += 1
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.finished.set()
+
+    def drain(self):
+        """Lấy mọi kết quả đã có [(filename, size, mtime_ns, contents)]."""
+        items = []
+        while True:
+            try:
+                items.extend(self.results.get_nowait())
+            except queue.Empty:
+                self.processed += len(items)
+                return items
+
+
+class RecentlySeenCache:
+    """Bộ nhớ "vừa thấy" có TTL + LRU: mỗi mã chỉ báo một lần cho mỗi lần xuất hiện.
+
+    seen(key) trả về True nếu key đã được thấy trong vòng ttl giây và làm mới
+    mốc thời gian; mã phải rời khung hình quá ttl giây mới được báo lại.
+    """
+
+    def __init__(self, ttl=2.0, max_entries=512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._last_seen = OrderedDict()  # key -> time.monotonic() lần thấy gần nhất
+
+    def seen(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        last = self._last_seen.pop(key, None)
+        self._last_seen[key] = now
+        if len(self._last_seen) > self.max_entries:
+            self._last_seen.popitem(last=False)
+        return last is not None and now - last <= self.ttl
+
+    def clear(self):
+        self._last_seen.clear()
+
+    def __len__(self):
+        return len(self._last_seen)
+
+
+class CropNamer:
+    """Sinh tên file qr_<thời gian>_<số thứ tự>.png, không trùng trong cùng một giây."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._seq = 0
+
+    def next(self, ext=".png"):
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        with self._lock:
+            if stamp != self._stamp:
+                self._stamp = stamp
+                self._seq = 0
+            self._seq += 1
+            return f"qr_{stamp}_{self._seq}{ext}"
+
+
+# Định dạng lưu ảnh QR: tên -> (đuôi file, cờ imwrite, mức mặc định, (min, max))
+CROP_CODECS = {
+    "png": (".png", cv2.IMWRITE_PNG_COMPRESSION, 3, (0, 9)),
+    "jpg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, 95, (1, 100)),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, 90, (1, 100)),
+}
+
+
+def crop_write_params(codec="png", level=None):
+    """(đuôi file, tham số imwrite) cho codec và mức nén/chất lượng."""
+    ext, flag, default, (low, high) = CROP_CODECS[codec]
+    level = default if level is None else min(max(int(level), low), high)
+    return ext, [flag, level]
+
+
+# Cách chia thư mục con trong folder xuất (archive lớn: tránh một thư mục hàng trăm nghìn file)
+#   flat: mọi ảnh nằm ngay trong folder xuất (như cũ)
+#   date: <YYYYmmdd>/<HH>/ theo thời điểm lưu
+#   hash: <2 ký tự hex>/ theo băm nội dung (256 thư mục, phân bố đều)
+CROP_LAYOUTS = ("flat", "date", "hash")
+
+
+def crop_relpath(filename, layout="flat", content="", mtime=None, shard=None):
+    """Đường dẫn tương đối (ngăn cách bằng '/') của một ảnh QR theo kiểu chia thư mục.
+
+    shard: thư mục băm đã tính sẵn (crop_shard), dùng thay cho content với layout hash.
+    """
+    name = os.path.basename(filename)
+    if layout == "date":
+        # Tên do CropNamer sinh đã chứa thời điểm lưu: qr_YYYYmmdd_HHMMSS_n
+        parts = name.split("_")
+        if len(parts) >= 3 and parts[1].isdigit() and len(parts[1]) == 8 and parts[2][:2].isdigit():
+            day, hour = parts[1], parts[2][:2]
+        else:
+            when = datetime.datetime.fromtimestamp(mtime) if mtime else datetime.datetime.now()
+            day, hour = when.strftime("%Y%m%d"), when.strftime("%H")
+        return f"{day}/{hour}/{name}"
+    if layout == "hash":
+        return f"{shard or crop_shard(content or name)}/{name}"
+    return name
+
+
+def crop_shard(key):
+    """Thư mục con (2 ký tự hex) của layout hash cho một nội dung, hoặc tên file nếu không đọc được."""
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=1).hexdigest()
+
+
+class CropWriter:
+    """Luồng nền ghi ảnh QR theo lô, với hàng đợi giới hạn để tạo back-pressure.
+
+    submit() chỉ đưa ảnh vào hàng đợi; khi đĩa ghi không kịp và hàng đợi đầy,
+    submit() chờ tối đa block_timeout giây rồi báo thất bại. congested() cho
+    phía gọi biết để tạm giảm nhịp nhận diện trước khi phải chờ. Kết quả ghi
+    (directory, filename, contents, lỗi) được đưa vào completed để luồng UI
+    cập nhật chỉ mục.
+    """
+
+    def __init__(self, max_queue=64, batch_size=16, block_timeout=0.5, stats=None):
+        self.stats = stats  # PipelineStats tuỳ chọn: đo thời gian imwrite
+        self.batch_size = batch_size
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.completed = queue.Queue()
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        self._made_dirs = set()  # thư mục con đã tạo (layout chia thư mục)
+        self._thread = threading.Thread(target=self._run, name="qr-writer", daemon=True)
+        self._thread.start()
+
+    def congested(self, ratio=0.75):
+        return self._queue.qsize() >= self._queue.maxsize * ratio
+
+    def submit(self, directory, filename, image, params, contents=()):
+        try:
+            self._queue.put((directory, filename, image, params, list(contents)),
+                            timeout=self.block_timeout)
+            return True
+        except queue.Full:
+            self.rejected += 1
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            # Gom thêm các ảnh đang chờ để ghi liền một lượt
+            while len(batch) < self.batch_size:
+                try:
+                    extra = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is None:
+                    self._queue.put(None)
+                    self._queue.task_done()
+                    break
+                batch.append(extra)
+            for directory, filename, image, params, contents in batch:
+                error = ""
+                try:
+                    path = os.path.join(directory, filename)
+                    parent = os.path.dirname(path)
+                    if parent not in self._made_dirs:
+                        os.makedirs(parent, exist_ok=True)
+                        self._made_dirs.add(parent)
+                    t0 = time.perf_counter()
+                    if not cv2.imwrite(path, image, params):
+                        error = "imwrite trả về False"
+                    if self.stats is not None:
+                        self.stats.record("write", (time.perf_counter() - t0) * 1000.0)
+                except Exception as e:
+                    error = str(e)
+                if error:
+                    self.failed += 1
+                else:
+                    self.written += 1
+                self.completed.put((directory, filename, contents, error))
+                self._queue.task_done()
+
+    def drain(self):
+        """Lấy các kết quả ghi đã xong [(directory, filename, contents, lỗi)]."""
+        items = []
+        while True:
+            try:
+                items.append(self.completed.get_nowait())
+            except queue.Empty:
+                return items
+
+    def flush(self):
+        """Chờ tới khi mọi ảnh trong hàng đợi đã được ghi."""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+class QRFileIndex:
+    """Chỉ mục từng file ảnh trong folder xuất: đường dẫn -> (size, mtime, thư mục băm).
+
+    Lần quét sau chỉ cần giải mã lại file mới hoặc file có size/mtime thay đổi.
+    Nội dung mã không được giữ ở đây (đã nằm trong QRContentIndex dưới dạng
+    digest): mỗi file chỉ nhớ crop_shard của mã đầu tiên (None nếu không có
+    mã) để migrate sang layout hash. Chỉ mục v1/v2 cũ còn chứa nội dung được
+    chuyển đổi khi load(), nội dung được đưa ra một lần qua take_legacy_contents().
+    Quét cả thư mục con (layout chia thư mục); mtime của từng thư mục được
+    ghi lại nên thư mục không đổi (không thêm/xoá file) không cần liệt kê lại,
+    chỉ stat các file đã biết trong đó để bắt file bị ghi đè tại chỗ. Được ghi
+    nguyên tử (file tạm + os.replace) vào QR_CACHE_DIR/files.json để việc lưu
+    không làm đổi mtime folder gốc; .qr_files.json cũ ở folder gốc được đọc
+    một lần rồi xoá. Đường dẫn là tương đối với folder xuất và luôn dùng '/'.
+    """
+
+    file_name = "files.json"
+    legacy_name = ".qr_files.json"
+    # mtime thư mục mới hơn khoảng này chưa được tin (hệ thống file có mtime thô)
+    settle_ns = 2 * 10**9
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, QR_CACHE_DIR, self.file_name)
+        self.legacy_path = os.path.join(directory, self.legacy_name)
+        self.entries = {}  # đường dẫn tương đối -> [size, mtime_ns, thư mục băm hoặc None]
+        self.dirs = {}     # thư mục tương đối ("" = gốc) -> mtime_ns lúc liệt kê
+        self.dirty = False
+        self._legacy_contents = []
+
+    def load(self):
+        self.reset()
+        self.dirty = False
+        # Tạo thư mục trước scan() để lần lưu đầu không làm đổi mtime folder gốc
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        path = self.path
+        if not os.path.exists(path) and os.path.exists(self.legacy_path):
+            path = self.legacy_path
+            self.dirty = True
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                entries = data.get("files", {})
+                if data.get("version", 1) < 3:
+                    for name, (size, mtime_ns, contents) in entries.items():
+                        self._legacy_contents.extend(contents)
+                        entries[name] = [size, mtime_ns, crop_shard(contents[0]) if contents else None]
+                    self.dirty = True
+                self.entries = entries
+                self.dirs = data.get("dirs", {})
+            except (ValueError, OSError, TypeError):
+                # Chỉ mục hỏng: quét lại toàn bộ
+                self.reset()
+        return len(self.entries)
+
+    def reset(self):
+        """Quên mọi file đã biết: lần scan() sau giải mã lại cả folder."""
+        self.entries = {}
+        self.dirs = {}
+        self._legacy_contents = []
+        self.dirty = True
+
+    def has_codes(self):
+        return any(entry[2] is not None for entry in self.entries.values())
+
+    def take_legacy_contents(self):
+        """Nội dung mã đọc từ chỉ mục v1/v2 (chỉ trả về một lần, để nạp vào chỉ mục nội dung)."""
+        contents, self._legacy_contents = self._legacy_contents, []
+        return contents
+
+    def scan(self):
+        """Liệt kê file cần giải mã lại [(đường dẫn, size, mtime_ns)], bỏ file đã xoá."""
+        stale = []
+        seen = set()
+        old_dirs = self.dirs
+        children = {}
+        for rel in old_dirs:
+            if rel:
+                children.setdefault(rel.rpartition("/")[0], []).append(rel)
+        known = {}
+        for name in self.entries:
+            known.setdefault(name.rpartition("/")[0], []).append(name)
+        self.dirs = {}
+        fresh_after = time.time_ns() - self.settle_ns
+
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            path = os.path.join(self.directory, rel) if rel else self.directory
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            self.dirs[rel] = mtime if mtime < fresh_after else -1
+            if old_dirs.get(rel, -1) == mtime:
+                # Thư mục không đổi: không thêm/xoá file, dùng danh sách con đã biết;
+                # ghi đè tại chỗ không đổi mtime thư mục nên vẫn stat từng file đã biết
+                stack.extend(children.get(rel, ()))
+                for name in known.get(rel, ()):
+                    try:
+                        st = os.stat(os.path.join(self.directory, name))
+                    except OSError:
+                        continue
+                    seen.add(name)
+                    cached = self.entries[name]
+                    if cached[0] != st.st_size or cached[1] != st.st_mtime_ns:
+                        stale.append((name, st.st_size, st.st_mtime_ns))
+                continue
+            with os.scandir(path) as it:
+                for entry in it:
+                    name = f"{rel}/{entry.name}" if rel else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith("."):
+                            stack.append(name)
+                        continue
+                    if not is_qr_crop_file(entry.name):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    seen.add(name)
+                    cached = self.entries.get(name)
+                    if cached is None or cached[0] != st.st_size or cached[1] != st.st_mtime_ns:
+                        stale.append((name, st.st_size, st.st_mtime_ns))
+
+        removed = [name for name in self.entries if name not in seen]
+        for name in removed:
+            del self.entries[name]
+        if removed or self.dirs != old_dirs:
+            self.dirty = True
+        return stale
+
+    def update(self, filename, size, mtime_ns, contents):
+        self.entries[filename] = [size, mtime_ns, crop_shard(contents[0]) if contents else None]
+        self.dirty = True
+
+    def record(self, filename, contents):
+        """Ghi nhận file vừa được app lưu (đã biết nội dung, không cần giải mã lại)."""
+        try:
+            st = os.stat(os.path.join(self.directory, filename))
+        except OSError:
+            return
+        self.update(filename, st.st_size, st.st_mtime_ns, contents)
+
+    def move(self, old, new):
+        """Đổi đường dẫn một file đã biết (di chuyển giữa các layout)."""
+        self.entries[new] = self.entries.pop(old)
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 3, "files": self.entries, "dirs": self.dirs}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        if os.path.exists(self.legacy_path):
+            os.remove(self.legacy_path)
+        self.dirty = False
+
+
+class SceneChangeGate:
+    """Bỏ qua nhận diện khi cảnh gần như không đổi.
+
+    So khung xám thu nhỏ với khung tham chiếu (khung được nhận diện gần nhất);
+    chỉ cho chạy nhận diện khi độ lệch trung bình vượt threshold, khi vừa thấy
+    QR trong hold_seconds, hoặc định kỳ sau refresh_seconds để không bỏ lỡ.
+    """
+
+    def __init__(self, size=(64, 48), threshold=3.0, hold_seconds=1.5, refresh_seconds=5.0):
+        self.size = size
+        self.threshold = threshold
+        self.hold_seconds = hold_seconds
+        self.refresh_seconds = refresh_seconds
+        self.reset()
+
+    def reset(self):
+        self._reference = None
+        self._last_run = float("-inf")
+        self._last_qr = float("-inf")
+        self.checked = 0
+        self.skipped = 0
+
+    def should_detect(self, frame, now=None):
+        now = time.monotonic() if now is None else now
+        self.checked += 1
+        # Thu nhỏ trước rồi mới chuyển xám: rẻ hơn nhiều so với xám toàn khung
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        run = (
+            self._reference is None
+            or now - self._last_qr < self.hold_seconds
+            or now - self._last_run >= self.refresh_seconds
+            or cv2.absdiff(small, self._reference).mean() >= self.threshold
+        )
+        if run:
+            self._reference = small
+            self._last_run = now
+        else:
+            self.skipped += 1
+        return run
+
+    def notify_detections(self, found, now=None):
+        """Báo kết quả nhận diện: có QR thì giữ nhận diện liên tục thêm hold_seconds."""
+        if found:
+            self._last_qr = time.monotonic() if now is None else now
+
+    def skipped_ratio(self):
+        return self.skipped / self.checked if self.checked else 0.0
+
+
+class QRTrack:
+    """Một mã QR đang được theo dõi: 4 góc (float), nội dung và kiểu khung vẽ."""
+
+    def __init__(self, points, content, overlay):
+        self.points = np.asarray(points, dtype=np.float32).reshape(4, 2)
+        self.content = content
+        self.overlay = overlay  # (màu viền, màu góc)
+
+    def bbox(self, shape, pad=10):
+        h, w = shape[:2]
+        x1, y1 = self.points.min(axis=0)
+        x2, y2 = self.points.max(axis=0)
+        return (max(int(x1) - pad, 0), max(int(y1) - pad, 0),
+                min(int(x2) + pad, w), min(int(y2) + pad, h))
+
+
+class QRTracker:
+    """Theo dõi tứ giác QR giữa các khung bằng optical flow Lucas-Kanade.
+
+    Sau mỗi lần nhận diện toàn khung, các góc QR được bám theo trên ảnh xám
+    thu nhỏ (tối đa track_width px) nên khung tiếp theo không cần quét lại
+    toàn bộ. Chỉ cần nhận diện toàn khung định kỳ (redetect_seconds) hoặc khi
+    mất dấu một mã; mã chưa đọc được chỉ giải mã lại trong vùng của nó.
+    """
+
+    def __init__(self, redetect_seconds=0.5, track_width=640, max_area_change=0.5):
+        self.redetect_seconds = redetect_seconds
+        self.track_width = track_width
+        self.max_area_change = max_area_change
+        self.reset()
+
+    def reset(self):
+        self.tracks = []
+        self.lost = False
+        self._prev_gray = None
+        self._scale = 1.0
+        self._last_full = float("-inf")
+        self.tracked_frames = 0
+
+    def _gray(self, frame):
+        h, w = frame.shape[:2]
+        self._scale = min(1.0, self.track_width / float(w))
+        if self._scale < 1.0:
+            frame = cv2.resize(
+                frame, (int(w * self._scale), int(h * self._scale)), interpolation=cv2.INTER_AREA
+            )
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+    def start(self, frame, detections, overlays, now=None):
+        """Khởi tạo lại track từ kết quả nhận diện toàn khung của frame."""
+        self._last_full = time.monotonic() if now is None else now
+        self.lost = False
+        self.tracks = [QRTrack(det.points, det.content, ov) for det, ov in zip(detections, overlays)]
+        self._prev_gray = self._gray(frame) if self.tracks else None
+
+    def track(self, frame):
+        """Bám các góc sang khung mới; trả về False nếu không còn track nào."""
+        if not self.tracks or self._prev_gray is None:
+            return False
+        gray = self._gray(frame)
+        if gray.shape != self._prev_gray.shape:
+            self.lost = True
+            self.tracks = []
+            return False
+
+        p0 = np.concatenate([t.points for t in self.tracks]).reshape(-1, 1, 2) * self._scale
+        p1, status, _ = cv2.calcOpticalFlowPyrLK(
+            self._prev_gray, gray, p0.astype(np.float32), None, winSize=(21, 21), maxLevel=3
+        )
+        p1 = p1.reshape(-1, 4, 2) / self._scale
+        status = status.reshape(-1, 4)
+
+        kept = []
+        for t, pts, ok in zip(self.tracks, p1, status):
+            old_area = cv2.contourArea(t.points)
+            new_area = cv2.contourArea(pts)
+            if ok.all() and old_area > 0 and abs(new_area / old_area - 1.0) <= self.max_area_change:
+                t.points = pts
+                kept.append(t)
+            else:
+                self.lost = True
+        self.tracks = kept
+        self._prev_gray = gray
+        self.tracked_frames += 1
+        return bool(kept)
+
+    def needs_detection(self, now=None):
+        now = time.monotonic() if now is None else now
+        return not self.tracks or self.lost or now - self._last_full >= self.redetect_seconds
+
+    def undecoded_regions(self, shape, margin=0.25):
+        """Vùng (đã nới rộng) của các mã chưa đọc được, để chỉ giải mã lại vùng đó."""
+        regions = []
+        h, w = shape[:2]
+        for t in self.tracks:
+            if t.content:
+                continue
+            x1, y1, x2, y2 = t.bbox(shape, pad=0)
+            mx, my = int((x2 - x1) * margin), int((y2 - y1) * margin)
+            regions.append((max(x1 - mx, 0), max(y1 - my, 0), min(x2 + mx, w), min(y2 + my, h)))
+        return regions
+
+    def update_content(self, detections, overlays):
+        """Gán nội dung giải mã được từ vùng vào track chứa tâm của mã."""
+        for det, ov in zip(detections, overlays):
+            if not det.content:
+                continue
+            cx, cy = det.points.mean(axis=0)
+            for t in self.tracks:
+                if not t.content and cv2.pointPolygonTest(t.points, (float(cx), float(cy)), False) >= 0:
+                    t.content = det.content
+                    t.points = det.points.astype(np.float32)
+                    t.overlay = ov
+                    break
+
+    def overlays(self):
+        return [(t.points.astype(np.int32), *t.overlay) for t in self.tracks]
+
+
+def bbox_iou(a, b):
+    """IoU của hai khung (x1, y1, x2, y2)."""
+    ix = min(a[2], b[2]) - max(a[0], b[0])
+    iy = min(a[3], b[3]) - max(a[1], b[1])
+    if ix <= 0 or iy <= 0:
+        return 0.0
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def crop_sharpness(image):
+    """Độ nét ảnh cắt: phương sai Laplacian trên ảnh xám."""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+@dataclass
+class UndecodedTrack:
+    """Một mã QR định vị được nhưng chưa giải mã được, bám theo qua nhiều khung."""
+
+    track_id: int
+    bbox: tuple
+    first_seen: float
+    last_seen: float
+    hits: int = 1
+    sharpness: float = -1.0
+    crop: object = None  # ảnh cắt nét nhất tới giờ
+
+
+class UndecodedTracker:
+    """Gán ID ổn định cho mã QR không đọc được bằng cách ghép IoU giữa các khung.
+
+    Mỗi track chỉ giữ ảnh cắt nét nhất (phương sai Laplacian). Track biến mất
+    quá max_age giây (hoặc khi flush()) được trả về đúng một lần để lưu một
+    ảnh duy nhất, thay vì mỗi khung một file như khoá theo toạ độ pixel.
+    Track trùng chỗ với mã đã giải mã được thì bị huỷ, không lưu.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=1.0, max_tracks=64):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.max_tracks = max_tracks
+        self.tracks = OrderedDict()  # id -> UndecodedTrack, cũ nhất ở đầu
+        self._ids = itertools.count(1)
+
+    def reset(self):
+        self.tracks.clear()
+
+    def update(self, frame, detections, now=None, crops=None):
+        """Ghép các mã không đọc được với track; trả về [(track, là track mới)] theo thứ tự.
+
+        now: mốc thời gian (giây) của khung, mặc định đồng hồ hệ thống; với video
+        truyền thời điểm trong video để bước nhảy/tua không làm track hết hạn sai.
+        crops: ảnh cắt sẵn khớp detections (khi không còn giữ khung gốc).
+        """
+        now = time.monotonic() if now is None else now
+        pairs = sorted(
+            ((bbox_iou(det.bbox, t.bbox), i, tid)
+             for i, det in enumerate(detections) for tid, t in self.tracks.items()),
+            reverse=True,
+        )
+        matched = {}
+        used = set()
+        for iou, i, tid in pairs:
+            if iou < self.iou_threshold:
+                break
+            if i not in matched and tid not in used:
+                matched[i] = tid
+                used.add(tid)
+
+        assigned = []
+        for i, det in enumerate(detections):
+            tid = matched.get(i)
+            if tid is None:
+                track = UndecodedTrack(next(self._ids), det.bbox, now, now)
+                self.tracks[track.track_id] = track
+            else:
+                track = self.tracks[tid]
+                track.bbox = det.bbox
+                track.last_seen = now
+                track.hits += 1
+            if crops is not None:
+                self._offer_crop(track, crops[i])
+            else:
+                x1, y1, x2, y2 = det.bbox
+                self._offer_crop(track, frame[y1:y2, x1:x2])
+            assigned.append((track, tid is None))
+        return assigned
+
+    def _offer_crop(self, track, view):
+        if view.size == 0:
+            return
+        sharpness = crop_sharpness(view)
+        if sharpness > track.sharpness:
+            track.sharpness = sharpness
+            track.crop = view.copy()
+
+    def suppress(self, bboxes):
+        """Huỷ track trùng chỗ với mã đã giải mã (mã đó được lưu theo nội dung)."""
+        for tid, track in list(self.tracks.items()):
+            if any(bbox_iou(track.bbox, b) >= self.iou_threshold for b in bboxes):
+                del self.tracks[tid]
+
+    def expire(self, now=None):
+        """Lấy ra các track đã rời khung hình (và track cũ nhất khi vượt max_tracks)."""
+        now = time.monotonic() if now is None else now
+        done = [t for t in self.tracks.values() if now - t.last_seen > self.max_age]
+        for track in done:
+            del self.tracks[track.track_id]
+        while len(self.tracks) > self.max_tracks:
+            done.append(self.tracks.popitem(last=False)[1])
+        return done
+
+    def flush(self):
+        """Kết thúc mọi track (dừng camera / hết ảnh)."""
+        done = list(self.tracks.values())
+        self.tracks.clear()
+        return done
+
+
+# Mức log: cũng là tên tag màu trong ô log
+LOG_INFO = "info"
+LOG_SUCCESS = "success"
+LOG_WARNING = "warning"
+LOG_ERROR = "error"
+LOG_HIGHLIGHT = "highlight"
+
+
+class LogBuffer:
+    """Mô hình dữ liệu của ô log: gom dòng mới, giới hạn số dòng hiển thị.
+
+    Dòng mới chỉ được xếp hàng (pending); giao diện lấy tất cả bằng take()
+    mỗi nhịp và chèn một lần. Mỗi thông báo là đúng một dòng trong widget:
+    xuống dòng bên trong (nội dung QR nhiều dòng) được hiện thành "\\n" để
+    giới hạn max_lines đếm đúng số dòng hiển thị. Toàn bộ lịch sử (giữ
+    nguyên nội dung) có thể ghi ra file log xoay vòng (RotatingFileHandler)
+    vì ô log chỉ giữ max_lines dòng cuối.
+    """
+
+    def __init__(self, max_lines=2000):
+        self.pending = deque()
+        self.set_max_lines(max_lines)
+        self.shown = 0        # số dòng đang nằm trong widget
+        self.dropped = 0      # dòng bị gộp bỏ trước khi kịp hiển thị
+        self._logger = None
+
+    def set_max_lines(self, max_lines):
+        self.max_lines = max(1, max_lines)
+        # Dòng cũ hơn cap sẽ không bao giờ được hiển thị nên không cần giữ
+        self.pending = deque(self.pending, maxlen=self.max_lines)
+
+    def open_file(self, path, max_bytes=5 * 1024 * 1024, backups=3):
+        """Ghi toàn bộ lịch sử log ra file xoay vòng"""
+        self.close()
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        self._logger = logging.getLogger(f"qr.log.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(handler)
+
+    _LEVELS = {LOG_ERROR: logging.ERROR, LOG_WARNING: logging.WARNING}
+
+    def append(self, message, tag=None):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append((message.replace("\r", "\\r").replace("\n", "\\n"), tag))
+        if self._logger is not None:
+            self._logger.log(self._LEVELS.get(tag, logging.INFO), message)
+
+    def take(self):
+        """Lấy hết dòng đang chờ; trả về (lines, số dòng cần xoá ở đầu widget)"""
+        lines = list(self.pending)
+        self.pending.clear()
+        self.shown += len(lines)
+        excess = max(0, self.shown - self.max_lines)
+        self.shown -= excess
+        return lines, excess
+
+    def clear(self):
+        self.pending.clear()
+        self.shown = 0
+
+    def close(self):
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                handler.close()
+                self._logger.removeHandler(handler)
+            self._logger = None
+
+
+class AnimationScheduler:
+    """Một vòng root.after duy nhất điều khiển mọi hiệu ứng.
+
+    Mỗi hiệu ứng có chu kỳ riêng và hàm is_active; khi không hiệu ứng nào
+    hoạt động thì vòng lặp dừng hẳn cho tới lần wake() kế tiếp. Mỗi nhịp
+    chỉ dùng tối đa budget_ms, hiệu ứng còn lại dời sang nhịp sau.
+    set_enabled(False) chỉ dừng hiệu ứng trang trí; việc essential (chèn log)
+    vẫn chạy.
+    """
+
+    def __init__(self, root, tick_ms=30, budget_ms=8.0):
+        self.root = root
+        self.tick_ms = tick_ms
+        self.budget_ms = budget_ms
+        self.enabled = True
+        # [tên, chu kỳ (s), callback, is_active, hạn chạy kế tiếp, essential]
+        self._effects = []
+        self._after_id = None
+
+    def add(self, name, interval_ms, callback, is_active, essential=False):
+        self._effects.append([name, interval_ms / 1000.0, callback, is_active, 0.0, essential])
+
+    def wake(self):
+        """Gọi khi có thể có hiệu ứng mới hoạt động (bật camera, tạo hạt, dòng log...)."""
+        if self._after_id is None:
+            self._after_id = self.root.after(0, self._tick)
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        if enabled:
+            self.wake()
+
+    def _tick(self):
+        self._after_id = None
+        start = time.perf_counter()
+        any_active = False
+        for effect in sorted(self._effects, key=lambda e: e[4]):
+            _, interval, callback, is_active, due, essential = effect
+            if not (essential or self.enabled) or not is_active():
+                continue
+            any_active = True
+            if start < due:
+                continue
+            if (time.perf_counter() - start) * 1000.0 > self.budget_ms:
+                break
+            callback()
+            effect[4] = start + interval
+        if any_active:
+            self._after_id = self.root.after(self.tick_ms, self._tick)
+
+
+class PipelineStats:
+    """Đo thời gian từng công đoạn (histogram bước √2) và FPS thực tế, đủ nhẹ cho đường nóng.
+
+    record(stage, ms) cộng vào histogram với các ngưỡng HISTOGRAM_BOUNDS (ms);
+    count(name) đếm sự kiện (khung đọc/nhận diện/hiển thị) để rates() tính FPS
+    trong cửa sổ từ lần gọi trước. Có khoá vì luồng camera và luồng ghi ảnh
+    cũng ghi số liệu. export() ghi JSON (đầy đủ) + CSV (mỗi công đoạn một dòng).
+    """
+
+    # Ngưỡng bucket (ms) tăng theo bước √2 từ 0.1 ms tới ~2.3 s
+    HISTOGRAM_BOUNDS = tuple(round(0.1 * 2 ** (i / 2), 2) for i in range(30))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}    # tên -> [count, tổng ms, max ms, [số mẫu theo bucket]]
+            self.counters = {}  # tên -> tổng số sự kiện
+            self.started = time.perf_counter()
+            self._window = (self.started, {})
+            self.last_rates = {}
+
+    def record(self, stage, ms):
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = [0, 0.0, 0.0, [0] * (len(self.HISTOGRAM_BOUNDS) + 1)]
+            stats[0] += 1
+            stats[1] += ms
+            if ms > stats[2]:
+                stats[2] = ms
+            stats[3][bisect.bisect_left(self.HISTOGRAM_BOUNDS, ms)] += 1
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def rates(self):
+        """FPS của từng bộ đếm kể từ lần gọi trước (gọi khoảng 1 lần/giây)."""
+        now = time.perf_counter()
+        with self._lock:
+            since, before = self._window
+            elapsed = now - since
+            if elapsed > 0:
+                self.last_rates = {
+                    name: (total - before.get(name, 0)) / elapsed
+                    for name, total in self.counters.items()
+                }
+            self._window = (now, dict(self.counters))
+            return dict(self.last_rates)
+
+    def percentile(self, stage, q):
+        """Phân vị xấp xỉ (cận trên của bucket chứa phân vị q), ms."""
+        with self._lock:
+            stats = self.stages.get(stage)
+            if not stats or not stats[0]:
+                return 0.0
+            target = q * stats[0]
+            seen = 0
+            for i, n in enumerate(stats[3]):
+                seen += n
+                if seen >= target:
+                    return self.HISTOGRAM_BOUNDS[i] if i < len(self.HISTOGRAM_BOUNDS) else stats[2]
+            return stats[2]
+
+    def summary(self):
+        """[{stage, count, mean_ms, p50_ms, p95_ms, max_ms}] theo thứ tự công đoạn đã ghi."""
+        rows = []
+        for stage in list(self.stages):
+            count, total, peak, _ = self.stages[stage]
+            rows.append({
+                "stage": stage,
+                "count": count,
+                "mean_ms": round(total / count, 3) if count else 0.0,
+                "p50_ms": self.percentile(stage, 0.5),
+                "p95_ms": self.percentile(stage, 0.95),
+                "max_ms": round(peak, 3),
+            })
+        return rows
+
+    def export(self, directory, meta=None):
+        """Ghi perf_<thời gian>.json và .csv vào directory; trả về (đường dẫn json, csv)."""
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(directory, f"perf_{stamp}")
+        elapsed = time.perf_counter() - self.started
+        with self._lock:
+            histograms = {
+                stage: dict(zip([*map(str, self.HISTOGRAM_BOUNDS), "inf"], stats[3]))
+                for stage, stats in self.stages.items()
+            }
+            counters = dict(self.counters)
+        summary = self.summary()
+        report = {
+            "meta": {
+                "platform": platform.platform(),
+                "processor": platform.processor(),
+                "cpu_count": os.cpu_count(),
+                "opencv": cv2.__version__,
+                "duration_s": round(elapsed, 3),
+                **(meta or {}),
+            },
+            "fps": {name: round(total / elapsed, 3) if elapsed > 0 else 0.0
+                    for name, total in counters.items()},
+            "stages": summary,
+            "histograms_ms": histograms,
+        }
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        with open(base + ".csv", "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["stage", "count", "mean_ms", "p50_ms", "p95_ms", "max_ms"])
+            writer.writeheader()
+            writer.writerows(summary)
+        return base + ".json", base + ".csv"
+
+
+# Backend đọc camera theo tên -> hằng số cv2.CAP_* ("auto": DSHOW trên Windows, ANY ở nơi khác)
+CAPTURE_BACKENDS = {
+    "auto": None,
+    "any": cv2.CAP_ANY,
+    "dshow": cv2.CAP_DSHOW,
+    "msmf": cv2.CAP_MSMF,
+    "v4l2": cv2.CAP_V4L2,
+    "avfoundation": cv2.CAP_AVFOUNDATION,
+    "gstreamer": cv2.CAP_GSTREAMER,
+    "ffmpeg": cv2.CAP_FFMPEG,
+}
+
+
+def parse_resolution(text):
+    """'1280x720' -> (1280, 720); chuỗi rỗng -> (0, 0) (giữ mặc định)."""
+    text = text.strip().lower()
+    if not text:
+        return 0, 0
+    width, sep, height = text.partition("x")
+    if not sep:
+        raise ValueError(f"độ phân giải phải có dạng WxH: {text}")
+    return int(width), int(height)
+
+
+@dataclass
+class CameraConfig:
+    """Cấu hình mở camera; 0/"" nghĩa là giữ mặc định của driver.
+
+    grab="drain": mỗi lần đọc, các khung nằm sẵn trong bộ đệm driver (grab()
+    trả về gần như tức thì) bị bỏ qua, chỉ retrieve() khung mới nhất, nên độ
+    trễ từ nhãn tới nhận diện chỉ còn khoảng một khung. grab="read": đọc
+    tuần tự như cũ.
+    """
+
+    device: str = "0"      # chỉ số thiết bị, /dev/videoN hoặc URL (rtsp://...)
+    backend: str = "auto"
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    fourcc: str = ""       # vd. MJPG: tránh giới hạn băng thông YUYV không nén trên USB
+    buffer_size: int = 1   # CAP_PROP_BUFFERSIZE
+    grab: str = "drain"    # "drain" | "read"
+    flip: bool = True
+
+    def api_preference(self):
+        api = CAPTURE_BACKENDS.get(self.backend)
+        if api is None:
+            # DirectShow chỉ mở được thiết bị theo chỉ số; URL RTSP/HTTP hay file để OpenCV tự chọn
+            local = isinstance(self.source(), int)
+            api = cv2.CAP_DSHOW if sys.platform == "win32" and local else cv2.CAP_ANY
+        return api
+
+    def source(self):
+        device = str(self.device).strip()
+        return int(device) if device.isdigit() else device
+
+    def open(self):
+        """Mở VideoCapture và áp dụng các thuộc tính; FOURCC đặt trước kích thước (V4L2 cần vậy)."""
+        cap = cv2.VideoCapture(self.source(), self.api_preference())
+        if not cap.isOpened():
+            return cap
+        if self.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc.ljust(4)[:4]))
+        if self.width > 0:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height > 0:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps > 0:
+            cap.set(cv2.CAP_PROP_FPS, self.fps)
+        if self.buffer_size > 0:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+        return cap
+
+    @staticmethod
+    def describe(cap):
+        """Thông số driver thực sự chấp nhận (có thể khác giá trị yêu cầu)."""
+        code = int(cap.get(cv2.CAP_PROP_FOURCC))
+        fourcc = "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)) if code > 0 else "?"
+        return (
+            f"{int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))} "
+            f"@ {cap.get(cv2.CAP_PROP_FPS):.0f} fps, {fourcc.strip() or '?'}, "
+            f"backend {cap.getBackendName()}"
+        )
+
+
+class LatestFrameSlot:
+    """Ô chứa đúng 1 khung hình mới nhất: khung mới ghi đè khung cũ chưa được lấy."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frame = None
+        self.dropped = 0  # số khung bị ghi đè trước khi UI kịp lấy
+
+    def put(self, frame):
+        with self._lock:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+
+    def take(self):
+        """Lấy khung mới nhất (None nếu chưa có khung mới) và làm trống ô."""
+        with self._lock:
+            frame, self._frame = self._frame, None
+        return frame
+
+    def clear(self):
+        with self._lock:
+            self._frame = None
+            self.dropped = 0
+
+
+class CameraGrabber:
+    """Luồng riêng đọc camera liên tục và đẩy khung mới nhất vào LatestFrameSlot.
+
+    drain=True: sau một grab() tức thì (khung cũ trong bộ đệm driver) tiếp tục
+    grab() cho tới khi phải chờ khung mới, rồi mới retrieve() một lần.
+    """
+
+    def __init__(self, cap, slot, flip=True, stats=None, drain=False, max_drain=8):
+        self.cap = cap
+        self.slot = slot
+        self.flip = flip
+        self.stats = stats
+        self.drain = drain
+        self.max_drain = max_drain
+        self.drained = 0  # số khung cũ đã bỏ qua trong bộ đệm driver
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        # grab() nhanh hơn nửa chu kỳ khung = khung lấy từ bộ đệm, không phải khung mới
+        self.live_threshold = max(0.5 / (fps if 1 <= fps <= 240 else 30.0), 0.002)
+        self.failed = False
+        self.frames_read = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self.failed = False
+        self._thread = threading.Thread(target=self._run, name="qr-capture", daemon=True)
+        self._thread.start()
+
+    def _read_latest(self):
+        t = time.perf_counter()
+        if not self.cap.grab():
+            return False, None
+        for _ in range(self.max_drain):
+            if time.perf_counter() - t > self.live_threshold:
+                break
+            t = time.perf_counter()
+            if not self.cap.grab():
+                break
+            self.drained += 1
+        return self.cap.retrieve()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            t0 = time.perf_counter()
+            ret, frame = self._read_latest() if self.drain else self.cap.read()
+            if not ret:
+                self.failed = True
+                break
+            if self.flip:
+                frame = cv2.flip(frame, 1)
+            self.frames_read += 1
+            if self.stats is not None:
+                self.stats.record("capture", (time.perf_counter() - t0) * 1000.0)
+                self.stats.count("capture")
+            self.slot.put(frame)
+
+    def stop(self, timeout=1.0):
+        """Dừng luồng đọc; phải gọi trước khi release camera."""
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+
+class SharedDedupStore:
+    """Kho chống trùng dùng chung cho mọi camera trong một phiên.
+
+    claim(content) kiểm tra + đánh dấu trong một bước có khoá, nên hai camera
+    thấy cùng một mã cùng lúc thì chỉ một bên được lưu. session là các mã đã
+    lưu trong phiên, existing là bảng digest của chỉ mục folder xuất.
+    """
+
+    def __init__(self, existing=None):
+        self._lock = threading.Lock()
+        self.session = DigestSet()
+        self.existing = existing if existing is not None else DigestSet()
+
+    def claim(self, content):
+        """None nếu mã mới (đã được đánh dấu), ngược lại là lý do trùng."""
+        with self._lock:
+            if content in self.session:
+                return "đã được phát hiện trong phiên này"
+            if content in self.existing:
+                return "đã tồn tại trong folder xuất"
+            self.session.add(content)
+            return None
+
+    def release(self, content):
+        """Trả lại mã đã claim nhưng không lưu được, để lần thấy sau được lưu lại."""
+        with self._lock:
+            self.session.discard(content)
+
+    def clear(self):
+        with self._lock:
+            self.session.clear()
+
+    def __len__(self):
+        return len(self.session)
+
+
+class CameraSession:
+    """Một nguồn camera đang quét: luồng đọc, worker nhận diện và khung bao riêng.
+
+    Cổng bỏ khung tĩnh, tracker, pyramid và track mã không đọc được cũng là
+    của riêng camera; chống trùng, đếm và ghi ảnh dùng chung ở tầng app.
+    """
+
+    def __init__(self, index, config, workers, mode="thread"):
+        self.index = index
+        self.config = config
+        self.name = f"cam{index}:{config.device}"
+        self.cap = None
+        self.grabber = None
+        self.slot = LatestFrameSlot()
+        self.engine = DetectionEngine(workers, mode)
+        self.change_gate = SceneChangeGate()
+        self.tracker = QRTracker()
+        self.pyramid_scaler = PyramidScaler()
+        self.undecoded_tracker = UndecodedTracker()
+        self.overlays = []
+        self.overlay_time = 0.0
+        self.last_frame = None
+
+    def open(self):
+        self.cap = self.config.open()
+        if not self.cap.isOpened():
+            self.cap = None
+            return False
+        return True
+
+    def start(self, stats=None):
+        self.grabber = CameraGrabber(
+            self.cap, self.slot, flip=self.config.flip, stats=stats,
+            drain=self.config.grab == "drain",
+        )
+        self.grabber.start()
+
+    @property
+    def failed(self):
+        return self.grabber is not None and self.grabber.failed
+
+    def stop(self):
+        # Dừng luồng đọc trước khi release để tránh read() trên camera đã đóng
+        if self.grabber is not None:
+            self.grabber.stop()
+            self.grabber = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+def tile_frames(frames, labels=()):
+    """Ghép nhiều khung thành lưới gần vuông, mỗi ô bằng kích thước khung đầu chia số cột."""
+    if len(frames) == 1:
+        return frames[0]
+    cols = int(math.ceil(math.sqrt(len(frames))))
+    rows = int(math.ceil(len(frames) / cols))
+    h, w = frames[0].shape[:2]
+    tile_w, tile_h = max(w // cols, 1), max(h // cols, 1)
+    mosaic = np.zeros((rows * tile_h, cols * tile_w, 3), dtype=np.uint8)
+    for i, frame in enumerate(frames):
+        y, x = (i // cols) * tile_h, (i % cols) * tile_w
+        cv2.resize(frame, (tile_w, tile_h), dst=mosaic[y:y + tile_h, x:x + tile_w],
+                   interpolation=cv2.INTER_AREA)
+        if i < len(labels):
+            cv2.putText(mosaic, labels[i], (x + 8, y + 24), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.6, (34, 211, 238), 2, cv2.LINE_AA)
+    return mosaic
+
+
+class VideoFileReader:
+    """Đọc file video theo bước nhảy khung (stride).
+
+    - "grab": grab() bỏ qua stride-1 khung rồi read() khung cần lấy (không
+      chuyển màu các khung bị bỏ) — nhanh khi stride nhỏ.
+    - "seek": đặt CAP_PROP_POS_FRAMES tới khung cần lấy, backend tua về
+      keyframe gần nhất rồi giải mã tới đó — nhanh khi stride lớn hơn GOP.
+    - "auto": dùng seek khi stride >= seek_threshold.
+    """
+
+    def __init__(self, path, stride=1, seek="auto", seek_threshold=30):
+        self.path = path
+        self.stride = max(1, int(stride))
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise OSError(f"Không thể mở video: {path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.use_seek = seek == "seek" or (seek == "auto" and self.stride >= seek_threshold)
+
+    def __iter__(self):
+        """Sinh (chỉ số khung, thời điểm ms, khung BGR)."""
+        index = 0
+        while True:
+            if self.use_seek:
+                if self.frame_count and index >= self.frame_count:
+                    return
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ok, frame = self.cap.read()
+            if not ok:
+                return
+            pos_ms = index * 1000.0 / self.fps if self.fps else self.cap.get(cv2.CAP_PROP_POS_MSEC)
+            yield index, pos_ms, frame
+            if not self.use_seek:
+                for _ in range(self.stride - 1):
+                    if not self.cap.grab():
+                        return
+            index += self.stride
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileGrabber:
+    """Luồng đọc video vào hàng đợi có giới hạn (không bỏ khung, bị chặn khi đầy)."""
+
+    def __init__(self, reader, maxsize=8):
+        self.reader = reader
+        self.frames = queue.Queue(maxsize=maxsize)
+        self.finished = False
+        self.failed = False
+        self.frames_read = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="qr-video", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for item in self.reader:
+                while not self._stop_event.is_set():
+                    try:
+                        self.frames.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if self._stop_event.is_set():
+                    return
+                self.frames_read += 1
+        finally:
+            self.finished = True
+
+    def take(self):
+        """Lấy (index, pos_ms, frame) kế tiếp hoặc None nếu chưa có."""
+        try:
+            return self.frames.get_nowait()
+        except queue.Empty:
+            return None
+
+    def exhausted(self):
+        return self.finished and self.frames.empty()
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+        self.reader.release()
+
+
 class QRCameraApp:
     def __init__(self, root):
         self.root = root
@@ -53,21 +2482,62 @@ class QRCameraApp:
 
         self.root.configure(bg=self.bg_main)
 
-        # Camera
-        self.cap = None
+        # Camera: mỗi nguồn là một CameraSession (đọc, worker, khung bao riêng)
         self.is_running = False
+        self.sessions = []
+        self.video_grabber = None
+        self.video_stride = 1
+        self.video_started_at = None
+        self.camera_config = CameraConfig()
+        self.extra_cameras = []  # thiết bị camera thêm, dùng chung các thông số còn lại
+        self.use_change_gate = tk.BooleanVar(value=True)
+        self.use_tracking = tk.BooleanVar(value=True)
+        self.use_pyramid = tk.BooleanVar(value=False)
+        self.cascade = EnhancementCascade()
+        self.ui_tick_ms = 10  # chu kỳ UI lấy khung mới nhất (không phụ thuộc tốc độ camera)
+
+        # Pool nhận diện: "thread" (OpenCV nhả GIL) hoặc "process"
+        self.detect_workers = max(1, (os.cpu_count() or 2) - 1)
+        self.detect_mode = "thread"
+        self.detection_engine = None
+
+        # Khung bao của lần nhận diện gần nhất, vẽ lại lên mọi khung hiển thị
+        self.overlays = []
+        self.overlay_time = 0.0
+        self.overlay_ttl = 0.5  # giây
 
         # Thư mục lưu QR
         self.output_dir = None
 
-        # Ảnh đang hiển thị
+        # Ảnh đang hiển thị (một PhotoImage dùng lại, chỉ tạo mới khi đổi kích thước)
         self.frame_tk = None
+        self.canvas_size = (0, 0)  # cập nhật trong _on_canvas_resize
+        self.display_fps = 30      # giới hạn FPS hiển thị, độc lập với FPS nhận diện
+        self.last_display = 0.0
 
         # Lưu QR đã lưu để tránh trùng (trong session hiện tại)
-        self.saved_codes = set()
+        self.dedup_store = SharedDedupStore()
+        # Mã vừa thấy: mã trùng đứng yên trước camera chỉ được báo một lần
+        self.recent_codes = RecentlySeenCache(ttl=2.0)
+        # Mã không đọc được: theo dõi theo IoU, mỗi mã vật lý chỉ lưu một ảnh
+        self.undecoded_tracker = UndecodedTracker()
         
         # Lưu danh sách mã QR đã có trong folder xuất (dựa trên nội dung)
-        self.existing_qr_contents = set()
+        self.content_index = None
+        self.file_index = None
+        self.folder_scan = None
+        self.crop_namer = CropNamer()
+        # Đo thời gian từng công đoạn + FPS, xuất CSV/JSON khi kết thúc phiên
+        self.perf_stats = PipelineStats()
+        self.crop_writer = CropWriter(stats=self.perf_stats)
+        self.crop_codec = tk.StringVar(value="png")
+        self.crop_layout = tk.StringVar(value="flat")
+        self.crop_level = tk.IntVar(value=CROP_CODECS["png"][2])
+        self.parallel_scan_threshold = 200  # số file cần giải mã để chuyển sang quét song song
+        self.existing_qr_contents = DigestSet()
+        self.use_bloom = False  # Bloom filter trước bảng digest của chỉ mục nội dung
+        # Ô log: gom dòng, chèn một lần mỗi nhịp animator, chỉ giữ log_buffer.max_lines dòng
+        self.log_buffer = LogBuffer()
         
         # Thống kê
         self.qr_count = 0
@@ -76,13 +2546,17 @@ class QRCameraApp:
 
         # Tùy chọn tăng cường ảnh
         self.use_enhance = tk.BooleanVar(value=True)
+
+        # Backend nhận diện (chọn được lúc đang chạy)
+        self.detector_backend = tk.StringVar(value=OpenCVQRBackend.name)
         
-        # Animation variables
+        # Animation variables (mọi hiệu ứng + nhịp chèn log chạy trên một animator)
+        self.animator = AnimationScheduler(self.root)
         self.pulse_alpha = 0
         self.pulse_direction = 1
         self.scan_line_y = 0
         self.scan_direction = 1
-        self.gradient_offset = 0
+        self.performance_mode = tk.BooleanVar(value=False)
         self.button_hover_scale = {}
         self.notification_queue = []
         self.current_notification = None
@@ -291,6 +2765,30 @@ class QRCameraApp:
         )
         qr_stat_desc.pack()
         
+        # Performance stat: FPS đọc/nhận diện/hiển thị + độ trễ nhận diện
+        perf_stat_card = tk.Frame(
+            stats_frame,
+            bg=self.bg_card,
+            highlightbackground=self.accent_green,
+            highlightthickness=2,
+        )
+        perf_stat_card.pack(side=tk.LEFT, padx=(0, 10), ipadx=20, ipady=10)
+        
+        self.perf_fps_label = ttk.Label(
+            perf_stat_card,
+            text="– fps",
+            style="StatLabel.TLabel",
+            foreground=self.accent_green,
+        )
+        self.perf_fps_label.pack()
+        
+        self.perf_latency_label = ttk.Label(
+            perf_stat_card,
+            text="Hiệu Năng",
+            style="StatLabel.TLabel",
+        )
+        self.perf_latency_label.pack()
+        
         # Status stat
         status_stat_card = tk.Frame(
             stats_frame,
@@ -410,15 +2908,44 @@ class QRCameraApp:
         self.btn_start.grid(row=0, column=2, padx=(0, 8), pady=0)
         self._color_button(self.btn_start, self.accent_blue, "#000000")
 
+        self.btn_open_video = ttk.Button(
+            btn_frame,
+            text="🎞️  Mở Video",
+            style="Tech.TButton",
+            command=lambda: self._button_click_animation(self.open_video_and_detect),
+        )
+        self.btn_open_video.grid(row=0, column=3, padx=(0, 8), pady=0)
+        self._color_button(self.btn_open_video, self.accent_purple, "#000000")
+
         self.btn_reset = ttk.Button(
             btn_frame,
             text="🔄  Đặt Lại",
             style="Tech.TButton",
             command=lambda: self._button_click_animation(self.reset_app),
         )
-        self.btn_reset.grid(row=0, column=3, padx=0, pady=0)
+        self.btn_camera_settings = ttk.Button(
+            btn_frame,
+            text="⚙️  Camera",
+            style="Tech.TButton",
+            command=lambda: self._button_click_animation(self.open_camera_settings),
+        )
+        self.btn_camera_settings.grid(row=0, column=4, padx=(0, 8), pady=0)
+        self._color_button(self.btn_camera_settings, self.accent_cyan, "#000000")
+
+        self.btn_reset.grid(row=0, column=5, padx=0, pady=0)
         self._color_button(self.btn_reset, self.accent_red, "#000000")
 
+        # Chỉ hiện khi đang quét song song folder xuất
+        self.btn_cancel_scan = ttk.Button(
+            btn_frame,
+            text="⏹️  Huỷ Quét Folder",
+            style="Tech.TButton",
+            command=lambda: self._button_click_animation(self.cancel_folder_scan),
+        )
+        self.btn_cancel_scan.grid(row=0, column=6, padx=(8, 0), pady=0)
+        self._color_button(self.btn_cancel_scan, self.accent_yellow, "#000000")
+        self.btn_cancel_scan.grid_remove()
+
         # Bên phải: settings
         right_controls = ttk.Frame(controls_inner, style="Tech.TFrame")
         right_controls.pack(side=tk.RIGHT)
@@ -433,12 +2960,92 @@ class QRCameraApp:
 
         enhance_chk = ttk.Checkbutton(
             right_controls,
-            text="⚡ Bật Tăng Cường Ảnh (CLAHE + Làm Nét)",
+            text="⚡ Tăng Cường Khi Cần (Gốc → CLAHE → Ngưỡng → Đảo Màu)",
             variable=self.use_enhance,
             style="TechToggle.TCheckbutton",
         )
         enhance_chk.pack(anchor="e", pady=(6, 0))
 
+        gate_chk = ttk.Checkbutton(
+            right_controls,
+            text="💤 Bỏ qua khung tĩnh (tiết kiệm CPU)",
+            variable=self.use_change_gate,
+            style="TechToggle.TCheckbutton",
+        )
+        gate_chk.pack(anchor="e", pady=(6, 0))
+
+        tracking_chk = ttk.Checkbutton(
+            right_controls,
+            text="🎯 Bám theo mã QR giữa các khung",
+            variable=self.use_tracking,
+            style="TechToggle.TCheckbutton",
+        )
+        tracking_chk.pack(anchor="e", pady=(6, 0))
+
+        pyramid_chk = ttk.Checkbutton(
+            right_controls,
+            text="🔍 Dò thô trên ảnh thu nhỏ (camera độ phân giải cao)",
+            variable=self.use_pyramid,
+            style="TechToggle.TCheckbutton",
+        )
+        pyramid_chk.pack(anchor="e", pady=(6, 0))
+
+        perf_chk = ttk.Checkbutton(
+            right_controls,
+            text="🐢 Chế độ hiệu năng (tắt hiệu ứng)",
+            variable=self.performance_mode,
+            command=self._on_performance_mode,
+            style="TechToggle.TCheckbutton",
+        )
+        perf_chk.pack(anchor="e", pady=(6, 0))
+
+        backend_row = ttk.Frame(right_controls, style="Tech.TFrame")
+        backend_row.pack(anchor="e", pady=(6, 0))
+        ttk.Label(
+            backend_row,
+            text="🧠 Bộ nhận diện:",
+            style="TechMuted.TLabel",
+        ).pack(side=tk.LEFT, padx=(0, 6))
+        backend_combo = ttk.Combobox(
+            backend_row,
+            textvariable=self.detector_backend,
+            values=available_backends(),
+            state="readonly",
+            width=10,
+        )
+        backend_combo.pack(side=tk.LEFT)
+        backend_combo.bind("<<ComboboxSelected>>", self._on_backend_changed)
+
+        ttk.Label(
+            backend_row,
+            text="💾 Lưu:",
+            style="TechMuted.TLabel",
+        ).pack(side=tk.LEFT, padx=(12, 6))
+        codec_combo = ttk.Combobox(
+            backend_row,
+            textvariable=self.crop_codec,
+            values=list(CROP_CODECS),
+            state="readonly",
+            width=5,
+        )
+        codec_combo.pack(side=tk.LEFT)
+        codec_combo.bind("<<ComboboxSelected>>", self._on_codec_changed)
+        self.crop_level_spin = ttk.Spinbox(
+            backend_row,
+            textvariable=self.crop_level,
+            from_=0,
+            to=9,
+            width=4,
+        )
+        self.crop_level_spin.pack(side=tk.LEFT, padx=(4, 0))
+        ttk.Combobox(
+            backend_row,
+            textvariable=self.crop_layout,
+            values=CROP_LAYOUTS,
+            state="readonly",
+            width=5,
+        ).pack(side=tk.LEFT, padx=(4, 0))
+
         # ----- MAIN CONTENT: LEFT VIDEO / RIGHT LOG -----
         main = tk.Frame(self.root, bg=self.bg_main)
         main.pack(fill=tk.BOTH, expand=True, padx=20, pady=(0, 12))
@@ -555,11 +3162,11 @@ class QRCameraApp:
         scrollbar.config(command=self.text_log.yview)
         
         # Configure text tags for colored log messages
-        self.text_log.tag_configure("success", foreground=self.accent_green)
-        self.text_log.tag_configure("info", foreground=self.accent_cyan)
-        self.text_log.tag_configure("warning", foreground=self.accent_yellow)
-        self.text_log.tag_configure("error", foreground=self.accent_red)
-        self.text_log.tag_configure("highlight", foreground=self.accent_purple)
+        self.text_log.tag_configure(LOG_SUCCESS, foreground=self.accent_green)
+        self.text_log.tag_configure(LOG_INFO, foreground=self.accent_cyan)
+        self.text_log.tag_configure(LOG_WARNING, foreground=self.accent_yellow)
+        self.text_log.tag_configure(LOG_ERROR, foreground=self.accent_red)
+        self.text_log.tag_configure(LOG_HIGHLIGHT, foreground=self.accent_purple)
 
         # ----- STATUS BAR -----
         status_bar = tk.Frame(
@@ -593,15 +3200,24 @@ class QRCameraApp:
         )
         footer_info.pack(side=tk.RIGHT)
 
+        self.gate_label = tk.Label(
+            status_inner,
+            text="",
+            bg=self.bg_panel,
+            fg=self.text_muted,
+            font=("Segoe UI", 8),
+        )
+        self.gate_label.pack(side=tk.RIGHT, padx=(0, 16))
+
         # Welcome log with colored tags
-        self._log_colored("🚀 Máy Quét QR AI Vision Đã Khởi Động", "success")
-        self._log_colored("━" * 50, "info")
+        self._log_colored("🚀 Máy Quét QR AI Vision Đã Khởi Động", LOG_SUCCESS)
+        self._log_colored("━" * 50, LOG_INFO)
         self.log("📌 Hướng Dẫn Thiết Lập:")
         self.log("   1. (Tùy chọn) Chọn thư mục lưu cho ảnh QR")
         self.log("   2. Chọn: Mở File Ảnh HOẶC Bật Camera Trực Tiếp")
         self.log("   3. Mã QR sẽ được tự động phát hiện và lưu")
-        self._log_colored("✨ Tăng Cường Ảnh: ĐÃ BẬT", "highlight")
-        self._log_colored("━" * 50, "info")
+        self._log_colored("✨ Tăng Cường Ảnh: ĐÃ BẬT", LOG_HIGHLIGHT)
+        self._log_colored("━" * 50, LOG_INFO)
 
     def _color_button(self, btn, bg, fg):
         # Tạo kiểu riêng cho từng nút bằng style name động
@@ -654,18 +3270,63 @@ class QRCameraApp:
         self._slide_in_log(msg, tag)
         
         # Show notification for important messages
-        if tag == "success" and "Phát Hiện" in msg:
+        if tag == LOG_SUCCESS and "Phát Hiện" in msg:
             self._show_notification("✅ Đã Phát Hiện Mã QR!", self.accent_green)
-        elif tag == "error":
+        elif tag == LOG_ERROR:
             self._show_notification("❌ Đã Xảy Ra Lỗi", self.accent_red)
     
     def _update_qr_count(self):
         """Update QR count display with animation"""
+        if self.performance_mode.get():
+            self.qr_count_label.config(text=str(self.qr_count))
+            return
         old_count = int(self.qr_count_label.cget('text'))
         self._animate_count_up(self.qr_count_label, old_count, self.qr_count)
     
+    def _on_backend_changed(self, event=None):
+        name = self.detector_backend.get()
+        self._log_colored(f"🧠 Bộ nhận diện: {QR_BACKENDS[name].label}", LOG_INFO)
+
+    def _on_codec_changed(self, event=None):
+        # PNG: mức nén 0-9; JPEG/WebP: chất lượng 1-100
+        _, _, default, (low, high) = CROP_CODECS[self.crop_codec.get()]
+        self.crop_level_spin.config(from_=low, to=high)
+        self.crop_level.set(default)
+
+    def _crop_write_params(self):
+        try:
+            level = self.crop_level.get()
+        except tk.TclError:
+            level = None
+        return crop_write_params(self.crop_codec.get(), level)
+
+    def _drain_crop_writer(self, wait=False):
+        """Cập nhật chỉ mục file cho các ảnh đã ghi xong ở luồng nền"""
+        if wait:
+            self.crop_writer.flush()
+        for directory, filename, contents, error in self.crop_writer.drain():
+            if error:
+                self._log_colored(f"⚠️ Không thể lưu {filename}: {error}", LOG_WARNING)
+                self._release_codes(contents)
+                self.qr_count = max(0, self.qr_count - 1)
+                self._update_qr_count()
+                continue
+            # Chỉ ghi mã vào chỉ mục khi ảnh đã nằm trên đĩa
+            if self.content_index is None or self.content_index.directory == directory:
+                for content in contents:
+                    self._record_qr_content(content)
+            if self.file_index is not None and self.file_index.directory == directory:
+                self.file_index.record(filename, contents)
+
+    def _release_codes(self, contents):
+        """Mã claim rồi nhưng ảnh không được ghi: bỏ đánh dấu để lần thấy sau lưu lại"""
+        for content in contents:
+            self.dedup_store.release(content)
+            self._log_colored(f"   ↩️ Sẽ lưu lại khi gặp lại mã: {content}", LOG_WARNING)
+
     def _on_canvas_resize(self, event):
         """Handle canvas resize for video label"""
+        self.canvas_size = (event.width, event.height)
         self.video_canvas.coords("video", event.width//2, event.height//2)
 
     def choose_output_dir(self):
@@ -673,11 +3334,11 @@ class QRCameraApp:
         if directory:
             self.output_dir = directory
             self.dir_label.config(text=f"📂 Đầu ra: {self.output_dir}")
-            self._log_colored(f"📁 Đã cấu hình thư mục đầu ra: {self.output_dir}", "success")
+            self._log_colored(f"📁 Đã cấu hình thư mục đầu ra: {self.output_dir}", LOG_SUCCESS)
             # Load danh sách mã QR đã có trong folder
             self._load_existing_qr_codes()
         else:
-            self._log_colored("ℹ️ Chưa chọn thư mục. Sẽ tự tạo './qr_output'", "info")
+            self._log_colored("ℹ️ Chưa chọn thư mục. Sẽ tự tạo './qr_output'", LOG_INFO)
 
     def ensure_output_dir(self):
         if self.output_dir is None:
@@ -686,114 +3347,174 @@ class QRCameraApp:
                 os.makedirs(default_dir, exist_ok=True)
             self.output_dir = default_dir
             self.dir_label.config(text=f"📂 Đầu ra: {self.output_dir}")
-            self._log_colored(f"📂 Đã tự tạo thư mục đầu ra: {self.output_dir}", "info")
+            self._log_colored(f"📂 Đã tự tạo thư mục đầu ra: {self.output_dir}", LOG_INFO)
             # Load danh sách mã QR đã có trong folder
             self._load_existing_qr_codes()
     
-    def _get_metadata_file_path(self):
-        """Lấy đường dẫn file metadata lưu thông tin mã QR"""
-        if self.output_dir is None:
-            return None
-        return os.path.join(self.output_dir, ".qr_metadata.json")
-    
     def _load_existing_qr_codes(self):
-        """Load danh sách mã QR đã có trong folder từ file metadata"""
-        self.existing_qr_contents.clear()
+        """Load danh sách mã QR đã có trong folder từ chỉ mục journal"""
+        job = self.folder_scan
+        if job is not None and self.content_index is not None and job.directory == self.output_dir:
+            # Đang quét nền chính folder này: chỉ mục vẫn được cập nhật dần qua
+            # _poll_folder_scan, nạp lại sẽ huỷ và bỏ phí công của process pool
+            return
+        self._cancel_folder_scan()
+        if self.content_index is not None:
+            self.content_index.close()
+            self.content_index = None
+        self._drain_crop_writer(wait=True)
+        self._save_file_index()
+        self.file_index = None
+        self.existing_qr_contents = DigestSet()
+        self.dedup_store.existing = self.existing_qr_contents
         
         if self.output_dir is None or not os.path.exists(self.output_dir):
             return
         
-        metadata_file = self._get_metadata_file_path()
-        
-        # Đọc từ file metadata nếu có
-        if metadata_file and os.path.exists(metadata_file):
-            try:
-                with open(metadata_file, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-                    if 'qr_contents' in metadata:
-                        self.existing_qr_contents = set(metadata['qr_contents'])
-                        count = len(self.existing_qr_contents)
-                        if count > 0:
-                            self._log_colored(f"📋 Đã tải {count} mã QR từ folder xuất", "info")
-            except Exception as e:
-                self._log_colored(f"⚠️ Không thể đọc metadata: {str(e)}", "warning")
+        self.content_index = QRContentIndex(self.output_dir, bloom=self.use_bloom)
+        try:
+            count = self.content_index.load()
+            if count > 0:
+                self._log_colored(f"📋 Đã tải {count} mã QR từ folder xuất", LOG_INFO)
+        except Exception as e:
+            self._log_colored(f"⚠️ Không thể đọc chỉ mục QR: {str(e)}", LOG_WARNING)
+        # Dùng chung bảng digest với chỉ mục để kiểm tra trùng O(1)
+        self.existing_qr_contents = self.content_index.digests
+        self.dedup_store.existing = self.existing_qr_contents
         
         # Quét lại các file ảnh trong folder để cập nhật (nếu cần)
         self._scan_folder_for_qr_codes()
     
+    def _record_qr_content(self, content):
+        """Ghi nội dung mã mới vào chỉ mục (append 1 dòng, không ghi lại cả file)"""
+        if self.content_index is None:
+            self.existing_qr_contents.add(content)
+            return
+        try:
+            t0 = time.perf_counter()
+            self.content_index.add(content)
+            self.perf_stats.record("index", (time.perf_counter() - t0) * 1000.0)
+        except Exception as e:
+            self.existing_qr_contents.add(content)
+            self._log_colored(f"⚠️ Không thể lưu chỉ mục QR: {str(e)}", LOG_WARNING)
+    
     def _scan_folder_for_qr_codes(self):
-        """Quét các file ảnh trong folder để tìm mã QR"""
+        """Quét các file ảnh trong folder, chỉ giải mã file mới hoặc đã thay đổi"""
         if self.output_dir is None or not os.path.exists(self.output_dir):
             return
         
-        detector = cv2.QRCodeDetector()
-        scanned_count = 0
+        self.file_index = QRFileIndex(self.output_dir)
+        self.file_index.load()
+        if not self.existing_qr_contents and self.file_index.has_codes():
+            # Mất chỉ mục nội dung: file index không giữ nội dung nên phải giải mã lại hết
+            self.file_index.reset()
+        for content in self.file_index.take_legacy_contents():
+            self._record_qr_content(content)
+        backend = self.detector_backend.get()
         
-        # Quét các file PNG trong folder
-        for filename in os.listdir(self.output_dir):
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg')) and filename.startswith('qr_'):
-                file_path = os.path.join(self.output_dir, filename)
-                try:
-                    img = cv2.imread(file_path)
-                    if img is None:
-                        continue
-                    
-                    # Thử đọc mã QR từ ảnh
-                    retval, decoded_info, points, _ = detector.detectAndDecodeMulti(img)
-                    if retval and decoded_info:
-                        for content in decoded_info:
-                            if content and content.strip():
-                                self.existing_qr_contents.add(content.strip())
-                                scanned_count += 1
-                except Exception:
-                    continue
+        stale = self.file_index.scan()
+        if len(stale) >= self.parallel_scan_threshold:
+            # Nhiều file (máy mới / chỉ mục hỏng): quét song song ở nền
+            self._start_folder_scan(stale, backend)
+            return
+        
+        scanned_count = 0
+        for filename, size, mtime_ns in stale:
+            try:
+                contents = decode_qr_file(os.path.join(self.output_dir, filename), backend)
+            except Exception:
+                contents = []
+            self.file_index.update(filename, size, mtime_ns, contents)
+            for content in contents:
+                self._record_qr_content(content)
+            scanned_count += len(contents)
         
-        # Lưu lại metadata
-        self._save_metadata()
+        self._finish_folder_scan()
         
         if scanned_count > 0:
-            self._log_colored(f"🔍 Đã quét và tìm thấy {scanned_count} mã QR trong folder", "info")
+            self._log_colored(f"🔍 Đã quét và tìm thấy {scanned_count} mã QR trong folder", LOG_INFO)
     
-    def _save_metadata(self):
-        """Lưu metadata về mã QR vào file JSON"""
-        if self.output_dir is None:
+    def _finish_folder_scan(self):
+        # Nội dung file mới/thay đổi đã được ghi vào chỉ mục nội dung khi giải mã
+        self._save_file_index()
+    
+    def _start_folder_scan(self, stale, backend):
+        self.folder_scan = ParallelFolderScan(self.output_dir, stale, backend)
+        self._log_colored(
+            f"🔍 Quét song song {len(stale)} file bằng {self.folder_scan.workers} tiến trình...",
+            LOG_INFO,
+        )
+        self.folder_scan.start()
+        self.btn_cancel_scan.grid()
+        self.root.after(100, self._poll_folder_scan)
+    
+    def _poll_folder_scan(self):
+        """Nhận dần kết quả quét nền, cập nhật chỉ mục và tiến độ"""
+        job = self.folder_scan
+        if job is None or job.cancelled:
             return
         
-        metadata_file = self._get_metadata_file_path()
-        if metadata_file:
-            try:
-                metadata = {
-                    'qr_contents': list(self.existing_qr_contents),
-                    'last_updated': datetime.datetime.now().isoformat()
-                }
-                with open(metadata_file, 'w', encoding='utf-8') as f:
-                    json.dump(metadata, f, ensure_ascii=False, indent=2)
-            except Exception as e:
-                self._log_colored(f"⚠️ Không thể lưu metadata: {str(e)}", "warning")
+        finished = job.finished.is_set()
+        for filename, size, mtime_ns, contents in job.drain():
+            self.file_index.update(filename, size, mtime_ns, contents)
+            for content in contents:
+                self._record_qr_content(content)
+        
+        if not finished:
+            self.status_label.config(
+                text=f"● Đang quét folder... {job.processed}/{job.total}",
+                fg=self.accent_yellow,
+            )
+            self.root.after(100, self._poll_folder_scan)
+            return
+        
+        self.folder_scan = None
+        self.btn_cancel_scan.grid_remove()
+        self._finish_folder_scan()
+        elapsed = time.perf_counter() - job.started_at
+        rate = job.total / elapsed if elapsed > 0 else 0.0
+        self._log_colored(
+            f"🔍 Đã quét xong {job.total} file trong {elapsed:.1f}s ({rate:.0f} file/s), "
+            f"{len(self.existing_qr_contents)} mã QR trong folder",
+            LOG_INFO,
+        )
+        if job.errors:
+            self._log_colored(f"⚠️ {job.errors} nhóm file quét bị lỗi", LOG_WARNING)
+        self.set_status("Camera Hoạt Động" if self.is_running else "Sẵn Sàng", self.accent_green)
+    
+    def cancel_folder_scan(self):
+        """Nút huỷ: dừng quét nền, giữ phần chỉ mục đã quét được"""
+        if self.folder_scan is not None:
+            self._cancel_folder_scan()
+            self.set_status("Camera Hoạt Động" if self.is_running else "Sẵn Sàng", self.accent_green)
 
+    def _cancel_folder_scan(self):
+        if self.folder_scan is not None:
+            self.folder_scan.cancel()
+            self.folder_scan = None
+            self.btn_cancel_scan.grid_remove()
+            # Giữ lại phần kết quả đã quét được cho lần sau
+            self._save_file_index()
+            self._log_colored("🛑 Đã huỷ quét folder", LOG_WARNING)
+    
+    def _save_file_index(self):
+        if self.file_index is None:
+            return
+        try:
+            self.file_index.save()
+        except Exception as e:
+            self._log_colored(f"⚠️ Không thể lưu chỉ mục file: {str(e)}", LOG_WARNING)
+    
     # ========== TĂNG CƯỜNG & LÀM NÉT ẢNH ==========
 
     def enhance_for_qr(self, frame):
-        """
-        Tăng cường QR:
-        - Gray + CLAHE (tăng tương phản)
-        - Unsharp mask (làm nét biên QR)
-        """
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        gray = clahe.apply(gray)
-
-        blur = cv2.GaussianBlur(gray, (0, 0), sigmaX=1.0, sigmaY=1.0)
-        sharp = cv2.addWeighted(gray, 1.6, blur, -0.6, 0)
-
-        return sharp
+        return enhance_for_qr(frame)
 
     # ========== XỬ LÝ ẢNH FILE ==========
 
     def open_image_and_detect(self):
         if self.is_running:
-            self._log_colored("⚠️ Đang dừng camera để xử lý file ảnh...", "warning")
+            self._log_colored("⚠️ Đang dừng camera để xử lý file ảnh...", LOG_WARNING)
             self.stop_camera()
 
         file_path = filedialog.askopenfilename(
@@ -803,7 +3524,7 @@ class QRCameraApp:
         if not file_path:
             return
 
-        self._log_colored(f"🖼️ Đang tải ảnh: {os.path.basename(file_path)}", "info")
+        self._log_colored(f"🖼️ Đang tải ảnh: {os.path.basename(file_path)}", LOG_INFO)
         self.set_status("Đang xử lý ảnh...", self.accent_yellow)
         self.status_icon_label.config(text="⏳", foreground=self.accent_yellow)
         self.status_text_label.config(text="Đang xử lý...")
@@ -811,13 +3532,15 @@ class QRCameraApp:
         img = cv2.imread(file_path)
         if img is None:
             messagebox.showerror("Lỗi", "Không thể đọc file ảnh.")
-            self._log_colored("❌ Không thể đọc file ảnh", "error")
+            self._log_colored("❌ Không thể đọc file ảnh", LOG_ERROR)
             self.set_status("Lỗi", self.accent_red)
             self.status_icon_label.config(text="✖", foreground=self.accent_red)
             self.status_text_label.config(text="Lỗi")
             return
 
-        self.saved_codes.clear()
+        self.dedup_store.clear()
+        self.recent_codes.clear()
+        self.undecoded_tracker.reset()
         self.qr_count = 0
         self.duplicate_count = 0
         self._update_qr_count()
@@ -827,11 +3550,15 @@ class QRCameraApp:
         self._load_existing_qr_codes()
         
         annotated = self.detect_and_save_from_frame(img)
+        if self._save_undecoded_tracks(self.undecoded_tracker.flush()):
+            self._update_qr_count()
+        self._drain_crop_writer(wait=True)
+        self._save_file_index()
         self.show_frame(annotated)
         self.set_status("Đã xử lý ảnh", self.accent_green)
         self.status_icon_label.config(text="✓", foreground=self.accent_green)
         self.status_text_label.config(text="Hoàn thành")
-        self._log_colored("━" * 50, "info")
+        self._log_colored("━" * 50, LOG_INFO)
 
     # ========== CAMERA ==========
 
@@ -840,18 +3567,26 @@ class QRCameraApp:
             self.stop_camera()
             return
 
-        self.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        if not self.cap.isOpened():
+        workers = max(1, self.detect_workers // (1 + len(self.extra_cameras)))
+        sessions = []
+        for index, config in enumerate(self.camera_configs()):
+            session = CameraSession(index, config, workers, self.detect_mode)
+            if session.open():
+                sessions.append(session)
+                continue
+            session.engine.shutdown()
+            self._log_colored(f"❌ Không thể mở thiết bị camera {config.device} ({config.backend})", LOG_ERROR)
+        if not sessions:
             messagebox.showerror("Lỗi", "Không thể mở camera. Vui lòng kiểm tra thiết bị của bạn.")
-            self._log_colored("❌ Không thể mở thiết bị camera", "error")
             self.set_status("Lỗi camera", self.accent_red)
             self.status_icon_label.config(text="✖", foreground=self.accent_red)
             self.status_text_label.config(text="Lỗi")
-            self.cap = None
             return
 
         self.is_running = True
-        self.saved_codes.clear()
+        self.dedup_store.clear()
+        self.recent_codes.clear()
+        self.undecoded_tracker.reset()
         self.qr_count = 0
         self.duplicate_count = 0
         self._update_qr_count()
@@ -864,23 +3599,270 @@ class QRCameraApp:
         self.btn_start.config(text="⏹️  Dừng Camera")
         self._color_button(self.btn_start, self.accent_red, "#000000")
         
-        self._log_colored("━" * 50, "info")
-        self._log_colored("🎥 Camera Đã Bật - Nhận Diện Trực Tiếp Hoạt Động", "success")
+        self._log_colored("━" * 50, LOG_INFO)
+        self._log_colored("🎥 Camera Đã Bật - Nhận Diện Trực Tiếp Hoạt Động", LOG_SUCCESS)
         self.log("   → Đưa mã QR vào ống kính camera")
         self.log("   → Mã QR được phát hiện sẽ tự động lưu")
+        for session in sessions:
+            self.log(
+                f"   → Camera {session.config.device}: {CameraConfig.describe(session.cap)}, "
+                f"đọc {session.config.grab}, {session.engine.workers} worker"
+            )
         
         self.set_status("Camera Hoạt Động", self.accent_green)
         self.status_icon_label.config(text="●", foreground=self.accent_green)
         self.status_text_label.config(text="Hoạt động")
 
+        self.gate_label.config(text="")
+        self.perf_stats.reset()
+        self.sessions = sessions
+        for session in sessions:
+            session.start(self.perf_stats)
+
+        self.animator.wake()
         self._update_session_time()
         self.update_frame()
 
+    def camera_configs(self):
+        """Camera chính + các camera thêm (cùng thông số, khác thiết bị)"""
+        return [self.camera_config] + [
+            replace(self.camera_config, device=device) for device in self.extra_cameras
+        ]
+
+    def open_camera_settings(self):
+        """Hộp thoại cấu hình camera: thiết bị, backend, độ phân giải, FPS, FOURCC, bộ đệm"""
+        config = self.camera_config
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Cấu hình camera")
+        dialog.configure(bg=self.bg_panel)
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+
+        resolution = f"{config.width}x{config.height}" if config.width and config.height else ""
+        fields = [
+            ("Thiết bị (số / đường dẫn / URL)", tk.StringVar(value=config.device), None),
+            ("Backend", tk.StringVar(value=config.backend), list(CAPTURE_BACKENDS)),
+            ("Độ phân giải (WxH, trống = mặc định)", tk.StringVar(value=resolution), None),
+            ("FPS (0 = mặc định)", tk.StringVar(value=f"{config.fps:g}"), None),
+            ("FOURCC (vd. MJPG)", tk.StringVar(value=config.fourcc), ["", "MJPG", "YUYV", "H264"]),
+            ("Bộ đệm driver (khung)", tk.StringVar(value=str(config.buffer_size)), None),
+            ("Cách đọc khung", tk.StringVar(value=config.grab), ["drain", "read"]),
+            ("Camera thêm (cách nhau bởi dấu phẩy)", tk.StringVar(value=", ".join(self.extra_cameras)), None),
+        ]
+        for row, (label, var, choices) in enumerate(fields):
+            ttk.Label(dialog, text=label, style="TechMuted.TLabel").grid(
+                row=row, column=0, sticky="w", padx=(12, 8), pady=4
+            )
+            if choices is None:
+                widget = ttk.Entry(dialog, textvariable=var, width=24)
+            else:
+                widget = ttk.Combobox(dialog, textvariable=var, values=choices, width=22)
+            widget.grid(row=row, column=1, padx=(0, 12), pady=4)
+        flip_var = tk.BooleanVar(value=config.flip)
+        ttk.Checkbutton(
+            dialog, text="Lật ảnh ngang (gương)", variable=flip_var, style="TechToggle.TCheckbutton"
+        ).grid(row=len(fields), column=0, columnspan=2, sticky="w", padx=12, pady=4)
+
+        def apply():
+            device, backend, res, fps, fourcc, buffer_size, grab, extra = (
+                v.get().strip() for _, v, _ in fields
+            )
+            extra = [d.strip() for d in extra.split(",") if d.strip()]
+            try:
+                width, height = parse_resolution(res)
+                new_config = CameraConfig(
+                    device=device or "0",
+                    backend=backend if backend in CAPTURE_BACKENDS else "auto",
+                    width=width,
+                    height=height,
+                    fps=float(fps or 0),
+                    fourcc=fourcc.upper()[:4],
+                    buffer_size=int(buffer_size or 0),
+                    grab=grab if grab in ("drain", "read") else "drain",
+                    flip=flip_var.get(),
+                )
+            except ValueError as e:
+                messagebox.showerror("Lỗi", f"Giá trị không hợp lệ: {e}", parent=dialog)
+                return
+            self.camera_config = new_config
+            self.extra_cameras = extra
+            dialog.destroy()
+            self._log_colored(
+                f"⚙️ Camera: {new_config.device} ({new_config.backend}), "
+                f"{res or 'mặc định'}, {new_config.fourcc or 'FOURCC mặc định'}, đọc {new_config.grab}"
+                + (f", thêm {len(extra)} camera" if extra else ""),
+                LOG_INFO,
+            )
+            if self.is_running and self.sessions:
+                # Mở lại camera với cấu hình mới
+                self.stop_camera()
+                self.start_camera()
+
+        buttons = ttk.Frame(dialog, style="Tech.TFrame")
+        buttons.grid(row=len(fields) + 1, column=0, columnspan=2, pady=(8, 12))
+        ttk.Button(buttons, text="Áp dụng", style="Tech.TButton", command=apply).pack(side=tk.LEFT, padx=4)
+        ttk.Button(buttons, text="Huỷ", style="Tech.TButton", command=dialog.destroy).pack(side=tk.LEFT, padx=4)
+        dialog.grab_set()
+
+    # ========== FILE VIDEO ==========
+
+    def open_video_and_detect(self):
+        if self.is_running:
+            self.stop_camera()
+            return
+
+        file_path = filedialog.askopenfilename(
+            title="Mở video",
+            filetypes=(("File video", "*.mp4;*.avi;*.mkv;*.mov;*.m4v"), ("Tất cả file", "*.*")),
+        )
+        if not file_path:
+            return
+
+        stride = simpledialog.askinteger(
+            "Bước khung",
+            "Xử lý 1 khung sau mỗi bao nhiêu khung?\n(>= 30 sẽ tua theo keyframe)",
+            initialvalue=self.video_stride,
+            minvalue=1,
+            parent=self.root,
+        )
+        if stride is None:
+            return
+        self.video_stride = stride
+
+        try:
+            reader = VideoFileReader(file_path, stride=stride)
+        except OSError as e:
+            messagebox.showerror("Lỗi", str(e))
+            self._log_colored(f"❌ {e}", LOG_ERROR)
+            return
+
+        self.is_running = True
+        self.dedup_store.clear()
+        self.recent_codes.clear()
+        self.undecoded_tracker.reset()
+        self.qr_count = 0
+        self.duplicate_count = 0
+        self._update_qr_count()
+        self.duplicate_count_label.config(text="0")
+        self.session_start_time = datetime.datetime.now()
+        self._load_existing_qr_codes()
+
+        self.btn_open_video.config(text="⏹️  Dừng Video")
+        self._color_button(self.btn_open_video, self.accent_red, "#000000")
+
+        mode = "tua keyframe" if reader.use_seek else "bỏ khung"
+        self._log_colored("━" * 50, LOG_INFO)
+        self._log_colored(f"🎞️ Đang quét video: {os.path.basename(file_path)}", LOG_SUCCESS)
+        self.log(f"   → {reader.frame_count} khung, {reader.fps:.1f} fps, bước {stride} ({mode})")
+        self.set_status("Đang quét video...", self.accent_yellow)
+        self.status_icon_label.config(text="●", foreground=self.accent_green)
+        self.status_text_label.config(text="Video")
+
+        self.overlays = []
+        if self.detection_engine is None:
+            self.detection_engine = DetectionEngine(self.detect_workers, self.detect_mode)
+        self.video_grabber = VideoFileGrabber(reader, maxsize=self.detection_engine.workers * 2)
+        self.video_grabber.start()
+        self.video_started_at = time.perf_counter()
+        self.perf_stats.reset()
+
+        self.animator.wake()
+        self._update_session_time()
+        self.update_video_frame()
+
+    def update_video_frame(self):
+        """Nhịp xử lý video: đẩy khung vào pool nhanh nhất có thể, không bỏ khung"""
+        grabber = self.video_grabber
+        if not self.is_running or grabber is None:
+            return
+        engine = self.detection_engine
+
+        latest = None
+        while not engine.busy() and not self.crop_writer.congested():
+            item = grabber.take()
+            if item is None:
+                break
+            self.perf_stats.count("capture")
+            _, pos_ms, latest = item
+            engine.submit(
+                latest, self.use_enhance.get(), self.detector_backend.get(),
+                stages=self._detect_stages(), pos_ms=pos_ms,
+            )
+
+        completed = engine.poll()
+        if completed:
+            self._apply_detection_batch(completed)
+
+        if latest is not None and self._display_due():
+            self.show_frame(self._draw_overlays(latest))
+            elapsed = time.perf_counter() - self.video_started_at
+            if elapsed > 0:
+                self.status_label.config(
+                    text=f"● Đang quét video... {engine.submitted / elapsed:.1f} khung/s",
+                    fg=self.accent_yellow,
+                )
+
+        if grabber.exhausted() and engine.pending() == 0:
+            self.stop_camera()
+            return
+        self.root.after(1, self.update_video_frame)
+
     def stop_camera(self):
+        # reset_app/on_close gọi cả khi không có gì đang chạy: khi đó không xuất lại số liệu cũ
+        was_running = self.is_running or bool(self.sessions) or self.video_grabber is not None
         self.is_running = False
-        if self.cap is not None:
-            self.cap.release()
-            self.cap = None
+        self.video_canvas.delete("scanline")
+        if self.video_grabber is not None:
+            self.video_grabber.stop()
+            elapsed = time.perf_counter() - self.video_started_at
+            frames = self.video_grabber.frames_read
+            rate = frames / elapsed if elapsed > 0 else 0.0
+            self._log_colored(
+                f"🎞️ Đã xử lý {frames} khung video trong {elapsed:.1f}s ({rate:.1f} khung/s)",
+                LOG_INFO,
+            )
+            self.video_grabber = None
+            self.btn_open_video.config(text="🎞️  Mở Video")
+            self._color_button(self.btn_open_video, self.accent_purple, "#000000")
+        sessions, self.sessions = self.sessions, []
+        for session in sessions:
+            session.stop()
+            gate = session.change_gate
+            if gate.skipped:
+                self._log_colored(
+                    f"💤 {session.name}: đã bỏ qua {gate.skipped}/{gate.checked} "
+                    f"khung tĩnh ({gate.skipped_ratio():.0%})",
+                    LOG_INFO,
+                )
+        if was_running:
+            # Áp dụng nốt các khung còn đang nhận diện để không mất mã QR
+            saved = 0
+            for session in sessions:
+                completed = session.engine.poll(wait=True)
+                if completed:
+                    self._apply_detection_batch(completed, session)
+                saved += self._save_undecoded_tracks(session.undecoded_tracker.flush())
+                report = session.engine.latency_report()
+                if report:
+                    self._log_colored(f"⏱️ Độ trễ nhận diện {session.name}: {report}", LOG_INFO)
+                session.engine.shutdown()
+            if self.detection_engine is not None:
+                completed = self.detection_engine.poll(wait=True)
+                if completed:
+                    self._apply_detection_batch(completed)
+                saved += self._save_undecoded_tracks(self.undecoded_tracker.flush())
+                report = self.detection_engine.latency_report()
+                if report:
+                    self._log_colored(f"⏱️ Độ trễ nhận diện: {report}", LOG_INFO)
+            if saved:
+                self._update_qr_count()
+            self._drain_crop_writer(wait=True)
+            self._save_file_index()
+            report = self.cascade.report()
+            if report:
+                self._log_colored(f"⚡ Tỉ lệ trúng theo tầng: {report}", LOG_INFO)
+            self._export_perf_stats()
+            self.perf_stats.reset()
         
         self.btn_start.config(text="📷  Bật Camera")
         self._color_button(self.btn_start, self.accent_blue, "#000000")
@@ -889,25 +3871,103 @@ class QRCameraApp:
         self.status_icon_label.config(text="●", foreground=self.text_muted)
         self.status_text_label.config(text="Chờ")
         
-        self._log_colored("🛑 Camera đã dừng", "warning")
-        self._log_colored("━" * 50, "info")
+        self._log_colored("🛑 Camera đã dừng", LOG_WARNING)
+        self._log_colored("━" * 50, LOG_INFO)
 
     def update_frame(self):
-        if not self.is_running or self.cap is None:
+        """Nhịp UI: với mỗi camera chỉ xử lý khung mới nhất do luồng đọc đưa lên, bỏ qua khung cũ"""
+        if not self.is_running or not self.sessions:
             return
 
-        ret, frame = self.cap.read()
-        if not ret:
-            self._log_colored("❌ Không thể đọc khung hình từ camera", "error")
-            self.stop_camera()
-            return
+        t0 = time.perf_counter()
+        new_frame = False
+        busy = False
+        for session in list(self.sessions):
+            frame = session.slot.take()
+            if frame is None and session.failed:
+                self._log_colored(f"❌ Không thể đọc khung hình từ camera {session.name}", LOG_ERROR)
+                self.sessions.remove(session)
+                session.stop()
+                # Áp dụng nốt kết quả đang nhận diện và lưu track dở của camera này
+                completed = session.engine.poll(wait=True)
+                if completed:
+                    self._apply_detection_batch(completed, session)
+                if self._save_undecoded_tracks(session.undecoded_tracker.flush()):
+                    self._update_qr_count()
+                session.engine.shutdown()
+                if not self.sessions:
+                    self.stop_camera()
+                    return
+                continue
+            if frame is not None:
+                session.last_frame = frame
+                new_frame = True
+            busy = self._update_session(session, frame) or busy
 
-        frame = cv2.flip(frame, 1)
+        if new_frame and self._display_due():
+            views = [
+                self._draw_overlays(session.last_frame, session)
+                for session in self.sessions if session.last_frame is not None
+            ]
+            labels = [session.name for session in self.sessions if session.last_frame is not None]
+            if views:
+                self.show_frame(tile_frames(views, labels if len(views) > 1 else ()))
+        if new_frame or busy:
+            self.perf_stats.record("ui_tick", (time.perf_counter() - t0) * 1000.0)
 
-        annotated = self.detect_and_save_from_frame(frame)
-        self.show_frame(annotated)
+        self.root.after(self.ui_tick_ms, self.update_frame)
+
+    def _update_session(self, session, frame):
+        """Một nhịp của một camera: bám, gửi nhận diện, áp dụng kết quả; trả về True nếu có kết quả"""
+        engine = session.engine
+        tracker = session.tracker
+        tracking = self.use_tracking.get()
+        if frame is not None:
+            now = time.monotonic()
+            if tracking and tracker.track(frame):
+                # Khung bao đi theo mã QR mà không cần nhận diện lại
+                session.overlays = tracker.overlays()
+                session.overlay_time = now
+
+            # Đĩa ghi không kịp: tạm dừng nhận diện mới thay vì chặn luồng UI
+            if not engine.busy() and not self.crop_writer.congested():
+                backend = self.detector_backend.get()
+                if not tracking or tracker.needs_detection(now):
+                    if not self.use_change_gate.get() or session.change_gate.should_detect(frame):
+                        scale, expected = 1.0, 0
+                        if self.use_pyramid.get():
+                            scale = session.pyramid_scaler.next_scale(frame.shape)
+                            expected = max(session.pyramid_scaler.expected(),
+                                           len(tracker.tracks) if tracking else 0)
+                        # Camera trực tiếp: khung trống chỉ thử BLIND_STAGES tầng đầu
+                        engine.submit(
+                            frame, self.use_enhance.get(), backend,
+                            scale=scale, stages=self._detect_stages(), expected=expected,
+                            blind_limit=BLIND_STAGES,
+                        )
+                else:
+                    regions = tracker.undecoded_regions(frame.shape)
+                    if regions:
+                        engine.submit(
+                            frame, self.use_enhance.get(), backend,
+                            regions=regions, stages=self._detect_stages(),
+                        )
 
-        self.root.after(30, self.update_frame)
+        completed = engine.poll()
+        if not completed:
+            return False
+        session.change_gate.notify_detections(any(r.detections for _, r in completed))
+        for _, result in completed:
+            session.pyramid_scaler.observe(result.detections, result.roi_only)
+        applied = self._apply_detection_batch(completed, session)
+        if tracking:
+            for done_frame, result, overlays in applied:
+                colors = [c for _, c in overlays]
+                if result.roi_only:
+                    tracker.update_content(result.detections, colors)
+                else:
+                    tracker.start(done_frame, result.detections, colors)
+        return True
     
     def _update_session_time(self):
         """Update session time display"""
@@ -916,155 +3976,216 @@ class QRCameraApp:
             minutes = int(elapsed.total_seconds() // 60)
             seconds = int(elapsed.total_seconds() % 60)
             self.session_time_label.config(text=f"{minutes:02d}:{seconds:02d}")
+            self._update_perf_card()
+            checked = sum(s.change_gate.checked for s in self.sessions)
+            if checked:
+                skipped = sum(s.change_gate.skipped for s in self.sessions)
+                self.gate_label.config(
+                    text=f"💤 Bỏ qua {skipped}/{checked} khung ({skipped / checked:.0%})"
+                )
             self.root.after(1000, self._update_session_time)
 
+    def _update_perf_card(self):
+        """FPS đọc/nhận diện/hiển thị trong giây vừa qua + p95 từng công đoạn chính"""
+        rates = self.perf_stats.rates()
+        self.perf_fps_label.config(
+            text=f"📷 {rates.get('capture', 0):.0f} · 🔍 {rates.get('detect', 0):.0f} · "
+            f"🖥 {rates.get('display', 0):.0f} fps"
+        )
+        p95 = self.perf_stats.percentile
+        self.perf_latency_label.config(
+            text=f"p95: tăng cường {p95('enhance', 0.95):g} · nhận diện {p95('detect', 0.95):g} · "
+            f"hiển thị {p95('display', 0.95):g} ms"
+        )
+
+    def _export_perf_stats(self):
+        """Xuất số liệu hiệu năng của phiên ra CSV/JSON (so sánh giữa các máy)"""
+        if not self.perf_stats.counters.get("detect"):
+            return
+        directory = os.path.join(self.output_dir or os.getcwd(), ".perf")
+        meta = {
+            "backend": self.detector_backend.get(),
+            "workers": self.detect_workers,
+            "pool": self.detect_mode,
+            "enhance": self.use_enhance.get(),
+            "pyramid": self.use_pyramid.get(),
+        }
+        try:
+            json_path, csv_path = self.perf_stats.export(directory, meta)
+        except OSError as e:
+            self._log_colored(f"⚠️ Không thể xuất số liệu hiệu năng: {e}", LOG_WARNING)
+            return
+        for row in self.perf_stats.summary():
+            self.log(
+                f"   {row['stage']:<9} n={row['count']:<6} tb {row['mean_ms']:.1f} ms, "
+                f"p95 {row['p95_ms']:g} ms, max {row['max_ms']:.1f} ms"
+            )
+        self._log_colored(f"📊 Số liệu hiệu năng: {json_path} (+ .csv)", LOG_INFO)
+
+    def _display_due(self):
+        """Chỉ vẽ lên màn hình tối đa display_fps lần/giây"""
+        now = time.perf_counter()
+        if now - self.last_display < 1.0 / self.display_fps:
+            return False
+        self.last_display = now
+        return True
+
     def show_frame(self, frame, max_size=(720, 520)):
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w = rgb.shape[:2]
+        t0 = time.perf_counter()
+        h, w = frame.shape[:2]
         
-        # Get actual canvas size
-        canvas_w = self.video_canvas.winfo_width()
-        canvas_h = self.video_canvas.winfo_height()
+        # Kích thước canvas lấy từ sự kiện <Configure>, không hỏi winfo mỗi khung
+        canvas_w, canvas_h = self.canvas_size
         
         if canvas_w > 1 and canvas_h > 1:
-            max_w, max_h = canvas_w - 20, canvas_h - 20
+            max_w, max_h = max(canvas_w - 20, 1), max(canvas_h - 20, 1)
         else:
             max_w, max_h = max_size
         
         scale = min(max_w / w, max_h / h, 1.0)
-        new_w, new_h = int(w * scale), int(h * scale)
+        new_w, new_h = max(int(w * scale), 1), max(int(h * scale), 1)
+        # Thu nhỏ trước rồi mới đổi màu: cvtColor chỉ chạy trên ảnh nhỏ
         if scale != 1.0:
-            rgb = cv2.resize(rgb, (new_w, new_h), interpolation=cv2.INTER_AREA)
-
+            frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         img_pil = Image.fromarray(rgb)
-        img_tk = ImageTk.PhotoImage(img_pil)
 
-        self.label_video.config(image=img_tk, text="")
-        self.label_video.image = img_tk
-        self.frame_tk = img_tk
-        
-        # Center the video label in canvas
-        if canvas_w > 1 and canvas_h > 1:
-            self.video_canvas.coords("video", canvas_w//2, canvas_h//2)
+        if self.frame_tk is not None and (self.frame_tk.width(), self.frame_tk.height()) == (new_w, new_h):
+            # Cùng kích thước: ghi đè điểm ảnh vào PhotoImage sẵn có
+            self.frame_tk.paste(img_pil)
+        else:
+            self.frame_tk = ImageTk.PhotoImage(img_pil)
+            self.label_video.config(image=self.frame_tk, text="")
+            self.label_video.image = self.frame_tk
+            # Center the video label in canvas
+            if canvas_w > 1 and canvas_h > 1:
+                self.video_canvas.coords("video", canvas_w//2, canvas_h//2)
+        self.perf_stats.record("display", (time.perf_counter() - t0) * 1000.0)
+        self.perf_stats.count("display")
 
     # ========== NHẬN DIỆN & LƯU QR ==========
 
     def detect_and_save_from_frame(self, frame):
-        frame_for_detect = frame
-        if self.use_enhance.get():
-            frame_for_detect = self.enhance_for_qr(frame)
+        """Nhận diện đồng bộ (dùng cho ảnh file) rồi áp dụng kết quả và vẽ khung"""
+        self.overlays = []
+        result = detect_qr_codes(
+            frame, self.use_enhance.get(), backend=self.detector_backend.get(),
+            stages=self._detect_stages(),
+        )
+        self._apply_detection_batch([(frame, result)])
+        return self._draw_overlays(frame)
 
-        detector = cv2.QRCodeDetector()
-        points = None
-        decoded_info = None
+    def _detect_stages(self):
+        """Thứ tự tầng tăng cường hiện tại (tự sắp theo tỉ lệ trúng) hoặc chỉ ảnh gốc"""
+        return self.cascade.order() if self.use_enhance.get() else ("raw",)
 
-        try:
-            retval, decoded_info, points, straight_qrcodes = detector.detectAndDecodeMulti(
-                frame_for_detect
+    def _apply_detection_batch(self, completed, target=None):
+        """Áp dụng một loạt kết quả từ worker trên luồng UI, cập nhật widget một lần.
+
+        target: CameraSession nhận khung bao/track (mặc định: app, cho ảnh và video).
+        Trả về [(frame, result, overlays)] với overlays khớp thứ tự result.detections.
+        """
+        target = target or self
+        self._drain_crop_writer()
+        qr_before = self.qr_count
+        duplicate_before = self.duplicate_count
+        applied = []
+        overlays = None
+        now = None  # video: tuổi track/TTL theo thời điểm khung, không theo đồng hồ
+
+        for frame, result in completed:
+            if result.error:
+                self._log_colored(f"⚠️ Lỗi nhận diện: {result.error}", LOG_WARNING)
+                continue
+            self.cascade.observe(result)
+            perf = self.perf_stats
+            perf.record("enhance", result.enhance_ms)
+            perf.record("detect", result.detect_ms)
+            perf.record("latency", result.latency_ms)
+            perf.count("detect")
+            if result.pos_ms is not None:
+                now = result.pos_ms / 1000.0
+            frame_overlays = (
+                self._apply_detections(frame, result, target, now) if result.detections else []
             )
-            if not retval:
-                points = None
-        except Exception:
-            data, points = detector.detectAndDecode(frame_for_detect)
-            if data == "" or points is None:
-                points = None
-            else:
-                decoded_info = [data]
+            applied.append((frame, result, frame_overlays))
+            if frame_overlays:
+                overlays = frame_overlays
 
-        if points is None:
-            return frame
+        if overlays is not None:
+            target.overlays = [(pts, *colors) for pts, colors in overlays]
+            target.overlay_time = time.monotonic()
+        self._save_undecoded_tracks(target.undecoded_tracker.expire(now))
 
-        pts = np.array(points, dtype=np.float32)
-        if pts.ndim == 2:
-            pts = pts[np.newaxis, :, :]
+        if self.duplicate_count != duplicate_before:
+            self.duplicate_count_label.config(text=str(self.duplicate_count))
+        if self.qr_count != qr_before:
+            self._update_qr_count()
+        return applied
 
+    def _apply_detections(self, frame, result, target=None, now=None):
+        """Kiểm tra trùng, lưu ảnh, ghi log cho một khung; trả về [(góc, (màu viền, màu góc))]
+
+        now: mốc thời gian (giây) cho tracker mã không đọc được và bộ nhớ "vừa thấy";
+        None thì dùng đồng hồ hệ thống (camera).
+        """
         self.ensure_output_dir()
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        overlays = []
 
-        for idx, qr_pts in enumerate(pts):
-            qr_pts = qr_pts.reshape(-1, 2).astype(int)
+        # Mã không đọc được: ghép theo IoU thành track, mỗi track chỉ lưu một ảnh nét nhất
+        undecoded_tracker = (target or self).undecoded_tracker
+        undecoded = [det for det in result.detections if not det.content]
+        undecoded_tracker.suppress([det.bbox for det in result.detections if det.content])
+        tracked = iter(undecoded_tracker.update(frame, undecoded, now) if undecoded else ())
+
+        for idx, det in enumerate(result.detections):
+            qr_pts = det.points
             xs, ys = qr_pts[:, 0], qr_pts[:, 1]
             min_x, max_x = xs.min(), xs.max()
             min_y, max_y = ys.min(), ys.max()
+            x1, y1, x2, y2 = det.bbox
+            content = det.content
 
-            pad = 10
-            x1 = max(min_x - pad, 0)
-            y1 = max(min_y - pad, 0)
-            x2 = min(max_x + pad, frame.shape[1])
-            y2 = min(max_y + pad, frame.shape[0])
-            if x2 <= x1 or y2 <= y1:
+            if not content:
+                track, is_new = next(tracked)
+                if is_new:
+                    self._log_colored(
+                        f"🔲 Mã QR không đọc được - đang theo dõi #{track.track_id}", LOG_WARNING
+                    )
+                # Khung tím + góc vàng: chờ rời khung hình rồi lưu ảnh nét nhất
+                overlays.append((qr_pts, ((255, 0, 255), (0, 255, 255))))
                 continue
 
-            roi = frame[y1:y2, x1:x2].copy()
-
-            content = None
-            if decoded_info is not None and idx < len(decoded_info):
-                content = decoded_info[idx].strip()
-
-            # Kiểm tra trùng lặp dựa trên nội dung mã QR
-            is_duplicate = False
-            duplicate_reason = ""
-            
-            if content:
-                # Kiểm tra trong session hiện tại
-                if content in self.saved_codes:
-                    is_duplicate = True
-                    duplicate_reason = "đã được phát hiện trong phiên này"
-                # Kiểm tra trong folder xuất
-                elif content in self.existing_qr_contents:
-                    is_duplicate = True
-                    duplicate_reason = "đã tồn tại trong folder xuất"
-            else:
-                # Nếu không đọc được nội dung, dùng key dựa trên vị trí
-                key = f"{min_x}_{min_y}_{max_x}_{max_y}"
-                if key in self.saved_codes:
-                    is_duplicate = True
-                    duplicate_reason = "đã được phát hiện trong phiên này (không đọc được nội dung)"
+            # Kiểm tra trùng lặp dựa trên nội dung mã QR (phiên hiện tại + folder xuất),
+            # kiểm tra và đánh dấu trong một bước vì nhiều camera dùng chung kho
+            duplicate_reason = self.dedup_store.claim(content)
             
-            if is_duplicate:
-                # Mã QR trùng - hiển thị thông báo và không lưu
-                self.duplicate_count += 1
-                self.duplicate_count_label.config(text=str(self.duplicate_count))
-                self._log_colored(f"⚠️ MÃ QR TRÙNG LẶP - Không lưu", "warning")
-                if content:
-                    self._log_colored(f"   💬 Nội dung: {content}", "warning")
-                else:
-                    self._log_colored(f"   💬 Nội dung: <không đọc được>", "warning")
-                self._log_colored(f"   📌 Lý do: {duplicate_reason}", "warning")
-                self.log("")
-                
-                # Hiển thị thông báo popup
-                self._show_notification("⚠️ Mã QR Trùng Lặp!", self.accent_yellow)
+            if duplicate_reason:
+                # Mã QR trùng - không lưu; chỉ báo lần đầu mỗi khi mã xuất hiện lại
+                if not self.recent_codes.seen(content, now):
+                    self.duplicate_count += 1
+                    self._log_colored(f"⚠️ MÃ QR TRÙNG LẶP - Không lưu", LOG_WARNING)
+                    self._log_colored(f"   💬 Nội dung: {content}", LOG_WARNING)
+                    self._log_colored(f"   📌 Lý do: {duplicate_reason}", LOG_WARNING)
+                    self.log("")
+                    
+                    # Hiển thị thông báo popup
+                    self._show_notification("⚠️ Mã QR Trùng Lặp!", self.accent_yellow)
                 
-                # Vẽ khung màu vàng/cam để báo trùng
-                cv2.polylines(frame, [qr_pts], True, (0, 165, 255), 3)  # Màu cam
-                for (x, y) in qr_pts:
-                    cv2.circle(frame, (x, y), 5, (0, 255, 255), -1)  # Màu vàng
+                # Khung màu cam + góc vàng để báo trùng
+                overlays.append((qr_pts, ((0, 165, 255), (0, 255, 255))))
             else:
-                # Mã QR mới - lưu vào
-                if content:
-                    self.saved_codes.add(content)
-                    self.existing_qr_contents.add(content)
-                else:
-                    key = f"{min_x}_{min_y}_{max_x}_{max_y}"
-                    self.saved_codes.add(key)
-                
-                self.qr_count += 1
-                self._update_qr_count()
-                
-                filename = f"qr_{timestamp}_{idx+1}.png"
-                save_path = os.path.join(self.output_dir, filename)
-                cv2.imwrite(save_path, roi)
-                
-                # Lưu metadata
-                self._save_metadata()
+                # Mã QR mới - gửi ảnh cho luồng ghi; nội dung vào chỉ mục khi ghi xong
+                filename = self._save_crop(frame[y1:y2, x1:x2].copy(), [content])
+                if filename is None:
+                    overlays.append((qr_pts, ((0, 165, 255), (0, 255, 255))))
+                    continue
+                # Lần xuất hiện này đã được báo (đã lưu), các khung sau không báo trùng
+                self.recent_codes.seen(content, now)
                 
-                self._log_colored(f"✅ Mã QR #{self.qr_count} Đã Phát Hiện & Lưu", "success")
+                self._log_colored(f"✅ Mã QR #{self.qr_count} Đã Phát Hiện & Lưu", LOG_SUCCESS)
                 self.log(f"   📄 Tệp: {filename}")
-                if content:
-                    self._log_colored(f"   💬 Nội dung: {content}", "highlight")
-                else:
-                    self._log_colored(f"   💬 Nội dung: <trống hoặc không đọc được>", "warning")
+                self._log_colored(f"   💬 Nội dung: {content}", LOG_HIGHLIGHT)
                 self.log("")
                 
                 # Create confetti effect at QR center
@@ -1072,11 +4193,62 @@ class QRCameraApp:
                 center_y = (min_y + max_y) // 2
                 self._create_confetti(center_x, center_y)
                 
-                # Vẽ khung màu xanh để báo thành công
-                cv2.polylines(frame, [qr_pts], True, (250, 165, 96), 3)  # Blue-orange
-                for (x, y) in qr_pts:
-                    cv2.circle(frame, (x, y), 5, (238, 211, 34), -1)  # Cyan-yellow
+                # Khung xanh + góc cyan để báo thành công
+                overlays.append((qr_pts, ((250, 165, 96), (238, 211, 34))))
+
+        return overlays
+
+    def _save_crop(self, roi, contents):
+        """Gửi ảnh QR cho luồng ghi nền + đếm; trả về tên file, None nếu hàng đợi ghi đầy"""
+        ext, params = self._crop_write_params()
+        filename = crop_relpath(
+            self.crop_namer.next(ext), self.crop_layout.get(), contents[0] if contents else ""
+        )
+        # Ghi ở luồng nền; chỉ mục nội dung + chỉ mục file được cập nhật khi ghi xong
+        if not self.crop_writer.submit(self.output_dir, filename, roi, params, contents):
+            self._log_colored(f"⚠️ Ổ đĩa ghi không kịp, bỏ ảnh {filename}", LOG_WARNING)
+            self._release_codes(contents)
+            return None
+        self.qr_count += 1
+        return filename
+
+    def _save_undecoded_tracks(self, tracks):
+        """Lưu đúng một ảnh (nét nhất) cho mỗi track mã không đọc được đã kết thúc; trả về số ảnh"""
+        saved = 0
+        for track in tracks:
+            if track.crop is None:
+                continue
+            self.ensure_output_dir()
+            filename = self._save_crop(track.crop, [])
+            if filename is None:
+                continue
+            self._log_colored(f"✅ Mã QR #{self.qr_count} Đã Lưu (track #{track.track_id})", LOG_SUCCESS)
+            self.log(f"   📄 Tệp: {filename}")
+            self._log_colored(
+                f"   💬 Nội dung: <không đọc được> - {track.hits} khung, "
+                f"độ nét {track.sharpness:.0f}",
+                LOG_WARNING,
+            )
+            self.log("")
+            saved += 1
+        return saved
 
+    def _draw_overlays(self, frame, target=None):
+        """Vẽ khung bao của lần nhận diện gần nhất (hết hạn sau overlay_ttl giây)"""
+        target = target or self
+        if not target.overlays:
+            return frame
+        if self.is_running and time.monotonic() - target.overlay_time > self.overlay_ttl:
+            target.overlays = []
+            return frame
+        # Vẽ lên bản sao: khung gốc có thể vẫn đang được worker nhận diện/cắt ROI
+        t0 = time.perf_counter()
+        frame = frame.copy()
+        for qr_pts, line_color, corner_color in target.overlays:
+            cv2.polylines(frame, [qr_pts], True, line_color, 3)
+            for (x, y) in qr_pts:
+                cv2.circle(frame, (int(x), int(y)), 5, corner_color, -1)
+        self.perf_stats.record("annotate", (time.perf_counter() - t0) * 1000.0)
         return frame
 
     # ========== KHÁC ==========
@@ -1089,8 +4261,12 @@ class QRCameraApp:
             fg=self.text_muted,
             font=("Segoe UI", 12),
         )
+        self.frame_tk = None
+        self.log_buffer.clear()
         self.text_log.delete("1.0", tk.END)
-        self.saved_codes.clear()
+        self.dedup_store.clear()
+        self.recent_codes.clear()
+        self.undecoded_tracker.reset()
         self.qr_count = 0
         self.duplicate_count = 0
         self._update_qr_count()
@@ -1098,19 +4274,29 @@ class QRCameraApp:
         self.session_start_time = None
         self.session_time_label.config(text="00:00")
         
-        self._log_colored("🔄 Đã Đặt Lại Ứng Dụng", "warning")
-        self._log_colored("━" * 50, "info")
+        self._log_colored("🔄 Đã Đặt Lại Ứng Dụng", LOG_WARNING)
+        self._log_colored("━" * 50, LOG_INFO)
         self.log("📌 Sẵn sàng cho phiên mới:")
         self.log("   • Mở file ảnh để quét")
         self.log("   • Hoặc bật nhận diện camera trực tiếp")
-        self._log_colored("━" * 50, "info")
+        self._log_colored("━" * 50, LOG_INFO)
         
         self.set_status("Sẵn Sàng", self.accent_green)
         self.status_icon_label.config(text="●", foreground=self.text_muted)
         self.status_text_label.config(text="Chờ")
 
     def on_close(self):
+        self._cancel_folder_scan()
         self.stop_camera()
+        self.crop_writer.close()
+        self._drain_crop_writer()
+        if self.detection_engine is not None:
+            self.detection_engine.shutdown()
+            self.detection_engine = None
+        if self.content_index is not None:
+            self.content_index.close()
+        self._save_file_index()
+        self.log_buffer.close()
         self.root.destroy()
 
     # ========== ANIMATIONS ==========
@@ -1121,68 +4307,69 @@ class QRCameraApp:
         self.root.after(50, callback)
     
     def _start_animations(self):
-        """Start all animation loops"""
-        self._animate_pulse()
-        self._animate_gradient()
-        self._animate_scan_line()
-        self._animate_glow_borders()
-        self._animate_rainbow_title()
-        self._animate_particles()
+        """Đăng ký mọi hiệu ứng vào một bộ lập lịch chung"""
+        self.animator.add("pulse", 50, self._animate_pulse, lambda: self.is_running)
+        self.animator.add("scan_line", 30, self._animate_scan_line, lambda: self.is_running)
+        self.animator.add("rainbow", 50, self._animate_rainbow_title, lambda: self.is_running)
+        self.animator.add("particles", 30, self._animate_particles, lambda: bool(self.particles))
+        # Chèn log vẫn chạy ở chế độ hiệu năng
+        self.animator.add("log", 50, self._flush_log, lambda: bool(self.log_buffer.pending), essential=True)
+        self.animator.wake()
+    
+    def _on_performance_mode(self):
+        """Chế độ hiệu năng: tắt mọi hiệu ứng, popup và số đếm động để dành CPU cho quét"""
+        enabled = not self.performance_mode.get()
+        self.animator.set_enabled(enabled)
+        if not enabled:
+            self.video_canvas.delete("scanline")
+            self.video_canvas.delete("particle")
+            self.particles = []
+            self.title_label.config(foreground=self.accent_cyan)
+            self.notification_queue.clear()
+        self._log_colored(
+            "🐢 Chế độ hiệu năng: ĐÃ BẬT (tắt hiệu ứng)" if not enabled else "✨ Hiệu ứng: ĐÃ BẬT",
+            LOG_HIGHLIGHT,
+        )
     
     def _animate_pulse(self):
         """Pulsing animation for status indicator"""
-        if self.is_running:
-            # Calculate breathing effect (0.5 to 1.0)
-            self.pulse_alpha += 0.03 * self.pulse_direction
-            if self.pulse_alpha >= 1.0:
-                self.pulse_alpha = 1.0
-                self.pulse_direction = -1
-            elif self.pulse_alpha <= 0.5:
-                self.pulse_alpha = 0.5
-                self.pulse_direction = 1
-            
-            # Apply pulsing to status icon
-            intensity = int(self.pulse_alpha * 255)
-            if self.is_running:
-                color = f"#{intensity//4:02x}{intensity:02x}{intensity//4:02x}"  # Green pulse
-                self.status_icon_label.config(foreground=color)
+        # Calculate breathing effect (0.5 to 1.0)
+        self.pulse_alpha += 0.03 * self.pulse_direction
+        if self.pulse_alpha >= 1.0:
+            self.pulse_alpha = 1.0
+            self.pulse_direction = -1
+        elif self.pulse_alpha <= 0.5:
+            self.pulse_alpha = 0.5
+            self.pulse_direction = 1
         
-        self.root.after(50, self._animate_pulse)
-    
-    def _animate_gradient(self):
-        """Animated gradient effect for header"""
-        self.gradient_offset = (self.gradient_offset + 1) % 360
-        
-        # This creates a subtle color shift effect
-        # We can apply this to various elements
-        
-        self.root.after(100, self._animate_gradient)
+        # Apply pulsing to status icon
+        intensity = int(self.pulse_alpha * 255)
+        color = f"#{intensity//4:02x}{intensity:02x}{intensity//4:02x}"  # Green pulse
+        self.status_icon_label.config(foreground=color)
     
     def _animate_scan_line(self):
         """Scanning line animation in video area when camera is active"""
-        if self.is_running and hasattr(self, 'video_canvas'):
-            self.scan_line_y += 3 * self.scan_direction
-            canvas_height = self.video_canvas.winfo_height()
-            
-            if canvas_height > 0:
-                if self.scan_line_y >= canvas_height:
-                    self.scan_line_y = canvas_height
-                    self.scan_direction = -1
-                elif self.scan_line_y <= 0:
-                    self.scan_line_y = 0
-                    self.scan_direction = 1
-                
-                # Draw scan line
-                self.video_canvas.delete("scanline")
-                self.video_canvas.create_line(
-                    0, self.scan_line_y,
-                    self.video_canvas.winfo_width(), self.scan_line_y,
-                    fill=self.accent_cyan,
-                    width=2,
-                    tags="scanline"
-                )
+        canvas_width, canvas_height = self.canvas_size
+        if canvas_height <= 0:
+            return
+        
+        self.scan_line_y += 3 * self.scan_direction
+        if self.scan_line_y >= canvas_height:
+            self.scan_line_y = canvas_height
+            self.scan_direction = -1
+        elif self.scan_line_y <= 0:
+            self.scan_line_y = 0
+            self.scan_direction = 1
         
-        self.root.after(30, self._animate_scan_line)
+        # Tạo đường quét một lần, các nhịp sau chỉ dời toạ độ
+        if not self.video_canvas.find_withtag("scanline"):
+            self.video_canvas.create_line(
+                0, 0, 0, 0,
+                fill=self.accent_cyan,
+                width=2,
+                tags="scanline"
+            )
+        self.video_canvas.coords("scanline", 0, self.scan_line_y, canvas_width, self.scan_line_y)
     
     def _animate_button_press(self, button):
         """Button press animation effect"""
@@ -1198,16 +4385,22 @@ class QRCameraApp:
             self.root.after(30, lambda: self._fade_in_widget(widget, current_alpha))
     
     def _slide_in_log(self, message, tag=None):
-        """Slide in animation for log messages"""
-        # Add a visual separator with animation
-        self.text_log.insert(tk.END, "  ", tag)
-        self.text_log.insert(tk.END, message + "\n", tag)
+        """Xếp dòng log vào hàng đợi; widget được cập nhật gộp mỗi nhịp"""
+        self.log_buffer.append(message, tag)
+        self.animator.wake()
+    
+    def _flush_log(self):
+        """Chèn mọi dòng đang chờ trong một lần insert và cắt bớt dòng cũ"""
+        lines, excess = self.log_buffer.take()
+        if not lines:
+            return
+        chunks = []
+        for message, tag in lines:
+            chunks.extend(("  " + message + "\n", tag or ()))
+        self.text_log.insert(tk.END, *chunks)
+        if excess:
+            self.text_log.delete("1.0", f"{excess + 1}.0")
         self.text_log.see(tk.END)
-        
-        # Trigger a flash effect
-        self.text_log.tag_configure("flash", background=self.accent_blue)
-        if tag:
-            self.root.after(100, lambda: self.text_log.tag_configure(tag, background=self.bg_card))
     
     def _bounce_stat(self, label):
         """Bounce animation for stat update"""
@@ -1222,6 +4415,9 @@ class QRCameraApp:
     
     def _show_notification(self, message, color):
         """Show animated notification popup"""
+        if self.performance_mode.get():
+            # Chế độ hiệu năng: không mở cửa sổ popup, log đã ghi nội dung
+            return
         self.notification_queue.append((message, color))
         if self.current_notification is None:
             self._process_notification_queue()
@@ -1280,7 +4476,10 @@ class QRCameraApp:
         if current is None:
             current = start
         
-        if current < end:
+        if self.performance_mode.get():
+            # Bật chế độ hiệu năng giữa chừng: nhảy thẳng tới số cuối, không nảy
+            label.config(text=str(end))
+        elif current < end:
             current += 1
             label.config(text=str(current))
             self.root.after(50, lambda: self._animate_count_up(label, start, end, current))
@@ -1288,33 +4487,6 @@ class QRCameraApp:
             label.config(text=str(end))
             self._bounce_stat(label)
     
-    def _animate_glow_borders(self):
-        """Animated glow effect for card borders"""
-        # This creates a pulsing glow effect on borders
-        # We cycle through brightness levels
-        
-        if not hasattr(self, 'glow_intensity'):
-            self.glow_intensity = 0.5
-            self.glow_direction = 1
-        
-        self.glow_intensity += 0.01 * self.glow_direction
-        
-        if self.glow_intensity >= 1.0:
-            self.glow_intensity = 1.0
-            self.glow_direction = -1
-        elif self.glow_intensity <= 0.5:
-            self.glow_intensity = 0.5
-            self.glow_direction = 1
-        
-        # Apply glow to stat cards when camera is running
-        if self.is_running and hasattr(self, 'qr_stat_card'):
-            intensity = int(self.glow_intensity * 255)
-            glow_color = f"#{intensity//2:02x}{intensity:02x}{intensity:02x}"
-            # Note: We can't easily change border color dynamically in tkinter
-            # This is a placeholder for the concept
-        
-        self.root.after(50, self._animate_glow_borders)
-    
     def _progress_bar_animation(self, progress=0):
         """Animated progress bar effect"""
         # This could be used for loading states
@@ -1364,14 +4536,11 @@ class QRCameraApp:
         
         color = f"#{r:02x}{g:02x}{b:02x}"
         
-        # Apply color to title (only when camera is active for performance)
-        if self.is_running and hasattr(self, 'title_label'):
-            try:
-                self.title_label.config(foreground=color)
-            except:
-                pass
-        
-        self.root.after(50, self._animate_rainbow_title)
+        # Apply color to title (scheduler chỉ chạy khi camera hoạt động)
+        try:
+            self.title_label.config(foreground=color)
+        except:
+            pass
     
     def _animate_particles(self):
         """Animate particle effects"""
@@ -1422,13 +4591,14 @@ class QRCameraApp:
                 self.particles.pop(i)
             except:
                 pass
-        
-        self.root.after(30, self._animate_particles)
     
     def _create_confetti(self, x, y):
         """Create confetti particles at position"""
         import random
         
+        if self.performance_mode.get():
+            return
+        
         colors = [self.accent_cyan, self.accent_purple, self.accent_green, 
                   self.accent_yellow, self.accent_blue]
         
@@ -1456,9 +4626,509 @@ class QRCameraApp:
                     })
                 except:
                     pass
+        
+        self.animator.wake()
 
 
-if __name__ == "__main__":
+# ================== DÒNG LỆNH (KHÔNG CẦN MÀN HÌNH) ==================
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def iter_image_files(root_dir, exclude_dir=None):
+    """Duyệt cây thư mục, trả về đường dẫn ảnh theo thứ tự ổn định."""
+    exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        if exclude_dir is not None:
+            dirnames[:] = [
+                d for d in dirnames if os.path.abspath(os.path.join(dirpath, d)) != exclude_dir
+            ]
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, filename)
+
+
+def detect_with_crops(frame, use_enhance=True, backend="opencv"):
+    """Worker: nhận diện và cắt ROI từ khung; trả về (DetectionResult, crops)."""
+    result = detect_qr_codes(frame, use_enhance, backend=backend)
+    crops = [frame[y1:y2, x1:x2].copy() for (x1, y1, x2, y2) in (d.bbox for d in result.detections)]
+    return result, crops
+
+
+def scan_image_file(path, use_enhance=True, backend="opencv"):
+    """Worker: đọc ảnh rồi detect_with_crops; trả về (path, DetectionResult, crops)."""
+    img = cv2.imread(path)
+    if img is None:
+        return path, DetectionResult(backend=backend, error="không đọc được ảnh"), []
+    result, crops = detect_with_crops(img, use_enhance, backend)
+    return path, result, crops
+
+
+def open_output_indexes(output_dir, backend="opencv", bloom=False):
+    """Mở chỉ mục nội dung + chỉ mục file của folder xuất, giải mã file mới/thay đổi."""
+    os.makedirs(output_dir, exist_ok=True)
+    content_index = QRContentIndex(output_dir, bloom=bloom)
+    content_index.load()
+    file_index = QRFileIndex(output_dir)
+    file_index.load()
+    if not len(content_index) and file_index.has_codes():
+        # Mất chỉ mục nội dung: file index không giữ nội dung nên phải giải mã lại hết
+        file_index.reset()
+    for content in file_index.take_legacy_contents():
+        content_index.add(content)
+    for filename, size, mtime_ns in file_index.scan():
+        try:
+            contents = decode_qr_file(os.path.join(output_dir, filename), backend)
+        except Exception:
+            contents = []
+        file_index.update(filename, size, mtime_ns, contents)
+        for content in contents:
+            content_index.add(content)
+    file_index.save()
+    return content_index, file_index
+
+
+class BatchRecorder:
+    """Luật trùng + lưu ảnh QR cho các lệnh dòng lệnh (giống giao diện)."""
+
+    def __init__(self, output_dir, backend="opencv", codec="png", level=None, bloom=False, layout="flat",
+                 track_undecoded=False):
+        self.output_dir = os.path.abspath(output_dir)
+        self.content_index, self.file_index = open_output_indexes(self.output_dir, backend, bloom)
+        self.ext, self.params = crop_write_params(codec, level)
+        self.layout = layout
+        self.writer = CropWriter(block_timeout=None)  # CLI: chờ đĩa thay vì bỏ ảnh
+        self.namer = CropNamer()
+        self.session_codes = DigestSet()
+        # Video: mã không đọc được ghép thành track, mỗi track chỉ lưu một ảnh nét nhất
+        self.undecoded_tracker = UndecodedTracker() if track_undecoded else None
+        self.totals = {"codes": 0, "new": 0, "duplicate": 0, "tracked": 0, "errors": 0}
+
+    def record(self, result, crops, now=None):
+        """Trả về danh sách dict mô tả từng mã (content, points, status, ...).
+
+        now: thời điểm khung (giây) để ghép/hết hạn track mã không đọc được.
+        """
+        self._drain_writer()
+        if result.error:
+            self.totals["errors"] += 1
+        tracker = self.undecoded_tracker
+        tracked = iter(())
+        if tracker is not None:
+            tracker.suppress([det.bbox for det in result.detections if det.content])
+            undecoded = [(det, crop) for det, crop in zip(result.detections, crops) if not det.content]
+            if undecoded:
+                tracked = iter(tracker.update(
+                    None, [det for det, _ in undecoded], now, crops=[crop for _, crop in undecoded]
+                ))
+        codes = []
+        for det, crop in zip(result.detections, crops):
+            code = {"content": det.content, "points": det.points.tolist()}
+            self.totals["codes"] += 1
+            if not det.content and tracker is not None:
+                track, _ = next(tracked)
+                code.update(status="tracked", track=track.track_id)
+            # Trùng trong phiên hoặc đã có trong folder xuất
+            elif det.content and det.content in self.session_codes:
+                code.update(status="duplicate", reason="session")
+            elif det.content and det.content in self.content_index:
+                code.update(status="duplicate", reason="output")
+            else:
+                filename = crop_relpath(self.namer.next(self.ext), self.layout, det.content)
+                self.writer.submit(
+                    self.output_dir, filename, crop, self.params,
+                    [det.content] if det.content else [],
+                )
+                if det.content:
+                    self.session_codes.add(det.content)
+                code.update(status="new", saved=filename)
+            self.totals[code["status"]] += 1
+            codes.append(code)
+        return codes
+
+    def expire_tracks(self, now=None):
+        """Lưu ảnh cho các track đã rời khung tính tới now; trả về danh sách dict mô tả."""
+        if self.undecoded_tracker is None:
+            return []
+        return self._save_tracks(self.undecoded_tracker.expire(now))
+
+    def finish_tracks(self):
+        """Hết video: lưu ảnh cho mọi track còn mở."""
+        if self.undecoded_tracker is None:
+            return []
+        return self._save_tracks(self.undecoded_tracker.flush())
+
+    def _save_tracks(self, tracks):
+        saved = []
+        for track in tracks:
+            if track.crop is None:
+                continue
+            filename = crop_relpath(self.namer.next(self.ext), self.layout)
+            self.writer.submit(self.output_dir, filename, track.crop, self.params)
+            self.totals["new"] += 1
+            saved.append({"track": track.track_id, "hits": track.hits,
+                          "sharpness": round(track.sharpness, 1), "saved": filename})
+        return saved
+
+    def summary(self):
+        t = self.totals
+        text = f"{t['codes']} mã, {t['new']} mới, {t['duplicate']} trùng, {t['errors']} lỗi"
+        if self.undecoded_tracker is not None:
+            text += f", {t['tracked']} lượt mã không đọc được"
+        return text
+
+    def _drain_writer(self):
+        """Ảnh ghi xong: ghi mã vào chỉ mục; ghi lỗi: bỏ đánh dấu phiên để lần thấy sau lưu lại."""
+        for _, filename, contents, error in self.writer.drain():
+            if error:
+                self.totals["errors"] += 1
+                print(f"Không thể lưu {filename}: {error}", file=sys.stderr)
+                for content in contents:
+                    self.session_codes.discard(content)
+            else:
+                for content in contents:
+                    self.content_index.add(content)
+                self.file_index.record(filename, contents)
+
+    def close(self):
+        self.writer.close()
+        self._drain_writer()
+        self.file_index.save()
+        self.content_index.close()
+
+
+def _timing_fields(result):
+    return {
+        "enhance_ms": round(result.enhance_ms, 2),
+        "detect_ms": round(result.detect_ms, 2),
+        "total_ms": round(result.total_ms, 2),
+    }
+
+
+def _open_jsonl(path):
+    return sys.stdout if path == "-" else open(path, "w", encoding="utf-8")
+
+
+def _make_executor(args):
+    if args.pool == "process":
+        return spawn_process_pool(args.workers, _init_scan_worker)
+    return ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="qr-detect")
+
+
+def run_batch_scan(args):
+    """Quét cả cây thư mục ảnh, ghi kết quả JSON Lines, lưu mã mới vào folder xuất"""
+    output_dir = os.path.abspath(args.output or os.path.join(os.getcwd(), "qr_output"))
+    recorder = BatchRecorder(
+        output_dir, args.backend, args.codec, args.quality, args.bloom, args.layout
+    )
+    files = 0
+
+    out = _open_jsonl(args.jsonl)
+    paths = iter_image_files(args.input, exclude_dir=output_dir)
+    started = time.perf_counter()
+    try:
+        with _make_executor(args) as executor:
+            in_flight = deque()
+            while True:
+                # Chỉ giữ workers * 2 ảnh đang xử lý: không liệt kê/nạp trước cả cây thư mục
+                while len(in_flight) < args.workers * 2:
+                    path = next(paths, None)
+                    if path is None:
+                        break
+                    in_flight.append(executor.submit(
+                        scan_image_file, path, not args.no_enhance, args.backend
+                    ))
+                if not in_flight:
+                    break
+
+                path, result, crops = in_flight.popleft().result()
+                files += 1
+                record = {"file": os.path.relpath(path, args.input)}
+                record["codes"] = recorder.record(result, crops)
+                record.update(_timing_fields(result))
+                if result.error:
+                    record["error"] = result.error
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        recorder.close()
+
+    elapsed = time.perf_counter() - started
+    rate = files / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Đã quét {files} ảnh trong {elapsed:.1f}s ({rate:.1f} ảnh/s): {recorder.summary()}",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def run_video_scan(args):
+    """Quét file video nhanh nhất CPU cho phép, ghi JSON Lines cho khung có mã QR"""
+    output_dir = os.path.abspath(args.output or os.path.join(os.getcwd(), "qr_output"))
+    try:
+        reader = VideoFileReader(args.input, stride=args.stride, seek=args.seek)
+    except OSError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    recorder = BatchRecorder(
+        output_dir, args.backend, args.codec, args.quality, args.bloom, args.layout,
+        track_undecoded=True,
+    )
+    frames = 0
+
+    out = _open_jsonl(args.jsonl)
+    started = time.perf_counter()
+    try:
+        with _make_executor(args) as executor:
+            in_flight = deque()
+            frame_iter = iter(reader)
+            while True:
+                # Giữ pool luôn đầy nhưng có giới hạn để không giữ quá nhiều khung trong RAM
+                while len(in_flight) < args.workers * 2:
+                    item = next(frame_iter, None)
+                    if item is None:
+                        break
+                    index, pos_ms, frame = item
+                    future = executor.submit(
+                        detect_with_crops, frame, not args.no_enhance, args.backend
+                    )
+                    in_flight.append((index, pos_ms, future))
+                if not in_flight:
+                    break
+
+                index, pos_ms, future = in_flight.popleft()
+                result, crops = future.result()
+                frames += 1
+                # Track mã không đọc được già đi theo thời điểm trong video, không theo đồng hồ
+                now = pos_ms / 1000.0
+                record = {"frame": index, "time_ms": round(pos_ms, 1)}
+                if result.detections or result.error:
+                    record["codes"] = recorder.record(result, crops, now)
+                    record.update(_timing_fields(result))
+                    if result.error:
+                        record["error"] = result.error
+                tracks = recorder.expire_tracks(now)
+                if tracks:
+                    record["tracks"] = tracks
+                if "codes" in record or tracks:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+            tracks = recorder.finish_tracks()
+            if tracks:
+                out.write(json.dumps({"tracks": tracks}, ensure_ascii=False) + "\n")
+    finally:
+        reader.release()
+        if out is not sys.stdout:
+            out.close()
+        recorder.close()
+
+    elapsed = time.perf_counter() - started
+    rate = frames / elapsed if elapsed > 0 else 0.0
+    speed = rate * args.stride / reader.fps if reader.fps else 0.0
+    print(
+        f"Đã xử lý {frames} khung trong {elapsed:.1f}s ({rate:.1f} khung/s, "
+        f"~{speed:.1f}x thời gian thực): {recorder.summary()}",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def run_migrate(args):
+    """Di chuyển ảnh QR đã lưu sang layout args.layout, cập nhật chỉ mục file"""
+    output_dir = os.path.abspath(args.input)
+    if not os.path.isdir(output_dir):
+        print(f"Không có thư mục: {output_dir}", file=sys.stderr)
+        return 1
+    content_index, file_index = open_output_indexes(output_dir, args.backend)
+    content_index.close()
+
+    moves = []
+    for rel, (_, mtime_ns, shard) in file_index.entries.items():
+        target = crop_relpath(rel, args.layout, mtime=mtime_ns / 1e9, shard=shard)
+        if target != rel:
+            moves.append((rel, target))
+    if args.dry_run:
+        print(f"Sẽ di chuyển {len(moves)}/{len(file_index.entries)} file sang layout {args.layout}")
+        return 0
+
+    started = time.perf_counter()
+    moved = errors = 0
+    made_dirs = set()
+    old_dirs = set()
+    for rel, target in moves:
+        src = os.path.join(output_dir, rel)
+        dst = os.path.join(output_dir, target)
+        parent = os.path.dirname(dst)
+        try:
+            if parent not in made_dirs:
+                os.makedirs(parent, exist_ok=True)
+                made_dirs.add(parent)
+            if os.path.exists(dst):
+                raise FileExistsError(f"đã có {target}")
+            os.rename(src, dst)
+        except OSError as e:
+            errors += 1
+            print(f"Không thể di chuyển {rel}: {e}", file=sys.stderr)
+            continue
+        file_index.move(rel, target)
+        old_dirs.add(os.path.dirname(src))
+        moved += 1
+        if moved % 1000 == 0:
+            # Lưu dần: bị ngắt giữa chừng thì lần quét sau vẫn tự sửa chỉ mục
+            file_index.save()
+    file_index.save()
+
+    # Dọn thư mục con cũ đã rỗng (sâu trước)
+    for directory in sorted(old_dirs, key=len, reverse=True):
+        while directory != output_dir and directory.startswith(output_dir):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Đã di chuyển {moved} file sang layout {args.layout} trong {elapsed:.1f}s, {errors} lỗi",
+        file=sys.stderr,
+    )
+    return 1 if errors else 0
+
+
+def build_arg_parser():
+    # Tuỳ chọn nhận diện dùng chung cho mọi lệnh con
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+        help="số worker nhận diện (mặc định: số core - 1)",
+    )
+    common.add_argument(
+        "--pool", choices=("thread", "process"), default="thread",
+        help="loại pool worker nhận diện",
+    )
+    common.add_argument(
+        "--backend", choices=sorted(QR_BACKENDS), default=OpenCVQRBackend.name,
+        help="bộ nhận diện QR",
+    )
+    common.add_argument("--no-enhance", action="store_true", help="tắt CLAHE + làm nét")
+    common.add_argument(
+        "--codec", choices=sorted(CROP_CODECS), default="png", help="định dạng lưu ảnh QR"
+    )
+    common.add_argument(
+        "--quality", type=int, default=None,
+        help="mức nén PNG (0-9) hoặc chất lượng JPEG/WebP (1-100)",
+    )
+    common.add_argument(
+        "--layout", choices=CROP_LAYOUTS, default="flat",
+        help="chia thư mục con cho ảnh QR mới: flat, date (ngày/giờ), hash (băm nội dung)",
+    )
+    common.add_argument(
+        "--bloom", action="store_true",
+        help="thêm Bloom filter trước bảng digest chống trùng (chỉ mục rất lớn)",
+    )
+
+    parser = argparse.ArgumentParser(
+        description="Máy quét QR: giao diện camera (mặc định) hoặc quét hàng loạt không cần màn hình."
+    )
+    parser.set_defaults(**vars(common.parse_args([])))
+    sub = parser.add_subparsers(dest="command")
+    parser.set_defaults(
+        display_fps=30, log_lines=2000, log_file=None, repeat_ttl=2.0, camera=["0"], capture_backend="auto",
+        capture_size=(0, 0), capture_fps=0.0, fourcc="", buffer_size=1, grab="drain",
+    )
+    gui = sub.add_parser("gui", parents=[common], help="mở giao diện camera (mặc định)")
+    gui.add_argument("--display-fps", type=int, default=30, help="giới hạn FPS hiển thị")
+    gui.add_argument("--log-lines", type=int, default=2000, help="số dòng tối đa giữ trong ô log")
+    gui.add_argument("--log-file", help="ghi toàn bộ log ra file xoay vòng (5 MB x 3)")
+    gui.add_argument(
+        "--camera", nargs="+", default=["0"],
+        help="camera: chỉ số thiết bị, /dev/videoN hoặc URL; nhiều giá trị = quét nhiều camera cùng lúc",
+    )
+    gui.add_argument(
+        "--capture-backend", choices=sorted(CAPTURE_BACKENDS), default="auto",
+        help="backend đọc camera (auto: DSHOW trên Windows, ANY ở nơi khác)",
+    )
+    gui.add_argument("--capture-size", type=parse_resolution, default=(0, 0), help="độ phân giải camera WxH, vd. 1920x1080")
+    gui.add_argument("--capture-fps", type=float, default=0.0, help="FPS yêu cầu từ camera")
+    gui.add_argument("--fourcc", default="", help="định dạng pixel camera, vd. MJPG")
+    gui.add_argument("--buffer-size", type=int, default=1, help="số khung đệm của driver (CAP_PROP_BUFFERSIZE)")
+    gui.add_argument(
+        "--grab", choices=("drain", "read"), default="drain",
+        help="drain: bỏ khung cũ trong bộ đệm, chỉ lấy khung mới nhất; read: đọc tuần tự",
+    )
+    gui.add_argument(
+        "--repeat-ttl", type=float, default=2.0,
+        help="mã trùng phải rời khung hình bao nhiêu giây mới được báo lại",
+    )
+
+    scan = sub.add_parser("scan", parents=[common], help="quét một cây thư mục ảnh, xuất JSON Lines")
+    scan.add_argument("input", help="thư mục ảnh cần quét (quét cả thư mục con)")
+    scan.add_argument("-o", "--output", help="folder xuất ảnh QR (mặc định ./qr_output)")
+    scan.add_argument("--jsonl", default="-", help="file JSON Lines kết quả ('-' = stdout)")
+
+    video = sub.add_parser("video", parents=[common], help="quét một file video, xuất JSON Lines")
+    video.add_argument("input", help="file video cần quét")
+    video.add_argument("-o", "--output", help="folder xuất ảnh QR (mặc định ./qr_output)")
+    video.add_argument("--jsonl", default="-", help="file JSON Lines kết quả ('-' = stdout)")
+    video.add_argument("--stride", type=int, default=1, help="xử lý 1 khung sau mỗi N khung")
+    video.add_argument(
+        "--seek", choices=("auto", "grab", "seek"), default="auto",
+        help="cách bỏ khung: grab tuần tự, seek theo keyframe, auto (seek khi stride >= 30)",
+    )
+
+    migrate = sub.add_parser("migrate", parents=[common], help="chuyển folder xuất sang layout khác")
+    migrate.add_argument("input", help="folder xuất cần chuyển")
+    migrate.add_argument("--dry-run", action="store_true", help="chỉ in số file sẽ di chuyển")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.backend not in available_backends():
+        print(f"Backend nhận diện không khả dụng: {args.backend}", file=sys.stderr)
+        return 2
+
+    if args.command == "scan":
+        return run_batch_scan(args)
+    if args.command == "video":
+        return run_video_scan(args)
+    if args.command == "migrate":
+        return run_migrate(args)
+
+    if tk is None:
+        print("Không có Tkinter: chỉ dùng được chế độ dòng lệnh (qr.py scan ...)", file=sys.stderr)
+        return 2
     root = tk.Tk()
     app = QRCameraApp(root)
+    app.detect_workers = args.workers
+    app.detect_mode = args.pool
+    app.detector_backend.set(args.backend)
+    app.use_enhance.set(not args.no_enhance)
+    app.display_fps = max(1, args.display_fps)
+    app.use_bloom = args.bloom
+    app.log_buffer.set_max_lines(args.log_lines)
+    app.recent_codes.ttl = max(0.0, args.repeat_ttl)
+    width, height = args.capture_size
+    app.camera_config = CameraConfig(
+        device=args.camera[0], backend=args.capture_backend, width=width, height=height,
+        fps=args.capture_fps, fourcc=args.fourcc.upper(), buffer_size=args.buffer_size, grab=args.grab,
+    )
+    app.extra_cameras = args.camera[1:]
+    if args.log_file:
+        app.log_buffer.open_file(args.log_file)
+    app.crop_codec.set(args.codec)
+    app.crop_layout.set(args.layout)
+    app._on_codec_changed()
+    if args.quality is not None:
+        app.crop_level.set(args.quality)
     root.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    # Cần cho ProcessPoolExecutor khi đóng gói bằng PyInstaller trên Windows
+    multiprocessing.freeze_support()
+    sys.exit(main())
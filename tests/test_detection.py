@@ -0,0 +1,119 @@
+"""Kiểm thử cascade tăng cường (detect_qr_codes) và dò thô + giải mã mịn (detect_qr_pyramid)."""
+
+import cv2
+import numpy as np
+import pytest
+
+from qr import BLIND_STAGES, DEFAULT_CASCADE, PyramidScaler, detect_qr_codes, detect_qr_pyramid
+
+
+def place_code(frame, payload, module_px, x, y):
+    """Vẽ mã QR (viền trắng 4 module) vào khung xám tại (x, y)."""
+    code = cv2.QRCodeEncoder.create().encode(payload)
+    code = cv2.copyMakeBorder(code, 2, 2, 2, 2, cv2.BORDER_CONSTANT, value=255)
+    code = cv2.resize(code, None, fx=module_px, fy=module_px, interpolation=cv2.INTER_NEAREST)
+    h, w = code.shape
+    frame[y:y + h, x:x + w] = code
+
+
+def render_codes(payloads, module_px=6, size=(1080, 1920), invert=False):
+    """Khung nền xám trơn với các mã QR xếp hàng ngang, tuỳ chọn đảo màu cả khung."""
+    frame = np.full(size, 200, np.uint8)
+    x = 40
+    for payload in payloads:
+        place_code(frame, payload, module_px, x, size[0] // 3)
+        x += 48 * module_px
+    if invert:
+        frame = 255 - frame
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def contents(result):
+    return sorted(d.content for d in result.detections if d.content)
+
+
+def test_default_cascade_decodes_inverted_codes():
+    frame = render_codes(["INV-1", "INV-2"], invert=True)
+
+    result = detect_qr_codes(frame)
+    assert contents(result) == ["INV-1", "INV-2"]
+    assert result.stage == "invert"
+    assert [stage for stage, _, _ in result.stage_trials] == list(DEFAULT_CASCADE)
+
+
+def test_cascade_stops_at_first_decoding_stage():
+    frame = render_codes(["RAW-1"])
+
+    result = detect_qr_codes(frame)
+    assert contents(result) == ["RAW-1"]
+    assert [(stage, hit) for stage, _, hit in result.stage_trials] == [("raw", True)]
+
+    result = detect_qr_codes(frame, stages=("threshold", "raw"))
+    assert result.stage_trials[0][0] == "threshold"
+
+
+def test_blind_limit_only_cuts_cascade_when_nothing_is_found():
+    inverted = render_codes(["INV-1"], invert=True)
+    result = detect_qr_codes(inverted, blind_limit=BLIND_STAGES)
+    assert result.detections == []
+    assert len(result.stage_trials) == BLIND_STAGES
+
+    empty = np.full((480, 640, 3), 128, np.uint8)
+    assert len(detect_qr_codes(empty).stage_trials) == len(DEFAULT_CASCADE)
+    assert len(detect_qr_codes(empty, blind_limit=BLIND_STAGES).stage_trials) == BLIND_STAGES
+
+
+@pytest.mark.parametrize("invert", [False, True])
+def test_pyramid_decodes_same_codes_as_full_frame(invert):
+    frame = render_codes(["PYR-1", "PYR-2"], module_px=8, invert=invert)
+
+    assert contents(detect_qr_codes(frame)) == ["PYR-1", "PYR-2"]
+    result = detect_qr_pyramid(frame, 0.5)
+    assert contents(result) == ["PYR-1", "PYR-2"]
+    assert not result.roi_only
+
+
+def test_pyramid_falls_back_when_coarse_pass_finds_nothing():
+    # Module 3px thu nhỏ x0.25 còn dưới 1px: tầng thô không thể thấy mã
+    frame = render_codes(["TINY-1"], module_px=3)
+
+    result = detect_qr_pyramid(frame, 0.25)
+    assert contents(result) == ["TINY-1"]
+    trials = [(stage, hit) for stage, _, hit in result.stage_trials]
+    assert trials == [(stage, False) for stage in DEFAULT_CASCADE] + [("raw", True)]
+
+
+def test_pyramid_falls_back_when_fewer_codes_than_expected():
+    gray = np.full((1080, 1920), 200, np.uint8)
+    place_code(gray, "BIG-1", 10, 100, 300)
+    place_code(gray, "TINY-2", 3, 1200, 500)
+    frame = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+    # Tầng thô x0.5 chỉ thấy mã lớn; chờ 2 mã thì quét lại toàn khung
+    assert contents(detect_qr_pyramid(frame, 0.5)) == ["BIG-1"]
+    assert contents(detect_qr_pyramid(frame, 0.5, expected=2)) == ["BIG-1", "TINY-2"]
+
+
+def test_pyramid_scaler_picks_scale_from_observed_sizes():
+    scaler = PyramidScaler(target_side=128, min_scale=0.2, full_every=4)
+    # Chưa biết kích thước mã: quét toàn khung
+    assert scaler.next_scale((1080, 1920)) == 1.0
+    assert scaler.expected() == 0
+
+    frame = render_codes(["SCALE-1", "SCALE-2"], module_px=8)
+    detections = detect_qr_codes(frame).detections
+    scaler.observe(detections)
+    assert scaler.expected() == 2
+    side = min(np.linalg.norm(d.points - np.roll(d.points, 1, axis=0), axis=1).min() for d in detections)
+    assert scaler.next_scale(frame.shape) == pytest.approx(128 / np.median(scaler.sides))
+    assert scaler.next_scale(frame.shape) < 1.0
+    # Cứ full_every khung lại quét toàn khung một lần
+    assert scaler.next_scale(frame.shape) == 1.0
+    assert min(scaler.sides) == pytest.approx(side)
+
+    # Kết quả chỉ giải mã vùng không tính vào số mã chờ; khung không có mã thì có
+    scaler.observe([], roi_only=True)
+    assert scaler.expected() == 2
+    for _ in range(5):
+        scaler.observe([])
+    assert scaler.expected() == 0
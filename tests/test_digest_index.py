@@ -0,0 +1,118 @@
+"""Kiểm thử bảng digest chống trùng (DigestSet) và chỉ mục journal (QRContentIndex)."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from qr import DigestSet, QRContentIndex
+
+
+@pytest.mark.parametrize("bloom", [False, True])
+def test_digest_set_insert_contains_across_growth(bloom):
+    store = DigestSet(capacity=4, bloom=bloom)
+    initial_size = len(store.table)
+    items = [f"QR-{i}" for i in range(5000)]
+    for item in items:
+        assert store.add(item)
+    assert len(store.table) > initial_size
+    assert len(store) == len(items)
+    assert all(item in store for item in items)
+    assert not any(f"khác-{i}" in store for i in range(5000))
+    # Thêm lại sau khi bảng đã lớn lên: vẫn nhận ra là trùng
+    assert not any(store.add(item) for item in items[::7])
+    assert len(store) == len(items)
+
+
+def test_digest_set_discard_keeps_probe_chains():
+    store = DigestSet(capacity=16)
+    items = [f"QR-{i}" for i in range(2000)]
+    for item in items:
+        store.add(item)
+    removed = set(items[::3])
+    for item in removed:
+        assert store.discard(item)
+    assert not store.discard(items[0])
+    assert len(store) == len(items) - len(removed)
+    for item in items:
+        assert (item in store) == (item not in removed)
+    assert store.add(items[0])
+
+
+@pytest.mark.parametrize("bloom", [False, True])
+def test_digest_set_snapshot_round_trip(tmp_path, bloom):
+    store = DigestSet(capacity=8)
+    items = [f"QR-{i}" for i in range(300)]
+    for item in items:
+        store.add(item)
+    path = str(tmp_path / "digests.npz")
+    store.save(path, journal_offset=123, journal_ino=7)
+
+    loaded, meta = DigestSet.load(path, bloom=bloom)
+    assert meta == {"journal_offset": 123, "journal_ino": 7}
+    assert len(loaded) == len(store)
+    assert np.array_equal(loaded.table, store.table)
+    assert all(item in loaded for item in items)
+    assert "chưa-có" not in loaded
+    # Bảng đọc lại vẫn thêm/lớn lên bình thường
+    for i in range(300, 1000):
+        assert loaded.add(f"QR-{i}")
+    assert all(f"QR-{i}" in loaded for i in range(1000))
+
+
+def _append_journal(path, contents, torn=None):
+    with open(path, "a", encoding="utf-8") as f:
+        for content in contents:
+            f.write(json.dumps({"content": content, "time": "2024-01-01T00:00:00"}) + "\n")
+        if torn is not None:
+            f.write(torn)
+
+
+def test_content_index_reads_journal_tail_newer_than_snapshot(tmp_path):
+    directory = str(tmp_path)
+    index = QRContentIndex(directory)
+    index.load()
+    for i in range(50):
+        assert index.add(f"QR-{i}")
+    index.close()
+    snapshot_mtime = os.stat(index.snapshot_path).st_mtime_ns
+
+    # Tiến trình khác ghi thêm sau bản chụp, dòng cuối bị cắt dở
+    journal = os.path.join(directory, QRContentIndex.journal_name)
+    _append_journal(journal, ["QR-tail-1", "QR-tail-2", "QR-3"], torn='{"content": "QR-dở')
+
+    reopened = QRContentIndex(directory)
+    assert reopened.load() == 52
+    assert all(f"QR-{i}" in reopened for i in range(50))
+    assert "QR-tail-1" in reopened and "QR-tail-2" in reopened
+    assert "QR-dở" not in reopened
+    assert os.stat(reopened.snapshot_path).st_mtime_ns >= snapshot_mtime
+
+    # Ghi tiếp sau dòng dở: dòng mới phải đọc lại được
+    assert reopened.add("QR-sau")
+    assert not reopened.add("QR-tail-1")
+    reopened.close()
+    again = QRContentIndex(directory)
+    assert again.load() == 53
+    assert "QR-sau" in again
+    again.close()
+
+
+def test_content_index_ignores_snapshot_of_replaced_journal(tmp_path):
+    directory = str(tmp_path)
+    index = QRContentIndex(directory)
+    index.load()
+    index.add("QR-cũ")
+    index.close()
+
+    # Journal bị thay bằng file khác (khác inode): bản chụp không còn khớp
+    journal = os.path.join(directory, QRContentIndex.journal_name)
+    os.replace(journal, journal + ".bak")
+    _append_journal(journal, ["QR-mới"])
+
+    reopened = QRContentIndex(directory)
+    assert reopened.load() == 1
+    assert "QR-mới" in reopened
+    assert "QR-cũ" not in reopened
+    reopened.close()
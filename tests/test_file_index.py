@@ -0,0 +1,102 @@
+"""Kiểm thử chỉ mục file trong folder xuất (QRFileIndex)."""
+
+import json
+import os
+
+import pytest
+
+from qr import QR_CACHE_DIR, QRFileIndex
+
+
+def write_crop(directory, name, data=b"png"):
+    path = os.path.join(directory, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def open_index(directory):
+    index = QRFileIndex(str(directory))
+    index.settle_ns = 0  # tmp_path vừa tạo: tin mtime thư mục ngay
+    index.load()
+    return index
+
+
+@pytest.fixture
+def listed(monkeypatch):
+    """Ghi lại các thư mục bị os.scandir liệt kê."""
+    paths = []
+    scandir = os.scandir
+
+    def spy(path="."):
+        paths.append(os.path.normpath(path))
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", spy)
+    return paths
+
+
+def index_crops(index):
+    for name, size, mtime_ns in index.scan():
+        index.update(name, size, mtime_ns, ["QR-" + name])
+    index.save()
+
+
+def test_rescan_without_changes_does_not_list_root(tmp_path, listed):
+    for i in range(3):
+        write_crop(tmp_path, f"qr_{i}.png")
+    write_crop(tmp_path, "2024/qr_old.png")
+    index_crops(open_index(tmp_path))
+    assert os.path.exists(os.path.join(tmp_path, QR_CACHE_DIR, QRFileIndex.file_name))
+
+    listed.clear()
+    index = open_index(tmp_path)
+    assert index.scan() == []
+    assert listed == []
+    assert not index.dirty
+    assert len(index.entries) == 4
+
+
+def test_rescan_stats_known_files_in_unchanged_directory(tmp_path, listed):
+    write_crop(tmp_path, "qr_a.png")
+    write_crop(tmp_path, "qr_b.png")
+    index_crops(open_index(tmp_path))
+
+    # Ghi đè tại chỗ không đổi mtime thư mục nhưng đổi size của file
+    write_crop(tmp_path, "qr_a.png", b"png-rewritten")
+    listed.clear()
+    index = open_index(tmp_path)
+    assert [name for name, _, _ in index.scan()] == ["qr_a.png"]
+    assert listed == []
+
+
+def test_rescan_lists_root_after_new_or_removed_file(tmp_path, listed):
+    write_crop(tmp_path, "qr_a.png")
+    write_crop(tmp_path, "qr_b.png")
+    index_crops(open_index(tmp_path))
+
+    write_crop(tmp_path, "qr_c.png")
+    os.remove(os.path.join(tmp_path, "qr_b.png"))
+    listed.clear()
+    index = open_index(tmp_path)
+    assert [name for name, _, _ in index.scan()] == ["qr_c.png"]
+    assert os.path.normpath(str(tmp_path)) in listed
+    assert "qr_b.png" not in index.entries
+
+
+def test_legacy_index_in_root_is_moved_into_cache_dir(tmp_path):
+    write_crop(tmp_path, "qr_a.png")
+    st = os.stat(os.path.join(tmp_path, "qr_a.png"))
+    legacy = os.path.join(tmp_path, QRFileIndex.legacy_name)
+    with open(legacy, "w", encoding="utf-8") as f:
+        json.dump({"version": 2, "files": {"qr_a.png": [st.st_size, st.st_mtime_ns, ["OLD"]]}}, f)
+
+    index = open_index(tmp_path)
+    assert index.take_legacy_contents() == ["OLD"]
+    assert index.scan() == []
+    index.save()
+    assert not os.path.exists(legacy)
+
+    reopened = open_index(tmp_path)
+    assert reopened.has_codes()
+    assert reopened.take_legacy_contents() == []
@@ -0,0 +1,64 @@
+"""Kiểm thử cổng bỏ khung tĩnh (SceneChangeGate) và ghép khung nhiều camera (tile_frames)."""
+
+import numpy as np
+
+from qr import SceneChangeGate, tile_frames
+
+
+def solid(value, shape=(480, 640, 3)):
+    return np.full(shape, value, np.uint8)
+
+
+def test_scene_change_gate_skips_static_frames():
+    gate = SceneChangeGate(threshold=3.0, hold_seconds=1.5, refresh_seconds=5.0)
+    assert gate.should_detect(solid(100), now=0.0)
+    assert not gate.should_detect(solid(101), now=0.1)
+    assert not gate.should_detect(solid(100), now=0.2)
+    # Cảnh đổi rõ rệt: nhận diện và lấy khung này làm tham chiếu mới
+    assert gate.should_detect(solid(140), now=0.3)
+    assert not gate.should_detect(solid(141), now=0.4)
+    assert gate.checked == 5 and gate.skipped == 3
+    assert gate.skipped_ratio() == 3 / 5
+
+
+def test_scene_change_gate_refresh_and_hold_after_qr():
+    gate = SceneChangeGate(threshold=3.0, hold_seconds=1.5, refresh_seconds=5.0)
+    gate.should_detect(solid(100), now=0.0)
+    assert not gate.should_detect(solid(100), now=4.9)
+    # Định kỳ chạy lại dù cảnh không đổi
+    assert gate.should_detect(solid(100), now=5.0)
+
+    gate.notify_detections(False, now=5.0)
+    assert not gate.should_detect(solid(100), now=5.1)
+    # Vừa thấy QR: nhận diện liên tục trong hold_seconds
+    gate.notify_detections(True, now=5.2)
+    assert gate.should_detect(solid(100), now=5.3)
+    assert gate.should_detect(solid(100), now=6.6)
+    assert not gate.should_detect(solid(100), now=6.8)
+
+    gate.reset()
+    assert gate.checked == 0
+    assert gate.should_detect(solid(100), now=6.9)
+
+
+def test_tile_frames_single_frame_is_returned_as_is():
+    frame = solid(7)
+    assert tile_frames([frame]) is frame
+
+
+def test_tile_frames_grid_places_each_camera_in_its_cell():
+    frames = [solid(v) for v in (50, 100, 150)]
+    mosaic = tile_frames(frames)
+    # 3 khung -> lưới 2x2, mỗi ô bằng khung đầu chia số cột
+    assert mosaic.shape == (480, 640, 3)
+    assert (mosaic[:240, :320] == 50).all()
+    assert (mosaic[:240, 320:] == 100).all()
+    assert (mosaic[240:, :320] == 150).all()
+    assert (mosaic[240:, 320:] == 0).all()
+
+    # Khung khác kích thước vẫn được co về đúng ô; nhãn được vẽ lên ô
+    frames[1] = solid(100, (720, 1280, 3))
+    labelled = tile_frames(frames, ["cam 0", "cam 1", "cam 2"])
+    assert labelled.shape == (480, 640, 3)
+    assert (labelled[120:240, 320:] == 100).all()
+    assert not (labelled[:240, :320] == 50).all()
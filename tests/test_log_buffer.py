@@ -0,0 +1,69 @@
+"""Kiểm thử mô hình ô log (LogBuffer) và nhịp chung của animator (AnimationScheduler)."""
+
+from qr import LOG_ERROR, LOG_INFO, AnimationScheduler, LogBuffer
+
+
+class FakeRoot:
+    """Thay Tk root: giữ các callback after() để chạy tay từng nhịp."""
+
+    def __init__(self):
+        self.scheduled = {}
+        self._next_id = 0
+
+    def after(self, ms, callback):
+        self._next_id += 1
+        self.scheduled[self._next_id] = callback
+        return self._next_id
+
+    def after_cancel(self, after_id):
+        self.scheduled.pop(after_id, None)
+
+    def run_pending(self):
+        pending, self.scheduled = self.scheduled, {}
+        for callback in pending.values():
+            callback()
+        return len(pending)
+
+
+def test_log_buffer_caps_widget_lines_and_escapes_newlines(tmp_path):
+    log = LogBuffer(max_lines=3)
+    path = tmp_path / "qr.log"
+    log.open_file(str(path))
+    log.append("một\ndòng", LOG_INFO)
+    lines, excess = log.take()
+    assert lines == [("một\\ndòng", LOG_INFO)] and excess == 0
+
+    for i in range(5):
+        log.append(f"dòng {i}", LOG_ERROR)
+    assert log.dropped == 2
+    lines, excess = log.take()
+    assert [m for m, _ in lines] == ["dòng 2", "dòng 3", "dòng 4"]
+    assert excess == 1 and log.shown == 3
+    log.close()
+
+    text = path.read_text(encoding="utf-8")
+    assert "INFO một\ndòng" in text
+    assert "ERROR dòng 0" in text
+
+
+def test_scheduler_keeps_essential_effects_when_disabled():
+    root = FakeRoot()
+    animator = AnimationScheduler(root, budget_ms=1000.0)
+    calls = []
+    pending = ["dòng"]
+    animator.add("pulse", 0, lambda: calls.append("pulse"), lambda: True)
+    animator.add("log", 0, lambda: (calls.append("log"), pending.clear()), lambda: bool(pending),
+                 essential=True)
+
+    animator.set_enabled(False)
+    animator.wake()
+    root.run_pending()
+    assert calls == ["log"]
+    # Không còn việc essential nào: sau một nhịp rỗng vòng lặp dừng hẳn
+    root.run_pending()
+    assert not root.scheduled
+
+    animator.set_enabled(True)
+    root.run_pending()
+    assert calls == ["log", "pulse"]
+    assert root.scheduled
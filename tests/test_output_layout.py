@@ -0,0 +1,79 @@
+"""Kiểm thử tên file ảnh QR (CropNamer), kiểu chia thư mục (crop_relpath) và lệnh migrate."""
+
+import datetime
+import os
+import re
+
+import cv2
+
+from qr import CropNamer, QRFileIndex, crop_relpath, crop_shard, main
+from test_detection import render_codes
+
+
+def test_crop_namer_numbers_files_within_one_second():
+    namer = CropNamer()
+    names = [namer.next() for _ in range(50)] + [namer.next(".webp")]
+    assert len(set(names)) == len(names)
+    for name in names:
+        assert re.fullmatch(r"qr_\d{8}_\d{6}_\d+\.(png|webp)", name)
+    assert names[-1].endswith(".webp")
+
+
+def test_crop_relpath_layouts():
+    name = "qr_20240131_235959_7.png"
+    assert crop_relpath(name) == name
+    assert crop_relpath("2024/" + name) == name
+    assert crop_relpath(name, "date") == f"20240131/23/{name}"
+    assert crop_relpath(name, "hash", content="QR-1") == f"{crop_shard('QR-1')}/{name}"
+    assert crop_relpath(name, "hash", content="QR-1", shard="ab") == f"ab/{name}"
+    # Không đọc được nội dung: băm theo tên file
+    assert crop_relpath(name, "hash") == f"{crop_shard(name)}/{name}"
+
+    # Tên không do CropNamer sinh: dùng mtime của file cho layout date
+    mtime = 1700000000.0
+    when = datetime.datetime.fromtimestamp(mtime)
+    assert crop_relpath("qr_import.png", "date", mtime=mtime) == \
+        f"{when:%Y%m%d}/{when:%H}/qr_import.png"
+
+
+def crop_files(directory):
+    found = {}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if name.startswith("qr_"):
+                found[name] = os.path.relpath(os.path.join(root, name), directory).replace(os.sep, "/")
+    return found
+
+
+def test_migrate_moves_crops_between_layouts(tmp_path, capsys):
+    source = tmp_path / "in"
+    output = tmp_path / "out"
+    source.mkdir()
+    for i, payload in enumerate(["MIG-1", "MIG-2", "MIG-3"]):
+        cv2.imwrite(str(source / f"{i}.png"), render_codes([payload], module_px=8))
+    assert main(["scan", str(source), "-o", str(output)]) == 0
+    flat = crop_files(output)
+    assert len(flat) == 3 and all(rel == name for name, rel in flat.items())
+
+    assert main(["migrate", str(output), "--layout", "hash", "--dry-run"]) == 0
+    assert crop_files(output) == flat
+
+    assert main(["migrate", str(output), "--layout", "hash"]) == 0
+    hashed = crop_files(output)
+    shards = {crop_shard(payload) for payload in ["MIG-1", "MIG-2", "MIG-3"]}
+    assert {rel.split("/")[0] for rel in hashed.values()} == shards
+
+    assert main(["migrate", str(output), "--layout", "date"]) == 0
+    dated = crop_files(output)
+    assert all(rel == crop_relpath(name, "date") for name, rel in dated.items())
+    # Thư mục băm cũ đã rỗng thì bị xoá
+    assert not any((output / shard).exists() for shard in shards)
+
+    assert main(["migrate", str(output), "--layout", "flat"]) == 0
+    assert crop_files(output) == flat
+    index = QRFileIndex(str(output))
+    index.load()
+    assert sorted(index.entries) == sorted(flat)
+    assert index.scan() == []
+    capsys.readouterr()